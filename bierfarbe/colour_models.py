@@ -0,0 +1,128 @@
+# Beer Colour Models
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+from functools import partial
+import numpy as np
+
+def ebc_to_l(ebc):
+    return ebc / 2.65
+
+def ebc_to_srm(ebc):
+    return ebc / 1.97
+
+def srm_to_ebc(srm):
+    return srm * 1.97
+
+def kg_to_lb(kg):
+    return kg / 0.45359237
+
+def l_to_gal_us(l):
+    return l / 3.785
+
+def calc_srm_morey(mcu):
+    return 1.49 * np.power(mcu, 0.69)
+
+def calc_srm_daniels_lin(mcu):
+    return 0.2 * mcu + 8.4
+
+def calc_srm_daniels_druey(mcu):
+    return 1.73 * np.power(mcu, 0.64) - 0.267
+
+def calc_srm_mosher_lin(mcu):
+    return 0.3 * mcu + 4.7
+
+def calc_srm_noonan_druey(mcu):
+    return 15.03 * np.power(mcu, 0.27) - 15.53
+
+# Colour of the boil by the original extract, the extract may be an array
+def calc_cc_weyermann(oe):
+    return np.select([oe <= 7.0, oe <= 10.0, oe <= 15.0, oe <= 20.0], [0.0, 3.0, 5.0, 7.0], 10.0)
+
+def calc_ebc_weyermann(ebc, boil_time, oe):
+    return ebc * oe / 10.0 + calc_cc_weyermann(oe)
+
+def calc_ebc_krueger(ebc, boil_time, oe):
+    return ebc * oe / 10.0 + (boil_time / 60.0 * 1.5) + 2.0
+
+def calc_ebc_hanghofer_1999(ebc, boil_time, oe):
+    return ebc * oe / 10.0 + 2.0
+
+def calc_ebc_hanghofer_2019(ebc, boil_time, oe):
+    return ebc * oe / 9.0 + 2.0
+
+class Addition:
+    def __init__(self, weight, ebc):
+        self.weight = weight
+        self.ebc = ebc
+
+    def calc_mcu_l(self, volume):
+        return kg_to_lb(self.weight) * ebc_to_l(self.ebc) / l_to_gal_us(volume)
+
+    def calc_mcu_srm(self, volume):
+        return kg_to_lb(self.weight) * ebc_to_srm(self.ebc) / l_to_gal_us(volume)
+
+    def calc_mcu_ebc(self, weight):
+        return self.weight * self.ebc / weight
+
+class BrewData:
+    def __init__(self, ebc_ref, oe, boil_time, volume, malt_additions):
+        self.ebc_ref = ebc_ref
+        self.oe = oe
+        self.boil_time = boil_time
+        self.volume = volume
+        self.malt_additions = malt_additions
+
+    def calc_ebc_l(self, functor):
+        mcu = sum(i.calc_mcu_l(self.volume) for i in self.malt_additions)
+        return srm_to_ebc(functor(mcu))
+
+    def calc_ebc_srm(self):
+        return sum(i.calc_mcu_srm(self.volume) for i in self.malt_additions)
+
+    def calc_ebc(self, functor):
+        weight = sum(i.weight for i in self.malt_additions)
+        ebc = sum(i.calc_mcu_ebc(weight) for i in self.malt_additions)
+        return functor(ebc, self.boil_time, self.oe)
+
+# Vectorized counterparts of BrewData for many grists at once: the malt weights in kg and malt
+# colours in EBC are arrays with one column per malt, e.g. one row per candidate grist. Volume,
+# boil time and original extract broadcast against the rows.
+
+def calc_mcu_l_batch(weights, ebcs, volume):
+    return np.sum(kg_to_lb(weights) * ebc_to_l(ebcs), axis=-1) / l_to_gal_us(volume)
+
+def calc_ebc_l_batch(weights, ebcs, volume, functor):
+    return srm_to_ebc(functor(calc_mcu_l_batch(weights, ebcs, volume)))
+
+def calc_ebc_srm_batch(weights, ebcs, volume):
+    return np.sum(kg_to_lb(weights) * ebc_to_srm(ebcs), axis=-1) / l_to_gal_us(volume)
+
+def calc_ebc_batch(weights, ebcs, boil_time, oe, functor):
+    ebc = np.sum(weights * ebcs, axis=-1) / np.sum(weights, axis=-1)
+    return functor(ebc, boil_time, oe)
+
+# The batch functions with the common arguments of the colour models
+def calc_ebc_srm_model(weights, ebcs, volume, boil_time, oe):
+    return calc_ebc_srm_batch(weights, ebcs, volume)
+
+def calc_ebc_l_model(weights, ebcs, volume, boil_time, oe, functor):
+    return calc_ebc_l_batch(weights, ebcs, volume, functor)
+
+def calc_ebc_model(weights, ebcs, volume, boil_time, oe, functor):
+    return calc_ebc_batch(weights, ebcs, boil_time, oe, functor)
+
+# Colour models by name, each a function of the malt weights, malt colours, volume, boil time and
+# original extract which returns the EBC. Unlike lambdas they can be passed to worker processes.
+ebc_models = {
+    'burch': calc_ebc_srm_model,
+    'daniels-druey': partial(calc_ebc_l_model, functor=calc_srm_daniels_druey),
+    'daniels-linear': partial(calc_ebc_l_model, functor=calc_srm_daniels_lin),
+    'hanghofer-1999': partial(calc_ebc_model, functor=calc_ebc_hanghofer_1999),
+    'hanghofer-2019': partial(calc_ebc_model, functor=calc_ebc_hanghofer_2019),
+    'krueger': partial(calc_ebc_model, functor=calc_ebc_krueger),
+    'morey': partial(calc_ebc_l_model, functor=calc_srm_morey),
+    'mosher-linear': partial(calc_ebc_l_model, functor=calc_srm_mosher_lin),
+    'noonan-druey': partial(calc_ebc_l_model, functor=calc_srm_noonan_druey),
+    'weyermann': partial(calc_ebc_model, functor=calc_ebc_weyermann)
+}
@@ -2,97 +2,10 @@
 # Copyright 2022 Thomas Ascher
 # SPDX-License-Identifier: GPL-3.0+
 
-from cmath import nan
 import numpy as np
 import matplotlib.pyplot as plt
-
-def ebc_to_l(ebc):
-    return ebc / 2.65
-
-def ebc_to_srm(ebc):
-    return ebc / 1.97
-
-def srm_to_ebc(srm):
-    return srm * 1.97
-
-def kg_to_lb(kg):
-    return kg / 0.45359237
-
-def l_to_gal_us(l):
-    return l / 3.785
-
-def calc_srm_morey(mcu):
-    return 1.49 * np.power(mcu, 0.69)
-
-def calc_srm_daniels_lin(mcu):
-    return 0.2 * mcu + 8.4
-
-def calc_srm_daniels_druey(mcu):
-    return 1.73 * np.power(mcu, 0.64) - 0.267
-
-def calc_srm_mosher_lin(mcu):
-    return 0.3 * mcu + 4.7
-
-def calc_srm_noonan_druey(mcu):
-    return 15.03 * np.power(mcu, 0.27) - 15.53
-
-def calc_cc_weyermann(oe):
-    if oe <= 7.0:
-        return 0.0
-    elif oe <= 10.0:
-        return 3.0
-    elif oe <= 15.0:
-        return 5.0
-    elif oe <= 20.0:
-        return 7.0
-    else:
-        return 10
-
-def calc_ebc_weyermann(ebc, boil_time, oe):
-    return ebc * oe / 10.0 + calc_cc_weyermann(oe)
-
-def calc_ebc_krueger(ebc, boil_time, oe):
-    return ebc * oe / 10.0 + (boil_time / 60.0 * 1.5) + 2.0
-
-def calc_ebc_hanghofer_1999(ebc, boil_time, oe):
-    return ebc * oe / 10.0 + 2.0
-
-def calc_ebc_hanghofer_2019(ebc, boil_time, oe):
-    return ebc * oe / 9.0 + 2.0
-
-class Addition:
-    def __init__(self, weight, ebc):
-        self.weight = weight
-        self.ebc = ebc
-
-    def calc_mcu_l(self, volume):
-        return kg_to_lb(self.weight) * ebc_to_l(self.ebc) / l_to_gal_us(volume)
-
-    def calc_mcu_srm(self, volume):
-        return kg_to_lb(self.weight) * ebc_to_srm(self.ebc) / l_to_gal_us(volume)
-
-    def calc_mcu_ebc(self, weight):
-        return self.weight * self.ebc / weight
-
-class BrewData:
-    def __init__(self, ebc_ref, oe, boil_time, volume, malt_additions):
-        self.ebc_ref = ebc_ref
-        self.oe = oe
-        self.boil_time = boil_time
-        self.volume = volume
-        self.malt_additions = malt_additions
-
-    def calc_ebc_l(self, functor):
-        mcu = sum(i.calc_mcu_l(self.volume) for i in self.malt_additions)
-        return srm_to_ebc(functor(mcu))
-
-    def calc_ebc_srm(self):
-        return sum(i.calc_mcu_srm(self.volume) for i in self.malt_additions)
-
-    def calc_ebc(self, functor):
-        weight = sum(i.weight for i in self.malt_additions)
-        ebc = sum(i.calc_mcu_ebc(weight) for i in self.malt_additions)
-        return functor(ebc, self.boil_time, self.oe)
+from colour_models import BrewData, Addition, calc_srm_morey, calc_srm_daniels_lin, calc_srm_daniels_druey, calc_srm_mosher_lin, \
+    calc_srm_noonan_druey, calc_ebc_weyermann, calc_ebc_krueger, calc_ebc_hanghofer_1999, calc_ebc_hanghofer_2019
 
 mcu_scale = np.linspace(0, 100, dtype=int)
 
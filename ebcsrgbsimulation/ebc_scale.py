@@ -1,21 +1,47 @@
 import os, sys
 sys.path.append(os.path.join(os.path.dirname(__file__), "lib"))
 
-import olfarve
-import colour.plotting
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.figure import Figure
+import olfarve_batch
 
-max_ebc = 60
-ebc_colors = []
-for l in range(1, 16):
-    for ebc in range(1, max_ebc + 1):
-        ebc_colors.append(colour.plotting.ColourSwatch(RGB=olfarve.ebc_to_srgb(ebc, l)))
+class ScaleConfig:
+    def __init__(self, file_name='ebc_scale.pdf', min_ebc=1, max_ebc=60, min_path=1, max_path=15, figsize=(6.4, 4.8), engine=None):
+        self.file_name = file_name
+        self.min_ebc = min_ebc
+        self.max_ebc = max_ebc
+        self.min_path = min_path
+        self.max_path = max_path
+        self.figsize = figsize
+        self.engine = engine
 
-fig_scale, ax_scale = colour.plotting.plot_multi_colour_swatches(colour_swatches=ebc_colors, columns=max_ebc, **{'show': False, 'tight_layout': False })
-ax_scale.xaxis.set_label_text('EBC')
-ax_scale.xaxis.set_ticks_position('bottom')
-ax_scale.yaxis.set_label_text('l [cm]')
-ax_scale.yaxis.set_ticks_position('left')
-fig_scale.savefig('ebc_scale.pdf')
+# All colors of a scale are computed in one batch and written into an image buffer with one
+# row per path length and one column per EBC value
+def calc_scale_image(config):
+    ebc = np.arange(config.min_ebc, config.max_ebc + 1)
+    path = np.arange(config.min_path, config.max_path + 1)
+    ebc_grid, path_grid = np.meshgrid(ebc, path)
+    rgb = olfarve_batch.ebc_to_srgb_batch(ebc_grid, path_grid, config.engine)
+    return rgb.reshape(len(path), len(ebc), 3)
 
-#plt.show()
+def render_scale(config):
+    image = calc_scale_image(config)
+    fig = Figure(figsize=config.figsize)
+    ax = fig.subplots(1, 1)
+    ax.imshow(image, interpolation='nearest', aspect='auto',
+        extent=(config.min_ebc - 0.5, config.max_ebc + 0.5, config.max_path + 0.5, config.min_path - 0.5))
+    ax.xaxis.set_label_text('EBC')
+    ax.xaxis.set_ticks_position('bottom')
+    ax.yaxis.set_label_text('l [cm]')
+    ax.yaxis.set_ticks_position('left')
+    fig.savefig(config.file_name)
+    return config.file_name
+
+# Independent scales (e.g. per glass or style) are rendered in parallel
+def render_scales(configs, max_workers=None):
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(render_scale, configs))
+
+if __name__ == "__main__":
+    render_scale(ScaleConfig())
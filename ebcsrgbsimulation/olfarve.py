@@ -138,11 +138,25 @@ def beer_sd_to_srgb(a430, l):
     return [r, g, b]
 
 # Determine a color in the sRGB space in relative intensity for a given SRM rating and transmission path in cm (e.g. glass width)
-def srm_to_srgb(srm, path_cm=DEFAULT_PATH):
+# Optionally an interpolated lookup table (see olfarve_lut.ColorLUT) can be passed, or with fast the generated approximation
+# (see olfarve_fit.py) can be used instead of evaluating the spectral model
+def srm_to_srgb(srm, path_cm=DEFAULT_PATH, lut=None, fast=False):
+    if lut is not None or fast:
+        return ebc_to_srgb(srm / 12.7 * 25.0, path_cm, lut, fast)
     return beer_sd_to_srgb(srm / 12.7, path_cm)
 
 # Determine a color in the sRGB space in relative intensity for a given EBC rating and transmission path in cm (e.g. glass width)
-def ebc_to_srgb(ebc, path_cm=DEFAULT_PATH):
+# Optionally an interpolated lookup table (see olfarve_lut.ColorLUT) can be passed, or with fast the generated approximation
+# (see olfarve_fit.py) can be used instead of evaluating the spectral model
+def ebc_to_srgb(ebc, path_cm=DEFAULT_PATH, lut=None, fast=False):
+    if lut is not None:
+        return lut.lookup(ebc, path_cm)
+    if fast:
+        import olfarve_fast
+        density = ebc / 25.0 * path_cm
+        # Outside of the fitted range the spectral model is used
+        if density >= olfarve_fast.MIN_DENSITY and density <= olfarve_fast.MAX_DENSITY:
+            return olfarve_fast.density_to_srgb(density)
     return beer_sd_to_srgb(ebc / 25.0, path_cm)
 
 # Convert a relative intensity RGB triplet into textual hex representation
@@ -152,8 +166,8 @@ def rgb_to_hex(rgb):
         text += format(round(i * 255.0), '02x')
     return text
 
+# The table generator (see olfarve_table.py) defaults to the SRM 1-50 table
 if __name__ == "__main__":
-    print('SRM,sRGB')
-    for i in range(1, 51):
-        print(str(i) + ',' + rgb_to_hex(srm_to_srgb(i)))
+    import olfarve_table
+    olfarve_table.main()
  
@@ -0,0 +1,71 @@
+# Ol farve: fast piecewise chebyshev approximation of the spectral model
+# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>
+# SPDX-License-Identifier: MIT
+# Generated by olfarve_fit.py, do not edit.
+# Fitted for 5 cm path length and 0-160 EBC, 8 segments of degree 8.
+# Max. deviation from olfarve.ebc_to_srgb: dE76 0.0209 at 0.00 EBC
+
+import olfarve
+
+MIN_DENSITY = 0.0
+MAX_DENSITY = 32.0
+SEGMENTS = 8
+MAX_DELTA_E = 0.0209
+
+# Coefficients per segment and channel
+COEFFS = [
+    [
+        [ 0.742216526521821, -0.26185475432858873, 0.0006159190530871597, 0.006055229019073017, -0.00011651680464384127, -0.000731596571632868, 0.00039825580430380273, -0.00013987672874106347, 4.310273634072832e-05 ],
+        [ 0.43173429926435924, -0.43006986167986705, 0.11796749874712252, -0.020440744761289553, 0.0012285339774697442, 0.000740382220280178, -0.00041645436427315, 0.00014147283948817428, -4.206172058917404e-05 ],
+        [ 0.19791298757580778, -0.3734235404106373, 0.24071930478998385, -0.11733174859027494, 0.047026252026371805, -0.01626095135547873, 0.005039600572122632, -0.001380028420352561, 0.0003652620081989449 ],
+    ],
+    [
+        [ 0.3268230069658758, -0.14248907640103092, 0.01612771788537138, -0.0010408734321897617, -3.929232138882696e-06, 1.2751272092329106e-05, -2.38061274327784e-06, 3.133545426492601e-07, -3.4003685440013274e-08 ],
+        [ 0.04321180211104025, -0.0439096411564274, 0.01134619192163815, -0.0020567278822941266, 0.00030010631142907726, -3.7746702887863826e-05, 4.2313076513348935e-06, -4.2438421468870563e-07, 3.73881235850374e-08 ],
+        [ -0.010462239300482309, 0.006312483231018022, -0.00084591996195219, -2.4001387755150694e-05, 4.7165330675547945e-05, -1.614889185701876e-05, 4.0182556436994886e-06, -8.34968453139421e-07, 1.5901573728162056e-07 ],
+    ],
+    [
+        [ 0.13619722474332427, -0.05625630764208152, 0.006420714012563741, -0.0005201134796869204, 3.181046987231363e-05, -1.3349938037431412e-06, 5.662118706682698e-09, 6.468027678319062e-09, -9.354795897493293e-10 ],
+        [ 0.002241914584996547, -0.004991887043605485, 0.001364779496696786, -0.000227071573491057, 2.878025627650524e-05, -3.0704026905246663e-06, 2.911137803900887e-07, -2.525465395130029e-08, 2.059846292170934e-09 ],
+        [ -0.002972315785821961, 0.0016964203748770813, -0.0002794683805434301, 3.376248933164181e-05, -3.1893126309240058e-06, 2.222750057174393e-07, -5.968564906364395e-09, -1.4875787591056157e-09, 3.9147165868161374e-10 ],
+    ],
+    [
+        [ 0.06018182325180303, -0.023030405277552173, 0.0024567402696289, -0.0001905211200657415, 1.1869536902405887e-05, -6.176629553066083e-07, 2.658189971652583e-08, -8.419424141559654e-10, 5.402233172696929e-12 ],
+        [ -0.0019528146734233511, -0.00016395086689337718, 0.00016736533713926274, -3.105709739031292e-05, 3.7600117366380875e-06, -3.617299712332732e-07, 3.00381258185372e-08, -2.2466769733759105e-09, 1.5636737327412484e-10 ],
+        [ -0.0009666254028321465, 0.00048057224373923254, -6.918431089482894e-05, 7.4694241292662425e-06, -6.684193744587644e-07, 5.1957389030055325e-08, -3.5716474472843303e-09, 2.1485288102376936e-10, -1.0634874767797062e-11 ],
+    ],
+    [
+        [ 0.0283146543123433, -0.010043231612653029, 0.0009946079165839884, -7.196720230793265e-05, 4.230769689571284e-06, -2.1311010596453375e-07, 9.441761873820114e-09, -3.693811128676317e-10, 1.2427513238495117e-11 ],
+        [ -0.0016490660347104095, 0.0003353194292898035, 2.768889105032626e-06, -3.969312791403744e-06, 5.588819885790453e-07, -5.291044492860269e-08, 4.077909025780347e-09, -2.7513160572515644e-10, 1.6973778342833348e-11 ],
+        [ -0.0003656423264488771, 0.00016037602601311966, -2.0281799342345615e-05, 1.92443220178195e-06, -1.5203596746396604e-07, 1.0550657903800888e-08, -6.630707603488729e-10, 3.834339986280095e-11, -2.0620555119277054e-12 ],
+    ],
+    [
+        [ 0.014090501646000654, -0.00464858385530624, 0.0004284432790081059, -2.889511418461612e-05, 1.5877670172147395e-06, -7.51983993508388e-08, 3.171689367693006e-09, -1.2129301268252253e-10, 4.2407317913621096e-12 ],
+        [ -0.0010369804584599274, 0.0002634396141727271, -1.4101058633900103e-05, -1.8025763846332326e-09, 7.306725107142914e-08, -8.330782823499332e-09, 6.46305540874882e-10, -4.1357007355848955e-11, 2.3502200980642646e-12 ],
+        [ -0.00015532092455225918, 6.095017143732111e-05, -6.870911002234458e-06, 5.803087112509981e-07, -4.079309848295892e-08, 2.5212873072694746e-09, -1.4155462498775115e-10, 7.36141413377795e-12, -3.602867993723247e-13 ],
+    ],
+    [
+        [ 0.007366361875498661, -0.0022683483544538845, 0.0001952942455181579, -1.2314539633350859e-05, 6.332897588286798e-07, -2.811636880421748e-08, 1.115332905935945e-09, -4.038541515890892e-11, 1.354838286209736e-12 ],
+        [ -0.0006147550673378078, 0.00016175327518783527, -1.0673910008651219e-05, 3.961493807741753e-07, -1.1747833115994683e-09, -1.1011692539508272e-09, 1.060926390700904e-10, -6.958973210579038e-12, 3.8117991387507816e-13 ],
+        [ -7.223014081053842e-05, 2.5647951485229456e-05, -2.609670332287792e-06, 1.9868422390824267e-07, -1.257804972871271e-08, 6.997272009547463e-10, -3.536010021265536e-11, 1.656911188086949e-12, -7.320632710346001e-14 ],
+    ],
+    [
+        [ 0.004022454305303367, -0.001159730819896446, 9.359754867300685e-05, -5.537828324917098e-06, 2.6739062194799514e-07, -1.1152960697989397e-08, 4.1604899970552646e-10, -1.419471760962812e-11, 4.503748803297005e-13 ],
+        [ -0.00036250263468787724, 9.403212851558679e-05, -6.446710959761027e-06, 2.91843756545316e-07, -8.389949095775155e-09, 3.671288539476165e-11, 1.4063912463131727e-11, -1.1783346762077067e-12, 6.715204726411533e-14 ],
+        [ -3.6125693061057936e-05, 1.1712961659887526e-05, -1.0865146895619226e-06, 7.534676170035851e-08, -4.341181103596877e-09, 2.1963425004539237e-10, -1.008839442847383e-11, 4.29638501910688e-13, -1.7251627838237006e-14 ],
+    ],
+]
+
+# Clenshaw recurrence
+def evaluate(c, x):
+    b1 = 0.0
+    b2 = 0.0
+    for i in range(len(c) - 1, 0, -1):
+        b1, b2 = 2.0 * x * b1 - b2 + c[i], b1
+    return x * b1 - b2 + c[0]
+
+def density_to_srgb(density):
+    width = (MAX_DENSITY - MIN_DENSITY) / SEGMENTS
+    segment = max(0, min(SEGMENTS - 1, int((density - MIN_DENSITY) / width)))
+    x = 2.0 * (density - MIN_DENSITY - segment * width) / width - 1.0
+    return [olfarve.transfer_color_component(evaluate(c, x)) for c in COEFFS[segment]]
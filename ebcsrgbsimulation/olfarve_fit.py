@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# Ol farve: generation of fast piecewise polynomial approximations of the spectral model
+# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>
+# SPDX-License-Identifier: MIT
+
+import argparse
+import numpy as np
+from numpy.polynomial import chebyshev
+import olfarve
+import olfarve_batch
+
+# Number of samples per segment for the fit and the error estimation
+SAMPLES = 8192
+
+# CIE 1976 L*a*b* of relative sRGB intensities, D65 white
+def srgb_to_lab(rgb):
+    lin = np.where(rgb <= 0.04045, rgb / 12.92, np.power((rgb + 0.055) / 1.055, 2.4))
+    xyz = lin @ np.linalg.inv(olfarve_batch.XYZ_TO_SRGB).T
+    white = np.linalg.solve(olfarve_batch.XYZ_TO_SRGB, np.ones(3))
+    delta = 6.0 / 29.0
+    f = xyz / white
+    f = np.where(f > delta**3, np.cbrt(f), f / (3.0 * delta**2) + 4.0 / 29.0)
+    return np.stack([116.0 * f[:, 1] - 16.0, 500.0 * (f[:, 0] - f[:, 1]), 200.0 * (f[:, 1] - f[:, 2])], axis=1)
+
+def calc_delta_e(rgb1, rgb2):
+    return np.sqrt(np.sum((srgb_to_lab(rgb1) - srgb_to_lab(rgb2))**2, axis=1))
+
+# The color only depends on the optical density (ebc / 25 * path_cm), so a fit for a path length and
+# EBC range is done over the corresponding density range and can be used for other path lengths as
+# long as the density is within this range. The linear intensities are approximated per segment,
+# which are smooth in contrast to the clipped and gamma encoded sRGB values.
+class ColorFit:
+    def __init__(self, path_cm=olfarve.DEFAULT_PATH, min_ebc=0.0, max_ebc=160.0, segments=8, degree=8, kind='chebyshev'):
+        self.path_cm = path_cm
+        self.min_ebc = min_ebc
+        self.max_ebc = max_ebc
+        self.min_density = min_ebc / 25.0 * path_cm
+        self.max_density = max_ebc / 25.0 * path_cm
+        self.segments = segments
+        self.degree = degree
+        self.kind = kind
+        self.width = (self.max_density - self.min_density) / segments
+        self.coeffs = [self.fit_segment(i) for i in range(segments)]
+        self.max_delta_e, self.max_delta_e_ebc = self.calc_max_delta_e()
+
+    def fit_segment(self, segment):
+        x = np.linspace(-1.0, 1.0, SAMPLES)
+        density = self.min_density + (segment + (x + 1.0) / 2.0) * self.width
+        rgb = olfarve_batch.beer_sd_to_linear_rgb_batch(density, 1.0)
+        coeffs = [chebyshev.chebfit(x, rgb[:, i], self.degree) for i in range(3)]
+        if self.kind == 'polynomial':
+            coeffs = [chebyshev.cheb2poly(i) for i in coeffs]
+        return coeffs
+
+    def density_to_srgb_batch(self, density):
+        segment = np.clip(((density - self.min_density) / self.width).astype(int), 0, self.segments - 1)
+        x = 2.0 * (density - self.min_density - segment * self.width) / self.width - 1.0
+        rgb = np.empty((len(density), 3))
+        evaluate = chebyshev.chebval if self.kind == 'chebyshev' else np.polynomial.polynomial.polyval
+        for i in range(self.segments):
+            mask = segment == i
+            for c in range(3):
+                rgb[mask, c] = evaluate(x[mask], self.coeffs[i][c])
+        return olfarve_batch.transfer_color_component(rgb)
+
+    def calc_max_delta_e(self):
+        density = np.linspace(self.min_density, self.max_density, SAMPLES * self.segments)
+        delta_e = calc_delta_e(self.density_to_srgb_batch(density), olfarve_batch.beer_sd_to_srgb_batch(density, 1.0))
+        i = np.argmax(delta_e)
+        return delta_e[i], density[i] * 25.0 / self.path_cm
+
+    def generate_module(self):
+        lines = [
+            '# Ol farve: fast piecewise %s approximation of the spectral model' % self.kind,
+            '# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>',
+            '# SPDX-License-Identifier: MIT',
+            '# Generated by olfarve_fit.py, do not edit.',
+            '# Fitted for %g cm path length and %g-%g EBC, %d segments of degree %d.' % (self.path_cm, self.min_ebc, self.max_ebc, self.segments, self.degree),
+            '# Max. deviation from olfarve.ebc_to_srgb: dE76 %.4f at %.2f EBC' % (self.max_delta_e, self.max_delta_e_ebc),
+            '',
+            'import olfarve',
+            '',
+            'MIN_DENSITY = ' + repr(self.min_density),
+            'MAX_DENSITY = ' + repr(self.max_density),
+            'SEGMENTS = ' + repr(self.segments),
+            'MAX_DELTA_E = ' + repr(round(float(self.max_delta_e), 4)),
+            '',
+            '# Coefficients per segment and channel',
+            'COEFFS = [',
+        ]
+        for segment in self.coeffs:
+            lines.append('    [')
+            for c in segment:
+                lines.append('        [ ' + ', '.join(repr(float(i)) for i in c) + ' ],')
+            lines.append('    ],')
+        lines += [
+            ']',
+            '',
+        ]
+        if self.kind == 'chebyshev':
+            lines += [
+                '# Clenshaw recurrence',
+                'def evaluate(c, x):',
+                '    b1 = 0.0',
+                '    b2 = 0.0',
+                '    for i in range(len(c) - 1, 0, -1):',
+                '        b1, b2 = 2.0 * x * b1 - b2 + c[i], b1',
+                '    return x * b1 - b2 + c[0]',
+            ]
+        else:
+            lines += [
+                '# Horner scheme',
+                'def evaluate(c, x):',
+                '    y = 0.0',
+                '    for i in reversed(c):',
+                '        y = y * x + i',
+                '    return y',
+            ]
+        lines += [
+            '',
+            'def density_to_srgb(density):',
+            '    width = (MAX_DENSITY - MIN_DENSITY) / SEGMENTS',
+            '    segment = max(0, min(SEGMENTS - 1, int((density - MIN_DENSITY) / width)))',
+            '    x = 2.0 * (density - MIN_DENSITY - segment * width) / width - 1.0',
+            '    return [olfarve.transfer_color_component(evaluate(c, x)) for c in COEFFS[segment]]',
+            '',
+        ]
+        return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fit a fast approximation of the olfarve spectral model and generate a Python module.')
+    parser.add_argument('--path', type=float, default=olfarve.DEFAULT_PATH, help='transmission path in cm')
+    parser.add_argument('--min-ebc', type=float, default=0.0, help='lower end of the EBC range')
+    parser.add_argument('--max-ebc', type=float, default=160.0, help='upper end of the EBC range')
+    parser.add_argument('--segments', type=int, default=8, help='number of piecewise segments')
+    parser.add_argument('--degree', type=int, default=8, help='degree per segment')
+    parser.add_argument('--kind', choices=['chebyshev', 'polynomial'], default='chebyshev', help='basis of the approximation')
+    parser.add_argument('-o', '--output', default='olfarve_fast.py', help='generated module')
+    args = parser.parse_args(argv)
+
+    fit = ColorFit(args.path, args.min_ebc, args.max_ebc, args.segments, args.degree, args.kind)
+    print('Max. dE76: %.4f at %.2f EBC' % (fit.max_delta_e, fit.max_delta_e_ebc))
+    with open(args.output, 'w') as f:
+        f.write(fit.generate_module())
+
+if __name__ == "__main__":
+    main()
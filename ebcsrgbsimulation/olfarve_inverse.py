@@ -0,0 +1,121 @@
+# Ol farve: estimation of EBC/SRM color ratings from sRGB colors
+# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>
+# SPDX-License-Identifier: MIT
+
+import numpy as np
+import olfarve
+import olfarve_batch
+import olfarve_lut
+
+# Relative luminance of linear sRGB intensities
+LUMINANCE = np.array([ 0.2126, 0.7152, 0.0722 ])
+
+# Number of table entries around the luminance match which are searched for the closest color
+SEARCH_WINDOW = 32
+
+# Convert a textual hex representation into a relative intensity RGB triplet
+def hex_to_rgb(text):
+    text = text.lstrip('#')
+    return [int(text[i:i + 2], 16) / 255.0 for i in range(0, 6, 2)]
+
+def linearize_color_component(c):
+    c = np.clip(c, 0.0, 1.0)
+    return np.where(c <= 0.04045, c / 12.92, np.power((c + 0.055) / 1.055, 2.4))
+
+# The color of a beer only depends on the optical density (ebc / 25 * path_cm), so a color can
+# only be traced back to the density. EBC and path length can not be estimated both at once, one
+# of them has to be known.
+class ColorIndex:
+    def __init__(self, lut=None):
+        if lut is None:
+            lut = olfarve_lut.get_default_lut()
+        self.density_scale = lut.density_scale
+        self.srgb = olfarve_batch.transfer_color_component(np.asarray(lut.table))
+        # The luminance strictly decreases with the density, the reversed table is sorted ascending
+        luminance = np.clip(np.asarray(lut.table), 0.0, 1.0) @ LUMINANCE
+        self.sorted_luminance = luminance[::-1]
+
+    # A first guess is found via the luminance index, the closest color is then searched within
+    # a window of neighbouring table entries and refined by projecting the query color onto the
+    # segments between the neighbouring entries. Returns the densities and the remaining sRGB
+    # distances to the simulated colors, which can be used to detect colors that are no beer colors.
+    def find_density_batch(self, rgb):
+        rgb = np.atleast_2d(np.asarray(rgb, dtype=float))
+        count = len(self.density_scale)
+        luminance = linearize_color_component(rgb) @ LUMINANCE
+        guess = count - 1 - np.searchsorted(self.sorted_luminance, luminance)
+        guess = np.clip(guess, SEARCH_WINDOW, count - 1 - SEARCH_WINDOW)
+
+        window = guess[:, np.newaxis] + np.arange(-SEARCH_WINDOW, SEARCH_WINDOW + 1)
+        dist = np.sum((self.srgb[window] - rgb[:, np.newaxis, :])**2, axis=2)
+        best = window[np.arange(len(rgb)), np.argmin(dist, axis=1)]
+
+        density = self.density_scale[best].copy()
+        distance = np.sqrt(np.min(dist, axis=1))
+        for neighbour in [ np.maximum(best - 1, 0), np.minimum(best + 1, count - 1) ]:
+            seg = self.srgb[neighbour] - self.srgb[best]
+            seg_len = np.maximum(np.sum(seg**2, axis=1), 1e-30)
+            f = np.clip(np.sum((rgb - self.srgb[best]) * seg, axis=1) / seg_len, 0.0, 1.0)
+            seg_dist = np.sqrt(np.sum((self.srgb[best] + seg * f[:, np.newaxis] - rgb)**2, axis=1))
+            better = seg_dist < distance
+            density[better] += f[better] * (self.density_scale[neighbour[better]] - self.density_scale[best[better]])
+            distance[better] = seg_dist[better]
+        return density, distance
+
+    # Estimate EBC ratings for (N,3) sRGB colors observed at known transmission paths in cm. With
+    # return_distance the sRGB distances of find_density_batch are returned as well.
+    def srgb_to_ebc_batch(self, rgb, path_cm=olfarve.DEFAULT_PATH, return_distance=False):
+        density, distance = self.find_density_batch(rgb)
+        return with_distance(density * 25.0 / path_cm, distance, return_distance)
+
+    # Estimate SRM ratings for (N,3) sRGB colors observed at known transmission paths in cm
+    def srgb_to_srm_batch(self, rgb, path_cm=olfarve.DEFAULT_PATH, return_distance=False):
+        density, distance = self.find_density_batch(rgb)
+        return with_distance(density * 12.7 / path_cm, distance, return_distance)
+
+    # Estimate transmission paths in cm for (N,3) sRGB colors of beers with known EBC ratings
+    def srgb_to_path_batch(self, rgb, ebc, return_distance=False):
+        if np.any(np.asarray(ebc) <= 0.0):
+            raise ValueError('EBC ratings must be positive')
+        density, distance = self.find_density_batch(rgb)
+        return with_distance(density * 25.0 / ebc, distance, return_distance)
+
+    def hex_to_ebc_batch(self, texts, path_cm=olfarve.DEFAULT_PATH, return_distance=False):
+        return self.srgb_to_ebc_batch([hex_to_rgb(i) for i in texts], path_cm, return_distance)
+
+def with_distance(value, distance, return_distance):
+    if return_distance:
+        return value, distance
+    return value
+
+default_index = None
+
+def get_default_index():
+    global default_index
+    if default_index is None:
+        default_index = ColorIndex()
+    return default_index
+
+# Estimate the EBC rating for a sRGB color in relative intensity observed at a transmission path in cm
+def srgb_to_ebc(rgb, path_cm=olfarve.DEFAULT_PATH):
+    return float(get_default_index().srgb_to_ebc_batch(rgb, path_cm)[0])
+
+# Estimate the SRM rating for a sRGB color in relative intensity observed at a transmission path in cm
+def srgb_to_srm(rgb, path_cm=olfarve.DEFAULT_PATH):
+    return float(get_default_index().srgb_to_srm_batch(rgb, path_cm)[0])
+
+# Estimate the EBC rating for a color in textual hex representation observed at a transmission path in cm
+def hex_to_ebc(text, path_cm=olfarve.DEFAULT_PATH):
+    return srgb_to_ebc(hex_to_rgb(text), path_cm)
+
+if __name__ == "__main__":
+    import time
+    index = get_default_index()
+    ebc = np.random.default_rng(0).uniform(1.0, 80.0, 10000)
+    rgb = olfarve_batch.ebc_to_srgb_batch(ebc)
+    start = time.perf_counter()
+    estimate = index.srgb_to_ebc_batch(rgb)
+    duration = time.perf_counter() - start
+    print('Queries: %d (%.2f us per query)' % (len(ebc), duration / len(ebc) * 1e6))
+    print('Max. EBC deviation: %.3g' % np.abs(estimate - ebc).max())
+    print('SRM 10: ' + olfarve.rgb_to_hex(olfarve.srm_to_srgb(10)) + ' -> %.2f' % srgb_to_srm(olfarve.srm_to_srgb(10)))
@@ -0,0 +1,111 @@
+# Ol farve: interpolated lookup table for sRGB color rendering of EBC beer color ratings
+# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import os
+import numpy as np
+import olfarve
+import olfarve_batch
+
+# Default table range, covers the typical beer colors and glass widths
+MAX_EBC = 160.0
+MAX_PATH = 20.0
+
+# The transmission spectrum and therefore the color only depends on the product of absorbance and
+# path length. Instead of an EBC x path table a single table over this optical density
+# (ebc / 25 * path_cm) covers all combinations of both. With the default resolution of 64
+# entries per unit of density (8193 entries, 96 kB) the interpolated colors deviate from
+# olfarve.ebc_to_srgb by at most 5.0e-5 relative intensity per channel (0.013 of an 8 bit step),
+# see calc_max_error.
+DENSITY_RESOLUTION = 64
+
+# Increment if the table layout changes
+TABLE_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'olfarve')
+
+# The table content depends on the spectral data, the color space conversion and the grid.
+# Any change of them results in a new key and therefore in a rebuild of the table.
+def calc_table_key(density_scale, engine=None):
+    h = hashlib.sha256()
+    h.update(str(TABLE_VERSION).encode())
+    spectral_data = [np.asarray(olfarve.CIE_DATA), olfarve_batch.ABSORBANCE_SHAPE]
+    if engine is not None:
+        spectral_data = [engine.weighted_cmf, engine.absorbance_shape]
+    for array in spectral_data + [olfarve_batch.XYZ_TO_SRGB, density_scale]:
+        h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    return h.hexdigest()[0:16]
+
+# The table holds linear intensities, which are smooth in the density, the sRGB transfer
+# function is applied after the interpolation.
+def build_table(density_scale, engine=None):
+    return olfarve_batch.beer_sd_to_linear_rgb_batch(density_scale, 1.0, engine).astype(np.float32)
+
+# The table is written to a temporary file first so concurrent processes never see a partial table
+def save_table(file_name, table):
+    tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_file_name, 'wb') as f:
+        np.save(f, table)
+    os.replace(tmp_file_name, file_name)
+
+# The table can be built for any spectral engine (see olfarve_spectral), by default the CIE data of
+# olfarve is used
+class ColorLUT:
+    def __init__(self, max_ebc=MAX_EBC, max_path=MAX_PATH, resolution=DENSITY_RESOLUTION, cache_dir=DEFAULT_CACHE_DIR, engine=None):
+        self.resolution = resolution
+        self.engine = engine
+        self.max_density = max_ebc / 25.0 * max_path
+        self.density_scale = np.arange(0, int(np.ceil(self.max_density * resolution)) + 1) / resolution
+        self.key = calc_table_key(self.density_scale, engine)
+        self.table = self.load(cache_dir)
+
+    # A table built once is memory-mapped by all later processes, so only the first launch
+    # pays the build
+    def load(self, cache_dir):
+        if cache_dir is None:
+            return build_table(self.density_scale, self.engine)
+        file_name = os.path.join(cache_dir, 'ebc_srgb_' + self.key + '.npy')
+        if not os.path.exists(file_name):
+            os.makedirs(cache_dir, exist_ok=True)
+            save_table(file_name, build_table(self.density_scale, self.engine))
+        return np.load(file_name, mmap_mode='r')
+
+    # Linear interpolation between the two surrounding grid points. Values outside of the
+    # table range are calculated with the exact spectral model.
+    def lookup_batch(self, ebc, path_cm=olfarve.DEFAULT_PATH):
+        density = np.ravel(np.asarray(ebc, dtype=float) / 25.0 * np.asarray(path_cm, dtype=float))
+        rgb = np.empty((len(density), 3))
+        inside = (density >= 0.0) & (density <= self.density_scale[-1])
+        if not np.all(inside):
+            rgb[~inside] = olfarve_batch.beer_sd_to_srgb_batch(density[~inside], 1.0, self.engine)
+
+        f = density[inside] * self.resolution
+        i = np.minimum(f.astype(int), len(self.density_scale) - 2)
+        w = (f - i)[:, np.newaxis]
+        rgb[inside] = olfarve_batch.transfer_color_component(self.table[i] * (1.0 - w) + self.table[i + 1] * w)
+        return rgb
+
+    def lookup(self, ebc, path_cm=olfarve.DEFAULT_PATH):
+        return self.lookup_batch(ebc, path_cm)[0].tolist()
+
+    # Determine the maximum deviation from the exact model at the cell centers, where the
+    # interpolation error is the largest
+    def calc_max_error(self):
+        density = (self.density_scale[:-1] + self.density_scale[1:]) / 2.0
+        exact = olfarve_batch.beer_sd_to_srgb_batch(density, 1.0, self.engine)
+        return np.abs(self.lookup_batch(density * 25.0, 1.0) - exact).max()
+
+default_lut = None
+
+# Shared table instance, the table is built or loaded on first use
+def get_default_lut():
+    global default_lut
+    if default_lut is None:
+        default_lut = ColorLUT()
+    return default_lut
+
+if __name__ == "__main__":
+    lut = get_default_lut()
+    print('Table: ' + str(lut.table.shape) + ' key ' + lut.key)
+    print('Max. deviation: %.3g' % lut.calc_max_error())
@@ -0,0 +1,110 @@
+# Ol farve: spectral rendering with selectable observers and illuminants
+# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>
+# SPDX-License-Identifier: MIT
+
+import functools
+import numpy as np
+import olfarve_batch
+
+CIE_1931_2 = 'CIE 1931 2 Degree Standard Observer'
+CIE_1964_10 = 'CIE 1964 10 Degree Standard Observer'
+
+# Default spectral range and increment in nm, same as olfarve.CIE_DATA
+MIN_WAVELENGTH = 380.0
+MAX_WAVELENGTH = 780.0
+WAVELENGTH_STEP = 5.0
+
+# Spectral data table, values has one row per wavelength and one column per function
+class SpectralTable:
+    def __init__(self, name, wavelengths, values):
+        self.name = name
+        self.wavelengths = np.asarray(wavelengths, dtype=float)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.wavelengths), -1)
+
+    # Linear interpolation onto another wavelength grid, the table is zero outside of its range
+    def resample(self, wavelengths):
+        return np.stack([np.interp(wavelengths, self.wavelengths, i, left=0.0, right=0.0) for i in self.values.T], axis=1)
+
+# Read a table in the CSV layout of the CIE data tables: wavelength in the first column, one
+# column per function and no header.
+def load_table_csv(file_name, name=None):
+    data = np.loadtxt(file_name, delimiter=',', ndmin=2)
+    return SpectralTable(name if name is not None else file_name, data[:, 0], data[:, 1:])
+
+# CIE standard illuminant A is defined by a formula (Planckian radiator at 2856 K)
+# https://cie.co.at/datatable/cie-standard-illuminant-1-nm
+def calc_illuminant_a(wavelengths):
+    c2 = 1.435e7
+    return 100.0 * (560.0 / wavelengths)**5 * (np.exp(c2 / (2848.0 * 560.0)) - 1.0) / (np.exp(c2 / (2848.0 * wavelengths)) - 1.0)
+
+builtin_observers = {
+    CIE_1931_2: SpectralTable(CIE_1931_2, olfarve_batch.WAVELENGTHS, olfarve_batch.CMF)
+}
+
+builtin_illuminants = {
+    'D65': SpectralTable('D65', olfarve_batch.WAVELENGTHS, olfarve_batch.D65),
+    'A': SpectralTable('A', np.arange(300.0, 831.0), calc_illuminant_a(np.arange(300.0, 831.0)))
+}
+
+# Observers and illuminants which are not built in (e.g. the CIE 1964 10 degree observer or the
+# F-series illuminants) are taken from the colour-science package.
+def get_observer(observer):
+    if isinstance(observer, SpectralTable):
+        return observer
+    if observer in builtin_observers:
+        return builtin_observers[observer]
+    import colour
+    cmfs = colour.MSDS_CMFS[observer]
+    return SpectralTable(observer, cmfs.wavelengths, cmfs.values)
+
+def get_illuminant(illuminant):
+    if isinstance(illuminant, SpectralTable):
+        return illuminant
+    if illuminant in builtin_illuminants:
+        return builtin_illuminants[illuminant]
+    import colour
+    sd = colour.SDS_ILLUMINANTS[illuminant]
+    return SpectralTable(illuminant, sd.wavelengths, sd.values)
+
+# Bradford chromatic adaptation transform
+BRADFORD = np.array([
+    [ 0.8951, 0.2664, -0.1614 ],
+    [ -0.7502, 1.7135, 0.0367 ],
+    [ 0.0389, -0.0685, 1.0296 ]
+])
+
+def calc_adaptation_matrix(white_src, white_dst):
+    lms_src = BRADFORD @ white_src
+    lms_dst = BRADFORD @ white_dst
+    return np.linalg.inv(BRADFORD) @ np.diag(lms_dst / lms_src) @ BRADFORD
+
+# Holds the absorbance shape and the illuminant weighted colour-matching functions for one
+# combination of observer, illuminant and wavelength grid. The engine can be passed to the
+# functions of olfarve_batch, olfarve_lut and olfarve_inverse. With adapt the colors are
+# chromatically adapted from the illuminant white to the D65 white of sRGB, otherwise the tint of
+# the light source stays visible.
+class SpectralEngine:
+    def __init__(self, observer=CIE_1931_2, illuminant='D65', step=WAVELENGTH_STEP, adapt=False):
+        self.observer = get_observer(observer)
+        self.illuminant = get_illuminant(illuminant)
+        self.wavelengths = np.arange(MIN_WAVELENGTH, MAX_WAVELENGTH + step / 2.0, step)
+        self.absorbance_shape = olfarve_batch.calc_absorbance_shape(self.wavelengths)
+        cmf = self.observer.resample(self.wavelengths)
+        spd = self.illuminant.resample(self.wavelengths)[:, 0]
+        self.weighted_cmf = spd[:, np.newaxis] * cmf / np.sum(spd * cmf[:, 1])
+        if adapt:
+            white_src = np.sum(self.weighted_cmf, axis=0)
+            white_dst = np.linalg.solve(olfarve_batch.XYZ_TO_SRGB, np.ones(3))
+            self.weighted_cmf = self.weighted_cmf @ calc_adaptation_matrix(white_src, white_dst).T
+
+    def ebc_to_srgb_batch(self, ebc_array, path_array):
+        return olfarve_batch.ebc_to_srgb_batch(ebc_array, path_array, self)
+
+    def srm_to_srgb_batch(self, srm_array, path_array):
+        return olfarve_batch.srm_to_srgb_batch(srm_array, path_array, self)
+
+# Engines are cached per combination, switching between them costs nothing after the first use.
+# Custom SpectralTable objects are cached per instance.
+@functools.lru_cache(maxsize=32)
+def get_engine(observer=CIE_1931_2, illuminant='D65', step=WAVELENGTH_STEP, adapt=False):
+    return SpectralEngine(observer, illuminant, step, adapt)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# Ol farve: generation of SRM/EBC color tables
+# Copyright 2022 Thomas Ascher <thomas.ascher@gmx.at>
+# SPDX-License-Identifier: MIT
+
+import argparse
+import json
+import sys
+import numpy as np
+import olfarve
+import olfarve_batch
+import olfarve_spectral
+
+# Number of rows which are computed and written at once
+CHUNK_ROWS = 16384
+
+class TableSpec:
+    def __init__(self, scale='SRM', start=1.0, stop=50.0, step=1.0, paths=None, observers=None,
+        illuminant='D65', wavelength_step=olfarve_spectral.WAVELENGTH_STEP, adapt=False, use_lut=False):
+        if not step > 0.0:
+            raise ValueError('step must be positive')
+        if not stop >= start:
+            raise ValueError('stop must not be below start')
+        self.scale = scale
+        self.start = start
+        self.step = step
+        self.value_count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        self.paths = np.asarray(paths if paths else [olfarve.DEFAULT_PATH], dtype=float)
+        self.observers = observers if observers else [olfarve_spectral.CIE_1931_2]
+        self.engines = [olfarve_spectral.get_engine(i, illuminant, wavelength_step, adapt) for i in self.observers]
+        self.luts = None
+        if use_lut:
+            import olfarve_lut
+            self.luts = [olfarve_lut.ColorLUT(engine=i) for i in self.engines]
+
+    def row_count(self):
+        return self.value_count * len(self.observers) * len(self.paths)
+
+    def to_ebc(self, values):
+        return values / 12.7 * 25.0 if self.scale == 'SRM' else values
+
+    # Rows are ordered by value, observer and path length, only the rows of one chunk are held in memory
+    def chunks(self, chunk_rows=CHUNK_ROWS):
+        for start in range(0, self.row_count(), chunk_rows):
+            rows = np.arange(start, min(start + chunk_rows, self.row_count()))
+            values = self.start + (rows // (len(self.paths) * len(self.observers))) * self.step
+            observers = (rows // len(self.paths)) % len(self.observers)
+            paths = self.paths[rows % len(self.paths)]
+            ebc = self.to_ebc(values)
+            rgb = np.empty((len(rows), 3))
+            for i, engine in enumerate(self.engines):
+                mask = observers == i
+                if self.luts is not None:
+                    rgb[mask] = self.luts[i].lookup_batch(ebc[mask], paths[mask])
+                else:
+                    rgb[mask] = olfarve_batch.ebc_to_srgb_batch(ebc[mask], paths[mask], engine)
+            yield values, paths, observers, rgb
+
+def format_value(value):
+    return '%.10g' % value
+
+# The path and observer columns are only written if more than one path length or observer is
+# requested, a table for a single path and observer matches the classic SRM,sRGB output of olfarve.
+def write_csv(out, spec):
+    with_path = len(spec.paths) > 1
+    with_observer = len(spec.observers) > 1
+    out.write(spec.scale + (',Observer' if with_observer else '') + (',Path' if with_path else '') + ',sRGB\n')
+    for values, paths, observers, rgb in spec.chunks():
+        hexs = olfarve_batch.rgb_to_hex_batch(rgb)
+        columns = [[format_value(i) for i in values]]
+        if with_observer:
+            columns.append(['"' + spec.observers[i] + '"' for i in observers])
+        if with_path:
+            columns.append([format_value(i) for i in paths])
+        columns.append(hexs)
+        out.write('\n'.join(','.join(row) for row in zip(*columns)) + '\n')
+
+def write_jsonl(out, spec):
+    for values, paths, observers, rgb in spec.chunks():
+        hexs = olfarve_batch.rgb_to_hex_batch(rgb)
+        lines = [json.dumps({ spec.scale: float(v), 'Observer': spec.observers[o], 'Path': float(p), 'sRGB': h, 'RGB': c })
+            for v, o, p, h, c in zip(values, observers, paths, hexs, rgb.tolist())]
+        out.write('\n'.join(lines) + '\n')
+
+# Apache Arrow IPC file, each chunk is written as record batch. Requires pyarrow.
+def write_arrow(out, spec):
+    import pyarrow as pa
+    observer_type = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema([(spec.scale, pa.float64()), ('Observer', observer_type), ('Path', pa.float32()),
+        ('R', pa.float32()), ('G', pa.float32()), ('B', pa.float32()), ('sRGB', pa.string())])
+    with pa.ipc.new_file(out, schema) as writer:
+        for values, paths, observers, rgb in spec.chunks():
+            observer_column = pa.DictionaryArray.from_arrays(observers.astype(np.int32), spec.observers)
+            writer.write_batch(pa.record_batch([values, observer_column, paths.astype(np.float32),
+                rgb[:, 0].astype(np.float32), rgb[:, 1].astype(np.float32), rgb[:, 2].astype(np.float32),
+                olfarve_batch.rgb_to_hex_batch(rgb)], schema=schema))
+
+writers = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'arrow': write_arrow
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate SRM/EBC to sRGB color tables.')
+    parser.add_argument('--scale', choices=['SRM', 'EBC'], default='SRM', help='color scale of the table values')
+    parser.add_argument('--start', type=float, default=1.0, help='first table value')
+    parser.add_argument('--stop', type=float, default=50.0, help='last table value (inclusive)')
+    parser.add_argument('--step', type=float, default=1.0, help='table value increment')
+    parser.add_argument('--path', type=float, nargs='+', help='transmission paths in cm (default %g)' % olfarve.DEFAULT_PATH)
+    parser.add_argument('--observer', nargs='+', help='colour-matching functions (default %s)' % olfarve_spectral.CIE_1931_2)
+    parser.add_argument('--illuminant', default='D65', help='illuminant (default D65)')
+    parser.add_argument('--wavelength-step', type=float, default=olfarve_spectral.WAVELENGTH_STEP, help='wavelength increment in nm')
+    parser.add_argument('--adapt', action='store_true', help='adapt the illuminant white to the sRGB white')
+    parser.add_argument('--format', choices=writers.keys(), default='csv', help='output format')
+    parser.add_argument('--lut', action='store_true', help='use the cached interpolated lookup table')
+    parser.add_argument('-o', '--output', help='output file (default stdout)')
+    args = parser.parse_args(argv)
+    if not args.step > 0.0:
+        parser.error('--step must be positive')
+    if not args.stop >= args.start:
+        parser.error('--stop must not be below --start')
+
+    spec = TableSpec(args.scale, args.start, args.stop, args.step, args.path, args.observer,
+        args.illuminant, args.wavelength_step, args.adapt, args.lut)
+
+    binary = args.format == 'arrow'
+    if args.output is not None:
+        with open(args.output, 'wb' if binary else 'w', newline='' if not binary else None) as out:
+            writers[args.format](out, spec)
+    else:
+        writers[args.format](sys.stdout.buffer if binary else sys.stdout, spec)
+
+if __name__ == "__main__":
+    main()
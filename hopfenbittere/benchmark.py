@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Hop Utilization, Recipe IBU and Isomerization Benchmark
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import time
+import numpy as np
+import pandas as pa
+import isomerization
+import recipe
+import utilization
+
+# Scan over the table entries per value and np.vectorize, the former implementation of the
+# utilization tables, as reference
+def scan_lookup(boil_times, utilizations, boil_time):
+    for entry_time, entry_utilization in zip(boil_times, utilizations):
+        if boil_time - entry_time <= 0:
+            return entry_utilization
+    return utilizations[-1]
+
+def scan_lookup_gravity(lut, gravity, boil_time):
+    for i, entry_gravity in enumerate(lut.gravities):
+        if gravity - entry_gravity <= 0:
+            return scan_lookup(lut.boil_times, lut.utilizations[i], boil_time)
+    return scan_lookup(lut.boil_times, lut.utilizations[-1], boil_time)
+
+scan_time_vectorized = np.vectorize(lambda lut, boil_time: scan_lookup(lut.boil_times, lut.utilizations, boil_time), otypes=[float], excluded=[0])
+scan_gravity_vectorized = np.vectorize(scan_lookup_gravity, otypes=[float], excluded=[0])
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def benchmark(count=1000000, seed=0):
+    rng = np.random.default_rng(seed)
+    boil_times = rng.uniform(0.0, 100.0, count)
+    gravities = rng.uniform(1.025, 1.095, count)
+    print('Values: %d' % count)
+    for name, lut in [('Garetz', utilization.lut_garetz), ('Rager', utilization.lut_rager)]:
+        scan = measure(lambda: scan_time_vectorized(lut, boil_times))
+        array = measure(lambda: lut.lookup(boil_times))
+        interpolated = measure(lambda: lut.lookup(boil_times, True))
+        if not np.array_equal(scan[1], array[1], equal_nan=True):
+            raise RuntimeError(name + ': results differ')
+        print('%s np.vectorize: %.3f s, searchsorted: %.3f s (%.0fx), interpolated: %.3f s' %
+            (name, scan[0], array[0], scan[0] / array[0], interpolated[0]))
+    for name, lut in [('Mosher', utilization.lut_mosher), ('Noonan', utilization.lut_noonan)]:
+        scan = measure(lambda: scan_gravity_vectorized(lut, gravities, boil_times))
+        array = measure(lambda: lut.lookup(gravities, boil_times))
+        interpolated = measure(lambda: lut.lookup(gravities, boil_times, True))
+        if not np.array_equal(scan[1], array[1], equal_nan=True):
+            raise RuntimeError(name + ': results differ')
+        print('%s np.vectorize: %.3f s, searchsorted: %.3f s (%.0fx), bilinear: %.3f s' %
+            (name, scan[0], array[0], scan[0] / array[0], interpolated[0]))
+
+# Synthetic recipes with a varying number of additions
+def create_recipes(count, max_additions=6, seed=0):
+    rng = np.random.default_rng(seed)
+    recipes = pa.DataFrame({
+        recipe.col_name_recipe: np.arange(count),
+        recipe.col_name_pre_boil_volume: rng.uniform(20.0, 1000.0, count),
+        recipe.col_name_pre_boil_extract: rng.uniform(9.0, 16.0, count),
+        recipe.col_name_boil_time: rng.choice([60.0, 75.0, 90.0], count),
+        recipe.col_name_evaporation_rate: rng.uniform(1.0, 6.0, count) })
+    recipes[recipe.col_name_evaporation_rate] *= recipes[recipe.col_name_pre_boil_volume] / 100.0
+    additions_per_recipe = rng.integers(1, max_additions + 1, count)
+    ids = np.repeat(recipes[recipe.col_name_recipe].to_numpy(), additions_per_recipe)
+    additions = pa.DataFrame({
+        recipe.col_name_recipe: ids,
+        recipe.col_name_weight: rng.uniform(5.0, 50.0, len(ids)) * recipes[recipe.col_name_pre_boil_volume].to_numpy()[ids] / 20.0,
+        recipe.col_name_alpha: rng.uniform(3.0, 16.0, len(ids)),
+        recipe.col_name_boil_time: rng.uniform(0.0, 60.0, len(ids)) })
+    return additions, recipes
+
+def benchmark_recipes(count=100000):
+    additions, recipes = create_recipes(count)
+    print('Recipes: %d, additions: %d' % (count, len(additions)))
+    for model in utilization.utilization_models:
+        duration, ibu = measure(lambda: recipe.calc_recipe_ibu(additions, recipes, model))
+        print('%s: %.3f s, mean %.1f IBU' % (model, duration, np.nanmean(ibu)))
+
+# Additions during the boil and the whirlpool of brews with different profiles
+def benchmark_simulation(count=10000, step=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    boil_times = rng.uniform(-20.0, 90.0, count)
+    profile = isomerization.TemperatureProfile(rng.choice([60.0, 90.0], count), rng.uniform(0.0, 30.0, count),
+        rng.uniform(5.0, 30.0, count), rng.uniform(0.0, 1000.0, count))
+    duration = measure(lambda: isomerization.simulate(boil_times, profile, step))[0]
+    print('Simulated additions: %d, step %.2f min: %.3f s, %.0f additions/s' % (count, step, duration, count / duration))
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_recipes()
+    benchmark_simulation()
@@ -0,0 +1,86 @@
+# Time-Stepped Simulation of the Hop Alpha Acid Isomerization
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import numpy as np
+from utilization import c_to_k
+
+# First order rate constants in 1/min of the isomerization of the alpha acids (k1) and the
+# degradation of the iso-alpha acids (k2) by Malowicki and Shellhammer (2005), temperature in K
+def calc_k1(temperature):
+    return 7.9e11 * np.exp(-11858.0 / temperature)
+
+def calc_k2(temperature):
+    return 4.1e12 * np.exp(-12994.0 / temperature)
+
+# The boiling point falls by about 1 °C per 300 m of elevation
+def calc_boiling_point(elevation):
+    return 100.0 - elevation / 300.0
+
+# Wort temperature in °C over the time since the start of the boil: boiling during the boil time,
+# Newton cooling towards the ambient temperature during the whirlpool and a linear ramp to the
+# final temperature during the cooling. All parameters may be arrays, e.g. one profile per
+# addition.
+class TemperatureProfile:
+    def __init__(self, boil_time=90.0, whirlpool_time=0.0, cooling_time=0.0, elevation=0.0, ambient_temperature=20.0,
+            whirlpool_cooling_rate=0.005, final_temperature=20.0):
+        self.boil_time = boil_time
+        self.whirlpool_time = whirlpool_time
+        self.cooling_time = cooling_time
+        self.boil_temperature = calc_boiling_point(elevation)
+        self.ambient_temperature = ambient_temperature
+        self.whirlpool_cooling_rate = whirlpool_cooling_rate
+        self.final_temperature = final_temperature
+
+    def get_duration(self):
+        return np.add(np.add(self.boil_time, self.whirlpool_time), self.cooling_time)
+
+    def get_whirlpool_temperature(self, whirlpool_time):
+        return self.ambient_temperature + (self.boil_temperature - self.ambient_temperature) * np.exp(-self.whirlpool_cooling_rate * whirlpool_time)
+
+    def calc_temperature(self, time):
+        whirlpool_time = np.clip(np.subtract(time, self.boil_time), 0.0, self.whirlpool_time)
+        temperature = self.get_whirlpool_temperature(whirlpool_time)
+        cooling_start = np.add(self.boil_time, self.whirlpool_time)
+        cooling_end_temperature = self.get_whirlpool_temperature(self.whirlpool_time)
+        cooling_fraction = np.clip(np.subtract(time, cooling_start) / np.maximum(self.cooling_time, 1e-12), 0.0, 1.0)
+        cooling_temperature = cooling_end_temperature + cooling_fraction * (np.subtract(self.final_temperature, cooling_end_temperature))
+        return np.where(np.greater(time, cooling_start), cooling_temperature, temperature)
+
+# Fractions of the added alpha acids which are left and which were isomerized at the end of the
+# profile. The boil time of an addition is the time before the end of the boil like in the
+# utilization models, negative times are additions during the whirlpool.
+#
+# The rate equations dA/dt = -k1 A and dI/dt = k1 A - k2 I are linear with rates which only
+# depend on the temperature. For each step the rates at the temperature in the middle of the step
+# are used and the equations are solved exactly over the step, which is stable for any step size.
+# All additions are integrated together on a common time grid, additions start within a step by
+# shortening their first step.
+def simulate(boil_time, profile, step=0.5):
+    boil_time = np.asarray(boil_time, dtype=float)
+    start = np.subtract(profile.boil_time, boil_time)
+    end = profile.get_duration()
+    start, end = np.broadcast_arrays(start, end)
+    alpha = np.ones(start.shape)
+    iso = np.zeros(start.shape)
+    total_end = np.max(end) if end.size > 0 else 0.0
+    for time in np.arange(np.min(start) if start.size > 0 else 0.0, total_end, step):
+        step_start = np.maximum(time, start)
+        step_end = np.minimum(time + step, end)
+        dt = np.maximum(step_end - step_start, 0.0)
+        temperature = c_to_k(profile.calc_temperature((step_start + step_end) / 2.0))
+        k1 = calc_k1(temperature)
+        k2 = calc_k2(temperature)
+        decay1 = np.exp(-k1 * dt)
+        decay2 = np.exp(-k2 * dt)
+        # k1 == k2 only happens at the same temperature for both, which the constants exclude
+        iso = iso * decay2 + alpha * k1 / (k2 - k1) * (decay1 - decay2)
+        alpha = alpha * decay1
+    return alpha, iso
+
+# Utilization in % from the isomerized fraction. Losses by the solubility, the trub and the
+# fermentation are not part of the kinetics, the efficiency scales the yield accordingly.
+def calc_utilization_simulated(boil_time, brew_data, whirlpool_time=0.0, cooling_time=0.0, efficiency=1.0, step=0.5):
+    profile = TemperatureProfile(brew_data.boil_time, whirlpool_time, cooling_time, brew_data.elevation)
+    alpha, iso = simulate(boil_time, profile, step)
+    return iso * efficiency * 100.0
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# Search of Hop Schedules and Malt Bills for a Target Bitterness and Colour
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pa
+import recipe
+from utilization import BrewData, utilization_models
+
+# Columns of the inventory tables: malt colour in EBC, alpha acid rating in %, available weight of
+# the malts in kg and of the hops in g. Without a weight column the amounts are unlimited.
+col_name_name = 'Name'
+col_name_ebc = 'EBC'
+col_name_alpha = 'Alpha'
+col_name_max_weight = 'MaxWeight'
+
+# Weight of the deviation of the colour relative to the bitterness and of the inventory excess
+ebc_weight = 1.0
+excess_weight = 100.0
+
+# The search variables of a candidate are the shares of the malts in the grist, the hop weights
+# and the boil times of the hops, all scaled to [0, 1]. Each hop is added once, a weight of 0
+# omits it. The grist weight and the brew parameters are fixed, so the original extract does not
+# depend on the malt bill. The colour model is a function of the malt weights, malt colours, cast
+# wort volume, boil time and original extract, like the ones of bierfarbe/colour_models.py. With
+# worker processes it has to be picklable.
+class Problem:
+    def __init__(self, malts, hops, target_ibu, target_ebc, grist_weight, brew_data, ebc_model, ibu_model='tinseth'):
+        self.malt_names = list(malts[col_name_name])
+        self.malt_ebcs = malts[col_name_ebc].to_numpy(dtype=float)
+        self.malt_max_weights = get_max_weights(malts)
+        self.hop_names = list(hops[col_name_name])
+        self.hop_alphas = hops[col_name_alpha].to_numpy(dtype=float)
+        self.hop_max_weights = get_max_weights(hops)
+        self.target_ibu = target_ibu
+        self.target_ebc = target_ebc
+        self.grist_weight = grist_weight
+        self.brew_data = brew_data
+        self.ibu_model = ibu_model
+        self.ebc_model = ebc_model
+        # Upper limit of the hop weight in g: the inventory or enough for the target at 5 % utilization
+        concentration_per_g = np.min(self.hop_alphas) / 100.0 * 1000.0 / brew_data.cast_wort_volume
+        self.hop_weight_limit = np.minimum(self.hop_max_weights, target_ibu / (concentration_per_g * 0.05))
+
+    def get_dimension(self):
+        return len(self.malt_names) + 2 * len(self.hop_names)
+
+    # Converts candidates into malt weights in kg, hop weights in g and hop boil times in min
+    def decode(self, population):
+        malt_count = len(self.malt_names)
+        hop_count = len(self.hop_names)
+        shares = population[:, :malt_count] + 1e-9
+        malt_weights = shares / np.sum(shares, axis=1, keepdims=True) * self.grist_weight
+        hop_weights = population[:, malt_count:malt_count + hop_count] * self.hop_weight_limit
+        boil_times = population[:, malt_count + hop_count:] * self.brew_data.boil_time
+        return malt_weights, hop_weights, boil_times
+
+    def predict(self, population):
+        malt_weights, hop_weights, boil_times = self.decode(population)
+        count = len(population)
+        hop_count = len(self.hop_names)
+        recipes = pa.DataFrame({
+            recipe.col_name_recipe: np.arange(count),
+            recipe.col_name_elevation: self.brew_data.elevation,
+            recipe.col_name_pre_boil_volume: self.brew_data.pre_boil_volume,
+            recipe.col_name_pre_boil_extract: self.brew_data.pre_boil_extract,
+            recipe.col_name_boil_time: self.brew_data.boil_time,
+            recipe.col_name_evaporation_rate: self.brew_data.evaporation_rate })
+        additions = pa.DataFrame({
+            recipe.col_name_recipe: np.repeat(np.arange(count), hop_count),
+            recipe.col_name_weight: hop_weights.ravel(),
+            recipe.col_name_alpha: np.tile(self.hop_alphas, count),
+            recipe.col_name_boil_time: boil_times.ravel() })
+        ibu = recipe.calc_recipe_ibu(additions, recipes, self.ibu_model).to_numpy()
+        ebc = self.ebc_model(malt_weights, self.malt_ebcs, self.brew_data.cast_wort_volume,
+            self.brew_data.boil_time, self.brew_data.oe)
+        return ibu, ebc
+
+    # Squared relative deviations from the targets plus the relative excess of the malt inventory,
+    # the hop weights are limited by the inventory already
+    def calc_cost(self, population):
+        ibu, ebc = self.predict(population)
+        malt_weights = self.decode(population)[0]
+        excess = np.sum(np.maximum(malt_weights - self.malt_max_weights, 0.0) / self.grist_weight, axis=1)
+        cost = ((ibu - self.target_ibu) / self.target_ibu)**2 + ebc_weight * ((ebc - self.target_ebc) / self.target_ebc)**2
+        cost += excess_weight * excess
+        return np.where(np.isfinite(cost), cost, np.inf)
+
+def get_max_weights(inventory):
+    if col_name_max_weight not in inventory.columns:
+        return np.full(len(inventory), np.inf)
+    return inventory[col_name_max_weight].fillna(np.inf).to_numpy(dtype=float)
+
+def evaluate_chunk(job):
+    problem, population = job
+    return problem.calc_cost(population)
+
+# The population is split into one chunk per worker, without an executor it is evaluated in the
+# calling process
+def evaluate_population(problem, population, executor=None, chunk_count=1):
+    if executor is None or chunk_count <= 1:
+        return problem.calc_cost(population)
+    chunks = np.array_split(population, chunk_count)
+    return np.concatenate(list(executor.map(evaluate_chunk, [(problem, i) for i in chunks])))
+
+min_population_size = 4
+
+class OptimizationResult:
+    def __init__(self, problem, candidate, cost, generations):
+        self.candidate = candidate
+        self.cost = cost
+        self.generations = generations
+        malt_weights, hop_weights, boil_times = problem.decode(candidate[np.newaxis, :])
+        ibu, ebc = problem.predict(candidate[np.newaxis, :])
+        self.ibu = ibu[0]
+        self.ebc = ebc[0]
+        self.malt_bill = pa.DataFrame({ col_name_name: problem.malt_names, 'Weight': malt_weights[0] })
+        self.hop_schedule = pa.DataFrame({ col_name_name: problem.hop_names, 'Weight': hop_weights[0], 'BoilTime': boil_times[0] })
+
+# Differential evolution (DE/rand/1/bin) over the unit cube. A generation creates the trial
+# candidates of the whole population at once and evaluates them in one batch, spread over a
+# process pool with max_workers other than 1. The search stops after the generation limit or when
+# the best cost is below the tolerance. Each candidate needs three partners besides itself, so the
+# population has at least 4 candidates.
+def optimize(problem, population_size=60, generations=200, mutation=0.7, crossover=0.9, tolerance=1e-8, seed=0, max_workers=1):
+    if population_size < min_population_size:
+        raise ValueError('population of %d candidates, at least %d are needed' % (population_size, min_population_size))
+    rng = np.random.default_rng(seed)
+    dimension = problem.get_dimension()
+    population = rng.uniform(0.0, 1.0, (population_size, dimension))
+    chunk_count = max_workers if max_workers is not None else os.cpu_count()
+    executor = ProcessPoolExecutor(max_workers=chunk_count) if chunk_count > 1 else None
+    generation = 0
+    try:
+        cost = evaluate_population(problem, population, executor, chunk_count)
+        while generation < generations and np.min(cost) > tolerance:
+            generation += 1
+            # Three distinct partners per candidate, all different from the candidate itself
+            partners = np.argsort(rng.random((population_size, population_size - 1)), axis=1)[:, :3]
+            partners += partners >= np.arange(population_size)[:, np.newaxis]
+            mutant = population[partners[:, 0]] + mutation * (population[partners[:, 1]] - population[partners[:, 2]])
+            cross = rng.random((population_size, dimension)) < crossover
+            cross[np.arange(population_size), rng.integers(0, dimension, population_size)] = True
+            trial = np.clip(np.where(cross, mutant, population), 0.0, 1.0)
+            trial_cost = evaluate_population(problem, trial, executor, chunk_count)
+            better = trial_cost <= cost
+            population[better] = trial[better]
+            cost[better] = trial_cost[better]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    best = np.argmin(cost)
+    return OptimizationResult(problem, population[best], cost[best], generation)
+
+# The command line uses the colour models of the beer colour article, its directory has to be on
+# the module search path, e.g. PYTHONPATH=../bierfarbe
+def main(argv=None):
+    try:
+        import colour_models
+    except ImportError:
+        sys.exit('optimizer.py: the colour models are not found, add the bierfarbe directory to PYTHONPATH')
+    parser = argparse.ArgumentParser(description='Search hop weights, boil times and malt shares for a target IBU and EBC.')
+    parser.add_argument('malts', help='malt inventory (' + ', '.join([col_name_name, col_name_ebc, col_name_max_weight]) + ')')
+    parser.add_argument('hops', help='hop inventory (' + ', '.join([col_name_name, col_name_alpha, col_name_max_weight]) + ')')
+    parser.add_argument('--ibu', type=float, required=True, help='target bitterness')
+    parser.add_argument('--ebc', type=float, required=True, help='target colour')
+    parser.add_argument('--grist-weight', type=float, required=True, help='grist weight in kg')
+    parser.add_argument('--volume', type=float, default=25.0, help='pre-boil volume in l')
+    parser.add_argument('--extract', type=float, default=10.5, help='pre-boil extract in °P')
+    parser.add_argument('--boil-time', type=float, default=90.0, help='boil time in min')
+    parser.add_argument('--evaporation-rate', type=float, default=2.0, help='evaporation in l/h')
+    parser.add_argument('--elevation', type=float, default=353.0, help='elevation in m')
+    parser.add_argument('--ibu-model', choices=list(utilization_models.keys()), default='tinseth', help='utilization model')
+    parser.add_argument('--ebc-model', choices=list(colour_models.ebc_models.keys()), default='morey', help='colour model')
+    parser.add_argument('--population', type=int, default=60, help='candidates per generation')
+    parser.add_argument('--generations', type=int, default=200, help='generation limit')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='worker processes, 0 for the number of cores')
+    args = parser.parse_args(argv)
+    if args.population < min_population_size:
+        parser.error('--population must be at least %d' % min_population_size)
+
+    brew_data = BrewData(args.elevation, args.volume, args.extract, args.boil_time, args.evaporation_rate)
+    problem = Problem(pa.read_csv(args.malts, delimiter=','), pa.read_csv(args.hops, delimiter=','), args.ibu, args.ebc,
+        args.grist_weight, brew_data, colour_models.ebc_models[args.ebc_model], args.ibu_model)
+    result = optimize(problem, args.population, args.generations, seed=args.seed, max_workers=args.jobs if args.jobs > 0 else None)
+    print('IBU: %.1f, EBC: %.1f, cost: %.3g, generations: %d' % (result.ibu, result.ebc, result.cost, result.generations))
+    print()
+    print(result.malt_bill.to_string(index=False, float_format='%.2f'))
+    print()
+    print(result.hop_schedule.to_string(index=False, float_format='%.1f'))
+
+if __name__ == "__main__":
+    main()
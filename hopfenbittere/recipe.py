@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# IBU Calculation of Recipes with Several Hop Additions
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import argparse
+import numpy as np
+import pandas as pa
+from utilization import BrewData, calc_alpha_acid_concentration, calc_ibu, utilization_models, table_models, ibu_dependent_models
+
+# Columns of the hop addition table, one row per addition: weight in g, alpha acid rating in %
+# and boil time in min
+col_name_recipe = 'Recipe'
+col_name_weight = 'Weight'
+col_name_alpha = 'Alpha'
+col_name_boil_time = 'BoilTime'
+
+# Columns of the recipe table, one row per recipe: volume in l, extract in °P, boil time in min,
+# evaporation in l/h and elevation in m. Missing columns get the values of the example brew.
+col_name_pre_boil_volume = 'PreBoilVolume'
+col_name_pre_boil_extract = 'PreBoilExtract'
+col_name_evaporation_rate = 'EvaporationRate'
+col_name_elevation = 'Elevation'
+
+col_name_ibu = 'IBU'
+
+recipe_columns = {
+    col_name_elevation: 'elevation',
+    col_name_pre_boil_volume: 'pre_boil_volume',
+    col_name_pre_boil_extract: 'pre_boil_extract',
+    col_name_boil_time: 'boil_time',
+    col_name_evaporation_rate: 'evaporation_rate'
+}
+
+# Brew data with one entry per recipe
+def create_brew_data(recipes):
+    default = BrewData()
+    params = {}
+    for col_name, name in recipe_columns.items():
+        if col_name in recipes.columns:
+            params[name] = recipes[col_name].to_numpy(dtype=float)
+        else:
+            params[name] = np.full(len(recipes), getattr(default, name), dtype=float)
+    return BrewData(**params)
+
+# Position of the recipe of each addition in the recipe table
+def get_recipe_index(additions, recipes):
+    index = pa.Index(recipes[col_name_recipe]).get_indexer(additions[col_name_recipe])
+    if np.any(index < 0):
+        missing = pa.unique(additions[col_name_recipe][index < 0])
+        raise ValueError('additions of unknown recipes: ' + ', '.join(map(str, missing[:10])))
+    return index
+
+def get_utilization_model(model):
+    if callable(model):
+        return model
+    return utilization_models[model]
+
+# IBU of every addition with the brew data of its recipe (one entry per addition). The model is a
+# name of utilization_models or any function of the boil time and the brew data.
+def calc_addition_ibu(boil_time, weight, alpha, addition_data, model='tinseth', interpolate=False):
+    func = get_utilization_model(model)
+    if interpolate and model in table_models:
+        utilization = func(boil_time, addition_data, interpolate=True)
+    else:
+        utilization = func(boil_time, addition_data)
+    concentration = calc_alpha_acid_concentration(weight, alpha, addition_data.cast_wort_volume)
+    return calc_ibu(concentration, utilization)
+
+# Sums the IBU of the additions per recipe, recipes without additions have 0 IBU
+def sum_per_recipe(values, index, count):
+    return np.bincount(index, weights=values, minlength=count)
+
+def get_addition_arrays(additions):
+    return (additions[col_name_boil_time].to_numpy(dtype=float), additions[col_name_weight].to_numpy(dtype=float),
+        additions[col_name_alpha].to_numpy(dtype=float))
+
+# Total IBU per recipe and its solver statistics. Recipes which did not converge within the
+# maximum number of iterations or have an undefined IBU are not converged.
+class SolverResult:
+    def __init__(self, ibu, iterations, converged):
+        self.ibu = ibu
+        self.iterations = iterations
+        self.converged = converged
+
+# The hopping rate correction of Garetz and Daniels depends on the total IBU, which is the sum
+# over the additions evaluated with that correction, so the total IBU is the fixed point
+# T = g(T). Newton's method solves T - g(T) = 0 with a forward difference for g', the fixed-point
+# iteration T = g(T) needs one evaluation per iteration instead of two but converges only
+# linearly. Each iteration only evaluates the additions of the recipes which are not converged
+# yet. The iteration starts at the IBU without the correction.
+def solve_total_ibu(boil_time, weight, alpha, brew_data, index, model='garetz', interpolate=False,
+        tolerance=1e-6, max_iterations=50, method='newton'):
+    if method not in ('newton', 'fixed-point'):
+        raise ValueError('unknown solver method ' + method)
+    count = len(np.atleast_1d(brew_data.pre_boil_sg))
+    addition_data = brew_data.select(index)
+    ibu = np.zeros(count)
+    iterations = np.zeros(count, dtype=int)
+    converged = np.zeros(count, dtype=bool)
+    active = np.ones(count, dtype=bool)
+
+    def calc_total(total_ibu, additions):
+        data = addition_data.select(additions)
+        data.total_ibu = total_ibu[index[additions]]
+        return sum_per_recipe(calc_addition_ibu(boil_time[additions], weight[additions], alpha[additions], data, model, interpolate),
+            index[additions], count)
+
+    ibu = calc_total(ibu, np.ones(len(index), dtype=bool))
+    for i in range(max_iterations):
+        additions = active[index]
+        total = calc_total(ibu, additions)
+        if method == 'newton':
+            step = np.maximum(1e-6, 1e-6 * np.abs(ibu))
+            derivative = (calc_total(ibu + step, additions) - total) / step
+            denominator = 1.0 - derivative
+            valid = np.abs(denominator) > 1e-12
+            update = np.where(valid, ibu - (ibu - total) / np.where(valid, denominator, 1.0), total)
+        else:
+            update = total
+        update = np.where(active, update, ibu)
+        iterations += active
+        finite = np.isfinite(update)
+        done = active & finite & (np.abs(update - ibu) <= tolerance)
+        ibu = update
+        converged |= done
+        active &= finite & ~done
+        if not np.any(active):
+            break
+    return SolverResult(ibu, iterations, converged)
+
+# IBU of all recipes in one pass over the additions, the total IBU of the models with the
+# hopping rate correction is solved iteratively
+def calc_recipe_ibu(additions, recipes, model='tinseth', interpolate=False, **solver_args):
+    return calc_recipe_ibu_result(additions, recipes, model, interpolate, **solver_args).ibu
+
+def calc_recipe_ibu_result(additions, recipes, model='tinseth', interpolate=False, **solver_args):
+    brew_data = create_brew_data(recipes)
+    index = get_recipe_index(additions, recipes)
+    boil_time, weight, alpha = get_addition_arrays(additions)
+    if model in ibu_dependent_models:
+        result = solve_total_ibu(boil_time, weight, alpha, brew_data, index, model, interpolate, **solver_args)
+    else:
+        ibu = sum_per_recipe(calc_addition_ibu(boil_time, weight, alpha, brew_data.select(index), model, interpolate), index, len(recipes))
+        result = SolverResult(ibu, np.zeros(len(recipes), dtype=int), np.isfinite(ibu))
+    result.ibu = pa.Series(result.ibu, index=pa.Index(recipes[col_name_recipe], name=col_name_recipe), name=col_name_ibu)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Calculate the IBU of recipes with several hop additions.')
+    parser.add_argument('additions', help='hop additions (' + ', '.join([col_name_recipe, col_name_weight, col_name_alpha, col_name_boil_time]) + ')')
+    parser.add_argument('recipes', help='recipe parameters (' + ', '.join([col_name_recipe] + list(recipe_columns.keys())) + ')')
+    parser.add_argument('-m', '--model', choices=list(utilization_models.keys()), default='tinseth', help='utilization model')
+    parser.add_argument('--interpolate', action='store_true', help='interpolate the utilization tables')
+    parser.add_argument('--method', choices=['newton', 'fixed-point'], default='newton', help='solver for the total IBU of the Garetz and Daniels models')
+    parser.add_argument('--tolerance', type=float, default=1e-6, help='absolute IBU tolerance of the solver')
+    parser.add_argument('--max-iterations', type=int, default=50, help='iteration limit of the solver')
+    parser.add_argument('-o', '--output', default='ibu.csv', help='IBU per recipe')
+    args = parser.parse_args(argv)
+
+    additions = pa.read_csv(args.additions, delimiter=',')
+    recipes = pa.read_csv(args.recipes, delimiter=',')
+    result = calc_recipe_ibu_result(additions, recipes, args.model, args.interpolate,
+        tolerance=args.tolerance, max_iterations=args.max_iterations, method=args.method)
+    if args.model in ibu_dependent_models:
+        print('Iterations: mean %.1f, max %d, not converged: %d' %
+            (result.iterations.mean(), result.iterations.max(), np.count_nonzero(~result.converged)))
+    result.ibu.to_csv(args.output, index=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# Hop Utilization Models
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import copy
+from math import nan
+import numpy as np
+
+def p_to_sg(p):
+    return p / (258.6 - (p / 258.2 * 227.1)) + 1.0
+
+def c_to_k(c):
+    return c + 273.15
+
+def calc_alpha_acid_concentration(hop_weight, alpha_acid_rating, cast_wort_volume):
+    hop_weight_mg = hop_weight * 1000.0
+    alpha_acid_rating_decimal = alpha_acid_rating / 100.0
+    return alpha_acid_rating_decimal * hop_weight_mg / cast_wort_volume
+
+# The tables list the utilization up to a boil time, i.e. an entry applies to the boil times
+# after the previous entry up to its own. Boil times after the last entry get the last value.
+# The lookup is a binary search over the sorted times and works on arrays of any shape. With
+# interpolate the utilization is interpolated linearly between the entries instead.
+class TimeLUT:
+    def __init__(self, boil_times, utilizations):
+        self.boil_times = np.asarray(boil_times, dtype=float)
+        self.utilizations = np.asarray(utilizations, dtype=float)
+
+    def lookup(self, boil_time, interpolate=False):
+        return lookup_time(self.boil_times, self.utilizations, boil_time, interpolate)
+
+# Time tables for several gravities with a common time axis, stored as one matrix with a row per
+# gravity. The gravity steps like the time. With interpolate the utilization is interpolated
+# bilinearly over time and gravity, gravities outside of the table get the first or last row.
+class GravityLUT:
+    def __init__(self, gravities, time_luts):
+        self.gravities = np.asarray(gravities, dtype=float)
+        self.boil_times = time_luts[0].boil_times
+        for i in time_luts:
+            if not np.array_equal(i.boil_times, self.boil_times):
+                raise ValueError('time tables with different boil times')
+        self.utilizations = np.stack([i.utilizations for i in time_luts])
+
+    def lookup(self, gravity, boil_time, interpolate=False):
+        gravity, boil_time = np.broadcast_arrays(np.asarray(gravity, dtype=float), np.asarray(boil_time, dtype=float))
+        count = len(self.gravities)
+        if not interpolate:
+            row = np.minimum(np.searchsorted(self.gravities, gravity, side='left'), count - 1)
+            return lookup_time(self.boil_times, self.utilizations[row], boil_time, False)
+        upper = np.clip(np.searchsorted(self.gravities, gravity, side='left'), 1, count - 1)
+        lower = upper - 1
+        weight = np.clip((gravity - self.gravities[lower]) / (self.gravities[upper] - self.gravities[lower]), 0.0, 1.0)
+        weight = np.where(np.isnan(gravity), 1.0, weight)
+        utilization_lower = lookup_time(self.boil_times, self.utilizations[lower], boil_time, True)
+        utilization_upper = lookup_time(self.boil_times, self.utilizations[upper], boil_time, True)
+        return np.where(weight == 0.0, utilization_lower, np.where(weight == 1.0, utilization_upper,
+            utilization_lower + weight * (utilization_upper - utilization_lower)))
+
+# The utilizations are either one row for all boil times or one row per boil time, the latter for
+# the rows of a gravity table. Missing boil times compare greater than all entries and get the
+# last value like in the scan over the table.
+def lookup_time(boil_times, utilizations, boil_time, interpolate):
+    boil_time = np.asarray(boil_time, dtype=float)
+    count = len(boil_times)
+    index = np.minimum(np.searchsorted(boil_times, boil_time, side='left'), count - 1)
+    if utilizations.ndim == 1:
+        take = lambda i: utilizations[i]
+    else:
+        take = lambda i: np.take_along_axis(utilizations, i[..., np.newaxis], axis=-1)[..., 0]
+    result = take(index)
+    if not interpolate:
+        return result
+    lower = np.maximum(index - 1, 0)
+    lower_time = boil_times[lower]
+    upper_time = boil_times[index]
+    inside = (boil_time > lower_time) & (boil_time < upper_time)
+    weight = np.where(inside, (boil_time - lower_time) / np.where(inside, upper_time - lower_time, 1.0), 1.0)
+    lower_value = take(lower)
+    return np.where(inside, lower_value + weight * (result - lower_value), result)
+
+burch_time = [14, 44, 60, 61]
+lut_burch = TimeLUT(burch_time, [5.0, 12.0, 30.0, nan])
+
+rager_time = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 51, 60, 61]
+lut_rager = TimeLUT(rager_time, [5.0, 6.0, 8.0, 10.1, 12.1, 15.3, 18.8, 22.8, 26.9, 28.1, 30.0, 30.0, nan])
+
+garetz_time = [10, 15, 20, 25, 30, 35, 40, 45, 50, 60, 70, 80, 90, 91]
+lut_garetz = TimeLUT(garetz_time, [0, 2, 5, 8, 11, 14, 16, 18, 19, 20, 21, 22, 23, nan])
+
+mosher_time = [5, 15, 30, 45, 60, 90, 91]
+lut_mosher_1030 = TimeLUT(mosher_time, [5.0, 12.0, 17.0, 21.0, 24.0, 28.0, nan])
+lut_mosher_1040 = TimeLUT(mosher_time, [5.0, 12.0, 17.0, 21.0, 23.0, 27.0, nan])
+lut_mosher_1050 = TimeLUT(mosher_time, [4.0, 11.0, 16.0, 20.0, 23.0, 26.0, nan])
+lut_mosher_1060 = TimeLUT(mosher_time, [4.0, 11.0, 16.0, 19.0, 22.0, 26.0, nan])
+lut_mosher_1070 = TimeLUT(mosher_time, [3.0, 11.0, 15.0, 18.0, 21.0, 25.0, nan])
+lut_mosher_1080 = TimeLUT(mosher_time, [3.0, 10.0, 15.0, 17.0, 20.0, 23.0, nan])
+lut_mosher_1090 = TimeLUT(mosher_time, [3.0, 9.0, 13.0, 16.0, 18.0, 21.0, nan])
+mosher_gravity = [1.030, 1.040, 1.050, 1.060, 1.070, 1.080, 1.090]
+lut_mosher = GravityLUT(mosher_gravity, [lut_mosher_1030, lut_mosher_1040, lut_mosher_1050, lut_mosher_1060, lut_mosher_1070, lut_mosher_1080, lut_mosher_1090])
+
+daniels_time = [9, 19, 29, 44, 49, 74, 75]
+lut_daniels = TimeLUT(daniels_time, [5, 12, 15, 19, 22, 24, 27])
+
+noonan_time = [4, 5, 15, 30, 60, 90, 91]
+lut_noonan_1032 = TimeLUT(noonan_time, [5, 5, 8, 15, 28, 31, nan])
+lut_noonan_1051 = TimeLUT(noonan_time, [4, 5, 8, 14, 26, 28, nan])
+lut_noonan_1066 = TimeLUT(noonan_time, [4, 5, 7, 13, 24, 27, nan])
+lut_noonan_1076 = TimeLUT(noonan_time, [4, 4, 7, 13, 23, 26, nan])
+lut_noonan_1086 = TimeLUT(noonan_time, [3, 4, 7, 12, 21, 24, nan])
+noonan_gravity = [1.032, 1.051, 1.066, 1.076, 1.086]
+lut_noonan = GravityLUT(noonan_gravity, [lut_noonan_1032, lut_noonan_1051, lut_noonan_1066, lut_noonan_1076, lut_noonan_1086])
+
+# The utilization functions take the boil times and the brew data, both may be arrays which are
+# broadcast against each other
+
+def calc_utilization_burch(boil_time, brew_data, interpolate=False):
+    return lut_burch.lookup(boil_time, interpolate)
+
+def calc_fga_rager(sg):
+    gravity_adjustment = np.where(sg > 1.050, (sg - 0.05) / 2.0, 0.0)
+    return 1.0 / (1.0 + gravity_adjustment)
+
+def calc_utilization_rager(boil_time, brew_data, interpolate=False):
+    utilization = lut_rager.lookup(boil_time, interpolate)
+    return utilization * calc_fga_rager(brew_data.pre_boil_sg)
+
+def calc_utilization_rager_function(boil_time, brew_data):
+    utilization = 18.11 + (13.86 * np.tanh((boil_time - 31.32) / 18.27))
+    return utilization * calc_fga_rager(brew_data.pre_boil_sg)
+
+def calc_fhr_garetz(total_ibu):
+    return 1.0 / ((total_ibu / 260.0) + 1.0)
+
+def calc_fsp_garetz(elevation):
+    return 1.0 / ((elevation * 3.2808 / 550.0 * 0.02) + 1.0)
+
+def calc_fx_garetz(brew_data):
+    return calc_fga_rager(brew_data.pre_boil_sg) * calc_fhr_garetz(brew_data.total_ibu) * calc_fsp_garetz(brew_data.elevation)
+
+def calc_utilization_garetz(boil_time, brew_data, interpolate=False):
+    utilization = lut_garetz.lookup(boil_time, interpolate)
+    return utilization * calc_fx_garetz(brew_data)
+
+def calc_utilization_garetz_function(boil_time, brew_data):
+    utilization = np.maximum(0.0, 7.2994 + (15.0746 * np.tanh((boil_time - 21.86) / 24.71)))
+    return utilization * calc_fx_garetz(brew_data)
+
+def calc_utilization_mosher(boil_time, brew_data, interpolate=False):
+    return lut_mosher.lookup(brew_data.og, boil_time, interpolate)
+
+def calc_utilization_tinseth(boil_time, brew_data):
+    gravity_adjustment = 1.65 * np.power(0.000125, brew_data.sg_mean - 1.0)
+    time_adjustment = (1.0 - np.exp(-0.04 * boil_time)) / 4.15 * 100.0
+    return gravity_adjustment * time_adjustment
+
+def calc_utilization_daniels(boil_time, brew_data, interpolate=False):
+    utilization = lut_daniels.lookup(boil_time, interpolate)
+    return utilization * calc_fga_rager(brew_data.pre_boil_sg) * calc_fhr_garetz(brew_data.total_ibu)
+
+def calc_utilization_noonan(boil_time, brew_data, interpolate=False):
+    return lut_noonan.lookup(brew_data.og, boil_time, interpolate)
+
+def calc_ibu(alpha_acid_concentration, utilization):
+    utilization_decimal = utilization / 100.0
+    return alpha_acid_concentration * utilization_decimal
+
+# Utilization models by name, the table based models accept interpolate
+utilization_models = {
+    'tinseth': calc_utilization_tinseth,
+    'burch': calc_utilization_burch,
+    'rager': calc_utilization_rager,
+    'rager-function': calc_utilization_rager_function,
+    'garetz': calc_utilization_garetz,
+    'garetz-function': calc_utilization_garetz_function,
+    'mosher': calc_utilization_mosher,
+    'daniels': calc_utilization_daniels,
+    'noonan': calc_utilization_noonan
+}
+
+table_models = ['burch', 'rager', 'garetz', 'mosher', 'daniels', 'noonan']
+
+# Models with the hopping rate correction, their utilization depends on the total IBU of the brew
+ibu_dependent_models = ['garetz', 'garetz-function', 'daniels']
+
+# Parameters of one brew or, with arrays, of many brews. The defaults are the example brew of the
+# article. Without a hop schedule the total IBU for the hopping rate correction is unknown, it is
+# approximated by the Tinseth utilization of the boil time unless given. The recipe calculation
+# solves it instead (see recipe.solve_total_ibu).
+class BrewData:
+    def __init__(self, elevation=353, pre_boil_volume=25, pre_boil_extract=10.5, boil_time=90.0, evaporation_rate=2, total_ibu=None):
+        self.elevation = elevation
+        self.pre_boil_volume = pre_boil_volume
+        self.pre_boil_extract = pre_boil_extract
+        self.pre_boil_sg = p_to_sg(self.pre_boil_extract)
+        self.boil_time = boil_time
+        self.evaporation_rate = evaporation_rate
+        self.cast_wort_volume = self.pre_boil_volume - (evaporation_rate * self.boil_time / 60.0)
+        self.oe = self.pre_boil_extract * self.pre_boil_volume / self.cast_wort_volume
+        self.og = p_to_sg(self.oe)
+        self.sg_mean = (self.og + self.pre_boil_sg) / 2.0
+        if total_ibu is None:
+            total_ibu = calc_utilization_tinseth(self.boil_time, self)
+        self.total_ibu = total_ibu
+
+    # Brew data of the brews at the index, e.g. one entry per hop addition of a recipe table
+    def select(self, index):
+        selected = copy.copy(self)
+        for name, value in vars(self).items():
+            if np.ndim(value) > 0:
+                setattr(selected, name, np.asarray(value)[index])
+        return selected
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Generation of the figures of all articles
+# Copyright 2022 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+root_dir = os.path.dirname(os.path.abspath(__file__))
+state_file_name = os.path.join(root_dir, '.figures.json')
+
+# Files written by the figure scripts, all other existing files named in a script are inputs
+output_extensions = ('.pdf', '.png', '.svg', '.tex')
+
+# Figure scripts are Python files of the article directories which save matplotlib figures. Tools
+# with a main function (e.g. refraktometer/analysis.py) write their results elsewhere and are
+# only run on demand.
+def is_figure_script(source):
+    tree = ast.parse(source)
+    functions = [i.name for i in tree.body if isinstance(i, ast.FunctionDef)]
+    saves = any(isinstance(i, ast.Attribute) and i.attr == 'savefig' for i in ast.walk(tree))
+    return saves and 'main' not in functions
+
+def find_scripts(dirs=None):
+    if not dirs:
+        dirs = sorted(i for i in glob.glob(os.path.join(root_dir, '*')) if os.path.isdir(i))
+    scripts = []
+    for i in dirs:
+        for file_name in sorted(glob.glob(os.path.join(i, '*.py'))):
+            with open(file_name, encoding='utf-8') as f:
+                if is_figure_script(f.read()):
+                    scripts.append(os.path.abspath(file_name))
+    return scripts
+
+# The modules of the same directory which are imported by a script, recursively
+def find_local_modules(file_name, found=None):
+    if found is None:
+        found = set()
+    with open(file_name, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [i.name for i in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module is not None:
+            names.append(node.module)
+    for name in names:
+        module = os.path.join(os.path.dirname(file_name), name.split('.')[0] + '.py')
+        if os.path.exists(module) and module not in found:
+            found.add(module)
+            find_local_modules(module, found)
+    return sorted(found)
+
+# String constants of a script which name files of its directory
+def find_named_files(file_name):
+    with open(file_name, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and 0 < len(node.value) < 256 and '\n' not in node.value:
+            names.add(node.value)
+    directory = os.path.dirname(file_name)
+    inputs = sorted(i for i in names if not i.endswith(output_extensions) and os.path.isfile(os.path.join(directory, i)))
+    outputs = sorted(i for i in names if i.endswith(output_extensions))
+    return inputs, outputs
+
+def calc_file_hash(file_name):
+    h = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# Hash over the script, its local modules and its input files
+def calc_job_hash(script):
+    directory = os.path.dirname(script)
+    inputs, outputs = find_named_files(script)
+    files = [script] + find_local_modules(script) + [os.path.join(directory, i) for i in inputs]
+    h = hashlib.sha256()
+    for i in files:
+        h.update(os.path.relpath(i, root_dir).encode('utf-8'))
+        h.update(calc_file_hash(i).encode('utf-8'))
+    return h.hexdigest()
+
+def load_state():
+    if not os.path.exists(state_file_name):
+        return {}
+    with open(state_file_name) as f:
+        return json.load(f)
+
+def save_state(state):
+    tmp_file_name = state_file_name + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp_file_name, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_file_name, state_file_name)
+
+def is_up_to_date(script, job_hash, state):
+    if state.get(os.path.relpath(script, root_dir)) != job_hash:
+        return False
+    outputs = find_named_files(script)[1]
+    directory = os.path.dirname(script)
+    return all(os.path.exists(os.path.join(directory, i)) for i in outputs)
+
+# Runs one script in its directory with the non-interactive Agg backend. Each job gets a fresh
+# worker process, the scripts rely on their directory being the working directory and the
+# import path and they leave figures open. The scripts get their own command line, with --force
+# if the results they cache are recomputed.
+def run_script(job):
+    script, force = job
+    os.environ['MPLBACKEND'] = 'Agg'
+    import matplotlib
+    matplotlib.use('Agg')
+    directory = os.path.dirname(script)
+    os.chdir(directory)
+    sys.path.insert(0, directory)
+    start = time.perf_counter()
+    try:
+        sys.argv = [script] + (['--force'] if force else [])
+        runpy.run_path(script, run_name='__main__')
+    except Exception as e:
+        return script, False, str(e), time.perf_counter() - start
+    return script, True, '', time.perf_counter() - start
+
+def run_scripts(scripts, max_workers=None, force=False):
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as executor:
+        return list(executor.map(run_script, [(i, force) for i in scripts]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the figures of all articles in parallel.')
+    parser.add_argument('dirs', nargs='*', help='article directories (default: all)')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of cores)')
+    parser.add_argument('-f', '--force', action='store_true', help='also run the scripts whose inputs are unchanged and recompute their cached results')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='only list the scripts which would run')
+    args = parser.parse_args(argv)
+
+    state = load_state()
+    jobs = []
+    for script in find_scripts(args.dirs):
+        job_hash = calc_job_hash(script)
+        name = os.path.relpath(script, root_dir)
+        if not args.force and is_up_to_date(script, job_hash, state):
+            print('Up to date: ' + name)
+        else:
+            jobs.append((script, job_hash))
+    if args.dry_run:
+        for script, job_hash in jobs:
+            print('Would run: ' + os.path.relpath(script, root_dir))
+        return 0
+    if len(jobs) == 0:
+        return 0
+
+    job_hashes = dict(jobs)
+    failed = 0
+    for script, success, message, duration in run_scripts([i[0] for i in jobs], args.jobs, args.force):
+        name = os.path.relpath(script, root_dir)
+        if success:
+            state[name] = job_hashes[script]
+            print('Generated: %s (%.1f s)' % (name, duration))
+        else:
+            state.pop(name, None)
+            failed += 1
+            print('Failed: %s: %s' % (name, message), file=sys.stderr)
+    save_state(state)
+    return 1 if failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
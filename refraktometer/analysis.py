@@ -3,180 +3,44 @@
 # Copyright 2021 Thomas Ascher
 # SPDX-License-Identifier: GPL-3.0+
 
+import argparse
+import os
 import numpy as np
 import pandas as pa
-import matplotlib.pyplot as plt
-from sklearn.metrics import r2_score
-from scipy.stats import iqr
-
-# ABV = alcohol by volume in %
-# ABW = alcohol by weight in %
-# AE = apparent extract in °P
-# BXF = final refractometer reading in °Bx
-# BXI = initial refractometer reading in °Bx
-# FG = final gravity in SG
-# OE = original extract in °P
-# RE = real extract in °P
-# SG = specific gravity
-# WCF = wort correction factor
-
-default_wcf = 1.04
-recalc_default_wcf = True
-measurement_specific_wcf = False
-discard_bxi_outliers = True
-reference_filter = ''
-refractometer_filter = ''
-plot_ae_dev = True
-plot_abv_dev = True
-
-def correct_bx(bx, wcf):
-    return bx / wcf
-
-# Alcohol content estimation and Plato/SG conversion implemented according to
-# G. Spedding. "Alcohol and Its Measurement". In: Brewing Materials and Processes. Elsevier,
-# 2016, S. 123-149. DOI: 10.1016/b978-0-12-799954-8.00007-1.
-
-def sg_to_p(sg):
-    return sg**2 * -205.347 + 668.72 * sg - 463.37
-
-def p_to_sg(p):
-    return p / (258.6 - (p / 258.2 * 227.1)) + 1.0
-
-def calc_re(oe, ae):
-    return 0.1948 * oe + 0.8052 * ae
-
-def calc_abw(oe, re):
-    return (oe - re) / (2.0665 - (1.0665 * oe / 100.0))
-
-def calc_abv(abw, fg):
-    return abw * fg / 0.7907
-
-def calc_abv_simple(oe, ae):
-    return calc_abv(calc_abw(oe, calc_re(oe, ae)), p_to_sg(ae))
-
-# Bonham (Standard) correlation function implemented according to:
-# Louis K. Bonham. "The Use of Handheld Refractometers by Homebrewers".
-# In: Zymurgy 24.1 (2001), S. 43-46.
-
-def cor_bonham(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    fg = 1.001843 - 0.002318474 * oe - 0.000007775 * oe**2 - \
-        0.000000034 * oe**3 + 0.00574 * bxf + \
-        0.00003344 * bxf**2 + 0.000000086 * bxf**3
-    return oe, sg_to_p(fg), fg
-
-# Gardner correlation function implemented according to:
-# Louis K. Bonham. "The Use of Handheld Refractometers by Homebrewers".
-# In: Zymurgy 24.1 (2001), S. 43-46.
-
-def cor_gardner(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    ae = 1.53 * bxf - 0.59 * oe
-    return oe, ae, p_to_sg(ae)
-
-# Gossett correlation function implemented according to:
-# James M. Gossett. Derivation and Explanation of the Brix-Based Calculator For Estimating
-# ABV in Fermenting and Finished Beers. 2012.
-# URL: http://www.ithacoin.com/brewing/Derivation.htm
-
-def abw_gosett(bxi, bxf, wcf):
-    k = 0.445
-    c = 100.0 * (bxi - bxf) / (100.0 - 48.4 * k - 0.582 * bxf)
-    return 48.4 * c / (100 - 0.582 * c)
-
-# The Gossett correlation is for abw and not fg. For abv calculation Gossett utilizes the
-# Bonham correlation. Here the fg is derived from the abw equation instead.
-def cor_gossett(bxi, bxf, wcf):
-    abw = abw_gosett(bxi, bxf, wcf)
-    ae = bxi - (abw * (2.0665 - 1.0665 * bxi / 100.0)) / 0.8052
-    return bxi, ae, p_to_sg(ae)
-
-# Novotný correlation functions implemented according to:
-# Petr Novotný. Počítáme: Nová korekce refraktometru. 2017.
-# URL: http://www.diversity.beer/2017/01/pocitame-nova-korekce-refraktometru.html
-
-def cor_novotny_linear(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = -0.002349 * oe + 0.006276 * bxfc + 1.0
-    return oe, sg_to_p(fg), fg
-
-def cor_novotny_quadratic(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = 1.335 * 10.0**-5 * oe**2 - \
-        3.239 * 10.0**-5 * oe * bxfc + \
-        2.916 * 10.0**-5 * bxfc**2 - \
-        2.421 * 10.0**-3 * oe + \
-        6.219 * 10.0**-3 * bxfc + 1.0
-    return oe, sg_to_p(fg), fg
-
-# Terrill correlation functions implemented according to:
-# Sean Terrill. Refractometer FG Results. 2011.
-# URL: http://seanterrill.com/2011/04/07/refractometer-fg-results/
-
-def cor_terrill_linear(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = 1.0 - 0.000856829 * oe + 0.00349412 * bxfc
-    return oe, sg_to_p(fg), fg
-
-def cor_terrill_cubic(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = 1.0 - 0.0044993 * oe + 0.000275806 * oe**2 - \
-        0.00000727999 * oe**3 + 0.0117741 * bxfc - \
-        0.00127169 * bxfc**2 + 0.0000632929 * bxfc**3
-    return oe, sg_to_p(fg), fg
-
-# Sean Terrill's website issues. 2020.
-# URL: https://www.reddit.com/r/Homebrewing/comments/bs3af9/sean_terrills_website_issues
-
-def cor_novotrill(bxi, bxf, wcf):
-    oe1, ae1, fg1 = cor_terrill_linear(bxi, bxf, wcf)
-    oe2, ae2, fg2 = cor_novotny_linear(bxi, bxf, wcf)
-    fg_mean = (fg1 + fg2) / 2.0
-    fg = np.where(fg_mean < 1.014, fg1, fg2)
-    return oe1, sg_to_p(fg), fg
-
-def print_stats(name, stats, is_deviation):
-    full_name = name
-    if is_deviation == True:
-        full_name += ' Deviation'
-    print(full_name + ' Statistics:')
-    print(stats)
-    print()
-
-class RefracModel:
-    def __init__(self, name, cor_model, abw_model = None):
-        self.name = name
-        self.cor_model = cor_model
-        self.abw_model = abw_model
-
-    def calc_ae(self, bxi, bxf, wcf):
-        oe, ae, fg = self.cor_model(bxi, bxf, wcf)
-        return ae
-
-    def calc_abv(self, bxi, bxf, wcf):
-        oe, ae, fg = self.cor_model(bxi, bxf, wcf)
-        if self.abw_model is None:
-            return calc_abv(calc_abw(oe, calc_re(oe, ae)), fg)
-        else:
-            return calc_abv(self.abw_model(bxi, bxf, wcf), fg)
-
-refrac_models = [
-    RefracModel('Terrill Linear', cor_terrill_linear),
-    RefracModel('Terrill Cubic', cor_terrill_cubic),
-    RefracModel('Novotny Linear', cor_novotny_linear),
-    RefracModel('Novotny Quadratic', cor_novotny_quadratic),
-    RefracModel('Terrill+Novotný', cor_novotrill),
-    RefracModel('Bonham', cor_bonham),
-    RefracModel('Gardner', cor_gardner),
-    RefracModel('Gossett', cor_gossett, abw_gosett),
-]
+from refrac import correct_bx, sg_to_p, calc_abv_simple, get_models
+from stats import StatsTable, calc_r2_score
+import measurements
+import result_cache
+from outliers import OutlierFilter, IQRRule, MADRule, HampelRule, LimitRule
+
+class EvalConfig:
+    def __init__(self):
+        self.default_wcf = 1.04
+        self.recalc_default_wcf = True
+        self.measurement_specific_wcf = False
+        self.discard_bxi_outliers = True
+        # Rule for the BXI outliers (see outliers.py), optionally applied per group of a column
+        self.outlier_rule = IQRRule(3.0)
+        self.outlier_group_by = None
+        self.reference_filter = ''
+        self.refractometer_filter = ''
+        # Fitted WCFs per refractometer (see calibration.py), used instead of the default WCF
+        self.calibration = None
+
+# The readings are evaluated in float64 like the plain CSV import, the float32 default of the
+# measurement loader is for archives and caches of large data sets
+data_float_dtype = np.float64
+
+refrac_models = get_models(['TL', 'TK', 'NL', 'NQ', 'TN', 'BO', 'GA', 'GO'])
 
 model_names = list(map(lambda model: model.name, refrac_models))
 
+# Replaces the evaluated models, e.g. to add fitted models (see refit.py)
+def set_models(models):
+    global refrac_models, model_names
+    refrac_models = models
+    model_names = list(map(lambda model: model.name, refrac_models))
+
 col_name_abv = 'ABV'
 col_name_wcf = 'WCF'
 col_name_og = 'OG'
@@ -192,63 +56,201 @@ row_name_square = 'r2score'
 def model_col_name(section, name):
     return section + ' ' + name
 
-data = pa.read_csv('data.csv', delimiter=',')
-data_abv_dev = pa.DataFrame()
-data_ae_dev = pa.DataFrame()
-
-data[col_name_oe] = np.where(np.isnan(data[col_name_oe]), sg_to_p(data[col_name_og]), data[col_name_oe])
-data[col_name_oe] = np.where(np.isnan(data[col_name_oe]), data[col_name_bxi] * default_wcf, data[col_name_oe])
-data[col_name_ae] = np.where(np.isnan(data[col_name_ae]), sg_to_p(data[col_name_fg]), data[col_name_ae])
-
-if len(reference_filter) > 0:
-    data = data[data[col_name_reference] == reference_filter] 
-
-if len(refractometer_filter) > 0:
-    data = data[data[col_name_refractometer] == refractometer_filter]    
-
-data[col_name_wcf] = data[col_name_bxi] / data[col_name_oe]
-data[col_name_abv] = calc_abv_simple(data[col_name_oe], data[col_name_ae])
-
-wcf_stats = data[col_name_wcf].describe()
-if recalc_default_wcf == True:
-    default_wcf = wcf_stats['75%']
-    print('Updating default WCF to ' + str(default_wcf) + '\n')
-print_stats(col_name_wcf, wcf_stats, False)
-
-if measurement_specific_wcf == False:
-    data[col_name_wcf] = default_wcf
-
-if discard_bxi_outliers == True:
-    bxic = correct_bx(data[col_name_bxi], data[col_name_wcf])
-    bxi_dev = bxic - data[col_name_oe]
-    threshold = abs(iqr(bxi_dev) * 3.0)
-    print('Discarding ' + col_name_bxi + ' outliers over ' + str(threshold) + '\n')
-    data = data[(abs(bxic - data[col_name_oe]) <= threshold)]
-
-for model in refrac_models:
-    model_col_name_ae = model_col_name(col_name_ae, model.name)
-    data[model_col_name_ae] = model.calc_ae(data[col_name_bxi], data[col_name_bxf], data[col_name_wcf])
-    data_ae_dev[model.name] = data[model_col_name_ae] - data[col_name_ae]
-    model_col_name_abv = model_col_name(col_name_abv, model.name)
-    data[model_col_name_abv] = model.calc_abv(data[col_name_bxi], data[col_name_bxf], data[col_name_wcf])   
-    data_abv_dev[model.name] = data[model_col_name_abv] - data[col_name_abv]
- 
-data.to_csv('data_eval.csv', index=False)
-
-def create_stats(devs, col_name):
-    stats = devs.describe()
-    stats.loc[row_name_square] = list(map(lambda name: r2_score(data[col_name], data[model_col_name(col_name, name)]), model_names))
-    return stats
-
-stats_ae_dev = create_stats(data_ae_dev, col_name_ae)
-stats_ae_dev.to_csv('stats_ae_dev.csv', index=True)
-stats_abv_dev = create_stats(data_abv_dev, col_name_abv)
-stats_abv_dev.to_csv('stats_abv_dev.csv', index=True)
-
-print_stats(col_name_ae, stats_ae_dev, True)
-print_stats(col_name_abv, stats_abv_dev, True)
-
-def plot_devs(col_name, data_dev, stats_dev):
+
+# Same definition as sklearn.metrics.r2_score without the scikit-learn import cost
+def r2_score(y_true, y_pred):
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    return calc_r2_score(np.sum((y_true - y_pred)**2), np.sum((y_true - np.mean(y_true))**2))
+
+# The data contains all measurements including the outliers, the mask selects the evaluated ones.
+# The deviations only exist for the evaluated measurements. The BXI outlier limits are either the
+# same for all measurements or, with grouped outlier filtering, one row per group.
+class EvalResults:
+    def __init__(self, data, mask, data_ae_dev, data_abv_dev, wcf_stats, default_wcf, bxi_limits, bxi_group_limits, outliers):
+        self.data = data
+        self.mask = mask
+        self.data_ae_dev = data_ae_dev
+        self.data_abv_dev = data_abv_dev
+        self.wcf_stats = wcf_stats
+        self.default_wcf = default_wcf
+        self.bxi_limits = bxi_limits
+        self.bxi_threshold = bxi_limits[1] if bxi_limits is not None else None
+        self.bxi_group_limits = bxi_group_limits
+        self.outliers = outliers
+        self.stats_table_ae_dev = create_stats_table(data[col_name_ae][mask], data_ae_dev)
+        self.stats_table_abv_dev = create_stats_table(data[col_name_abv][mask], data_abv_dev)
+        self.update_stats()
+
+    # Appends already evaluated measurements, only the statistics of the new rows are computed
+    def append(self, data, mask, data_ae_dev, data_abv_dev, outliers):
+        self.data = pa.concat([self.data, data])
+        self.mask = np.concatenate([self.mask, mask])
+        self.data_ae_dev = pa.concat([self.data_ae_dev, data_ae_dev])
+        self.data_abv_dev = pa.concat([self.data_abv_dev, data_abv_dev])
+        self.outliers = pa.concat([self.outliers, outliers])
+        self.stats_table_ae_dev.update_batch(data_ae_dev, data[col_name_ae][mask])
+        self.stats_table_abv_dev.update_batch(data_abv_dev, data[col_name_abv][mask])
+        self.update_stats()
+
+    def get_evaluated_data(self):
+        return self.data[self.mask]
+
+    def update_stats(self):
+        self.stats_ae_dev = self.stats_table_ae_dev.to_frame(row_name_square)
+        self.stats_abv_dev = self.stats_table_abv_dev.to_frame(row_name_square)
+
+def create_stats_table(refs, devs):
+    table = StatsTable(model_names)
+    table.update_batch(devs, refs)
+    return table
+
+# Missing extracts are derived from the gravities, missing original extracts from the
+# initial refractometer reading. The measurements are stored in float32, the derived values are
+# calculated in float64.
+def prepare_data(data, config):
+    data = data.astype({ i: np.float64 for i in measurements.float_columns if i in data.columns })
+    data[col_name_oe] = np.where(np.isnan(data[col_name_oe]), sg_to_p(data[col_name_og]), data[col_name_oe])
+    data[col_name_oe] = np.where(np.isnan(data[col_name_oe]), data[col_name_bxi] * config.default_wcf, data[col_name_oe])
+    data[col_name_ae] = np.where(np.isnan(data[col_name_ae]), sg_to_p(data[col_name_fg]), data[col_name_ae])
+
+    if len(config.reference_filter) > 0:
+        data = data[data[col_name_reference] == config.reference_filter]
+
+    if len(config.refractometer_filter) > 0:
+        data = data[data[col_name_refractometer] == config.refractometer_filter]
+
+    data = data.copy()
+    data[col_name_wcf] = data[col_name_bxi] / data[col_name_oe]
+    data[col_name_abv] = calc_abv_simple(data[col_name_oe], data[col_name_ae])
+    return data
+
+# Evaluate all refractometer models on a measurement data set, the data frame is not modified
+def evaluate(data, config=None):
+    if config is None:
+        config = EvalConfig()
+    data = prepare_data(data, config)
+
+    default_wcf = config.default_wcf
+    wcf_stats = data[col_name_wcf].describe()
+    if config.recalc_default_wcf == True:
+        default_wcf = wcf_stats['75%']
+
+    calibration = None
+    if config.measurement_specific_wcf == False:
+        data[col_name_wcf] = default_wcf
+        calibration = config.calibration
+        if calibration is not None:
+            data[col_name_wcf] = calibration.get_wcf_array(data[col_name_refractometer], data[col_name_wcf])
+
+    outlier_filter = OutlierFilter(data.index)
+    bxi_limits = None
+    bxi_group_limits = None
+    if config.discard_bxi_outliers == True:
+        groups = data[config.outlier_group_by] if config.outlier_group_by else None
+        bxi_limits, bxi_group_limits = filter_bxi_outliers(data, outlier_filter, config.outlier_rule, groups)
+
+    data_ae_dev, data_abv_dev = evaluate_models(data, outlier_filter.mask, calibration)
+    return EvalResults(data, outlier_filter.mask, data_ae_dev, data_abv_dev, wcf_stats, default_wcf, bxi_limits, bxi_group_limits, outlier_filter.report())
+
+# Returns the limits of the deviation if they are the same for all measurements and the limits
+# per group if they are the same for all measurements of a group. Limits per measurement, like
+# the ones of the Hampel rule, are not returned.
+def filter_bxi_outliers(data, outlier_filter, rule, groups=None):
+    bxi_dev = correct_bx(data[col_name_bxi], data[col_name_wcf]) - data[col_name_oe]
+    lower_limit, upper_limit = outlier_filter.add(col_name_bxi + ' deviation', bxi_dev, rule, groups)
+    if np.ndim(lower_limit) == 0 and np.ndim(upper_limit) == 0:
+        return (lower_limit, upper_limit), None
+    if groups is None:
+        return None, None
+    limits = pa.DataFrame({ 0: lower_limit, 1: upper_limit }).groupby(np.asarray(groups), dropna=False)
+    if (limits.nunique(dropna=False) > 1).any(axis=None):
+        return None, None
+    return None, limits.max()
+
+# Limits per measurement from the limits per group of an earlier evaluation
+def get_group_limits(group_limits, groups):
+    groups = pa.Index(np.asarray(groups))
+    missing = groups[~groups.isin(group_limits.index)]
+    if len(missing) > 0:
+        raise ValueError('no outlier limits for the groups ' + ', '.join(map(str, missing.unique())))
+    limits = group_limits.reindex(groups)
+    return LimitRule(limits[0].to_numpy(), limits[1].to_numpy())
+
+# The models are evaluated for all measurements, the deviations only for the ones of the mask.
+# With a calibration each model is evaluated with its own fitted WCF if there is one.
+def evaluate_models(data, mask, calibration=None):
+    data_ae_dev = pa.DataFrame(index=data.index[mask])
+    data_abv_dev = pa.DataFrame(index=data.index[mask])
+    bxi = data[col_name_bxi].to_numpy()
+    bxf = data[col_name_bxf].to_numpy()
+    wcf = data[col_name_wcf].to_numpy()
+    ref_ae = data[col_name_ae].to_numpy()
+    ref_abv = data[col_name_abv].to_numpy()
+    for model in refrac_models:
+        model_wcf = wcf
+        if calibration is not None:
+            model_wcf = calibration.get_wcf_array(data[col_name_refractometer], wcf, model.short_name)
+        oe, ae, fg, abv = model.evaluate(bxi, bxf, model_wcf)
+        data[model_col_name(col_name_ae, model.name)] = ae
+        data_ae_dev[model.name] = ae[mask] - ref_ae[mask]
+        data[model_col_name(col_name_abv, model.name)] = abv
+        data_abv_dev[model.name] = abv[mask] - ref_abv[mask]
+    return data_ae_dev, data_abv_dev
+
+# Evaluation results are cached by the hashes of the data, the models, the configuration and the
+# evaluation code. With force the results are recomputed and replace the cached ones.
+def evaluate_cached(data, config=None, cache=None, force=False):
+    if config is None:
+        config = EvalConfig()
+    if cache is None:
+        cache = result_cache.ResultCache()
+    key = result_cache.calc_key('evaluate', result_cache.calc_data_hash(data), result_cache.calc_models_hash(refrac_models),
+        result_cache.calc_config_hash(config), result_cache.calc_source_hash())
+    return cache.get_or_compute(key, lambda: evaluate(data, config), force)
+
+# Adds new measurements to the results of evaluate without recomputing the existing ones. The
+# default WCF and the outlier limits of the initial evaluation are kept, a full evaluate is
+# needed to estimate them again. Outlier limits per measurement, like the ones of the Hampel rule,
+# can not be applied to new measurements.
+def evaluate_update(results, data, config=None):
+    if config is None:
+        config = EvalConfig()
+    data = prepare_data(data, config)
+    calibration = None
+    if config.measurement_specific_wcf == False:
+        data[col_name_wcf] = results.default_wcf
+        calibration = config.calibration
+        if calibration is not None:
+            data[col_name_wcf] = calibration.get_wcf_array(data[col_name_refractometer], data[col_name_wcf])
+    outlier_filter = OutlierFilter(data.index)
+    if results.bxi_limits is not None:
+        filter_bxi_outliers(data, outlier_filter, LimitRule(*results.bxi_limits))
+    elif results.bxi_group_limits is not None:
+        filter_bxi_outliers(data, outlier_filter, get_group_limits(results.bxi_group_limits, data[config.outlier_group_by]))
+    elif config.discard_bxi_outliers == True:
+        raise ValueError('the outlier limits of the evaluation do not apply to new measurements')
+    data_ae_dev, data_abv_dev = evaluate_models(data, outlier_filter.mask, calibration)
+    results.append(data, outlier_filter.mask, data_ae_dev, data_abv_dev, outlier_filter.report())
+    return results
+
+def print_stats(name, stats, is_deviation):
+    full_name = name
+    if is_deviation == True:
+        full_name += ' Deviation'
+    print(full_name + ' Statistics:')
+    print(stats)
+    print()
+
+def write_results(results, output_dir):
+    results.get_evaluated_data().to_csv(os.path.join(output_dir, 'data_eval.csv'), index=False)
+    results.outliers.to_csv(os.path.join(output_dir, 'outliers.csv'), index=True)
+    results.stats_ae_dev.to_csv(os.path.join(output_dir, 'stats_ae_dev.csv'), index=True)
+    results.stats_abv_dev.to_csv(os.path.join(output_dir, 'stats_abv_dev.csv'), index=True)
+
+# Matplotlib is only imported if plots are requested
+def plot_devs(col_name, data_dev, stats_dev, default_wcf, measurement_specific_wcf):
+    import matplotlib.pyplot as plt
     fig = plt.figure(constrained_layout=True, figsize=(14, 8))
     fig.suptitle('Refractometer Correlation Model Comparison (' + str(data_dev.shape[0]) + ' Measurements)')
     subfigs = fig.subfigures(1, 2)
@@ -274,21 +276,94 @@ def plot_devs(col_name, data_dev, stats_dev):
         else:
             ax_desnity = ax_densities[col]
         rsquare = stats_dev[model.name][row_name_square]
-        ax_desnity.set_title(model.name + ' (R²=' + '%.3f'%rsquare + ')')    
+        ax_desnity.set_title(model.name + ' (R²=' + '%.3f'%rsquare + ')')
         ax_desnity.set_xlabel(dev_caption)
         data_dev[model.name].plot.hist(density=True, xlim=[-1.5,1.5], bins=15, ax=ax_desnity)
         try:
             data_dev[model.name].plot.density(ax=ax_desnity)
         except:
             pass
-    
+
     return fig
 
-if plot_ae_dev:
-    fig_ae = plot_devs(col_name_ae, data_ae_dev, stats_ae_dev)
-    fig_ae.savefig('stats_ae_dev.svg')
-if plot_abv_dev:
-    fig_abv = plot_devs(col_name_abv, data_abv_dev, stats_abv_dev)
-    fig_abv.savefig('stats_abv_dev.svg')
-if plot_ae_dev == True or plot_abv_dev == True:
-    plt.show()
\ No newline at end of file
+def plot_results(results, config, output_dir, show):
+    import matplotlib.pyplot as plt
+    fig_ae = plot_devs(col_name_ae, results.data_ae_dev, results.stats_ae_dev, results.default_wcf, config.measurement_specific_wcf)
+    fig_ae.savefig(os.path.join(output_dir, 'stats_ae_dev.svg'))
+    fig_abv = plot_devs(col_name_abv, results.data_abv_dev, results.stats_abv_dev, results.default_wcf, config.measurement_specific_wcf)
+    fig_abv.savefig(os.path.join(output_dir, 'stats_abv_dev.svg'))
+    if show:
+        plt.show()
+
+outlier_rules = { 'iqr': IQRRule, 'mad': MADRule, 'hampel': HampelRule }
+
+def create_arg_parser():
+    parser = argparse.ArgumentParser(description='Refractometer correlation model evaluation.')
+    parser.add_argument('--wcf', type=float, default=EvalConfig().default_wcf, help='default wort correction factor')
+    parser.add_argument('--keep-wcf', action='store_true', help='do not update the default WCF from the data')
+    parser.add_argument('--measurement-wcf', action='store_true', help='use a measurement specific WCF')
+    parser.add_argument('--keep-outliers', action='store_true', help='do not discard BXI outliers')
+    parser.add_argument('--outlier-rule', choices=list(outlier_rules.keys()), default='iqr', help='rule for the BXI outliers')
+    parser.add_argument('--outlier-factor', type=float, default=3.0, help='factor of the IQR or scaled MAD of the outlier rule')
+    parser.add_argument('--outlier-group-by', choices=[col_name_refractometer, 'Operator', 'Organization', col_name_reference],
+        help='calculate the outlier limits per group')
+    parser.add_argument('--reference', default='', help='only evaluate measurements of this reference instrument')
+    parser.add_argument('--refractometer', default='', help='only evaluate measurements of this refractometer')
+    parser.add_argument('--calibration', help='use the fitted WCFs of this calibration store')
+    return parser
+
+def create_config(args):
+    config = EvalConfig()
+    config.default_wcf = args.wcf
+    config.recalc_default_wcf = not args.keep_wcf
+    config.measurement_specific_wcf = args.measurement_wcf
+    config.discard_bxi_outliers = not args.keep_outliers
+    config.outlier_rule = outlier_rules[args.outlier_rule](factor=args.outlier_factor)
+    config.outlier_group_by = args.outlier_group_by
+    config.reference_filter = args.reference
+    config.refractometer_filter = args.refractometer
+    if args.calibration:
+        from calibration import WCFCalibration
+        config.calibration = WCFCalibration.load(args.calibration)
+    return config
+
+def main(argv=None):
+    parser = create_arg_parser()
+    parser.add_argument('input', nargs='?', default='data.csv', help='measurement data set')
+    parser.add_argument('-o', '--output-dir', default='.', help='directory of the generated files')
+    parser.add_argument('--no-plot', action='store_true', help='skip the deviation plots')
+    parser.add_argument('--show', action='store_true', help='show the deviation plots')
+    parser.add_argument('--force', action='store_true', help='recompute cached results')
+    parser.add_argument('--no-cache', action='store_true', help='do not cache the results')
+    parser.add_argument('--cache-dir', default=result_cache.DEFAULT_CACHE_DIR, help='directory of the result cache')
+    parser.add_argument('--fitted-models', help='also evaluate the fitted models of this file (see refit.py)')
+    args = parser.parse_args(argv)
+    config = create_config(args)
+    if args.fitted_models:
+        from refit import load_fitted_models
+        set_models(refrac_models + load_fitted_models(args.fitted_models))
+
+    data = measurements.load(args.input, data_float_dtype)
+    if args.no_cache:
+        results = evaluate(data, config)
+    else:
+        results = evaluate_cached(data, config, result_cache.ResultCache(args.cache_dir), args.force)
+    if config.recalc_default_wcf == True:
+        print('Updating default WCF to ' + str(results.default_wcf) + '\n')
+    print_stats(col_name_wcf, results.wcf_stats, False)
+    if results.bxi_threshold is not None:
+        print('Discarding ' + col_name_bxi + ' outliers over ' + str(results.bxi_threshold) + '\n')
+    if len(results.outliers) > 0:
+        print('Discarded measurements:')
+        print(results.outliers)
+        print()
+
+    write_results(results, args.output_dir)
+    print_stats(col_name_ae, results.stats_ae_dev, True)
+    print_stats(col_name_abv, results.stats_abv_dev, True)
+
+    if not args.no_plot:
+        plot_results(results, config, args.output_dir, args.show)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Refractometer Correlation Model Evaluation over many data sets
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pa
+import analysis
+import measurements
+
+col_name_dataset = 'Dataset'
+col_name_section = 'Section'
+col_name_model = 'Model'
+col_name_default_wcf = 'Default WCF'
+
+# Data sets with fewer measurements are skipped, the statistics are meaningless for them
+min_measurements = 3
+
+# A directory is expanded to the CSV files it contains, everything else is treated as glob pattern
+def find_datasets(inputs):
+    file_names = []
+    for i in inputs:
+        if os.path.isdir(i):
+            file_names += sorted(glob.glob(os.path.join(i, '*.csv')))
+        else:
+            file_names += sorted(glob.glob(i))
+    return file_names
+
+# Long format table with one row per data set, section (AE/ABV) and model
+def stats_to_table(name, results):
+    tables = []
+    for section, stats in [(analysis.col_name_ae, results.stats_ae_dev), (analysis.col_name_abv, results.stats_abv_dev)]:
+        table = stats.T
+        table.insert(0, col_name_model, table.index)
+        table.insert(0, col_name_section, section)
+        table.insert(0, col_name_dataset, name)
+        table[col_name_default_wcf] = results.default_wcf
+        tables.append(table)
+    return pa.concat(tables, ignore_index=True)
+
+def evaluate_dataset(job):
+    name, data, config = job
+    if isinstance(data, str):
+        data = measurements.load(data, analysis.data_float_dtype)
+    if data.shape[0] < min_measurements:
+        return None
+    return stats_to_table(name, analysis.evaluate(data, config))
+
+# Files are loaded by the workers, only groups of a group-by are sent to them as data frames
+def create_jobs(file_names, group_by, config):
+    if not group_by:
+        return [(i, i, config) for i in file_names]
+    data = pa.concat([measurements.load(i, analysis.data_float_dtype) for i in file_names], ignore_index=True)
+    jobs = []
+    for key, group in data.groupby(group_by, dropna=False, observed=True):
+        key = key if isinstance(key, tuple) else (key,)
+        jobs.append(('/'.join(str(i) for i in key), group, config))
+    return jobs
+
+def evaluate_datasets(file_names, config=None, group_by=None, max_workers=None):
+    if config is None:
+        config = analysis.EvalConfig()
+    if len(file_names) == 0:
+        raise ValueError('no measurement data sets found')
+    jobs = create_jobs(file_names, group_by, config)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        tables = [i for i in executor.map(evaluate_dataset, jobs) if i is not None]
+    if len(tables) == 0:
+        raise ValueError('no data set has at least %d measurements' % min_measurements)
+    return pa.concat(tables, ignore_index=True)
+
+def main(argv=None):
+    parser = analysis.create_arg_parser()
+    parser.description = 'Refractometer correlation model evaluation over many data sets.'
+    parser.add_argument('inputs', nargs='+', help='measurement data sets, directories or glob patterns')
+    parser.add_argument('--group-by', nargs='+', choices=[analysis.col_name_refractometer, 'Operator', 'Organization', analysis.col_name_reference],
+        help='evaluate the merged data sets per group instead of per file')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of cores)')
+    parser.add_argument('-o', '--output', default='stats_datasets.csv', help='consolidated statistics table')
+    args = parser.parse_args(argv)
+
+    try:
+        stats = evaluate_datasets(find_datasets(args.inputs), analysis.create_config(args), args.group_by, args.jobs)
+    except ValueError as e:
+        parser.exit(1, parser.prog + ': ' + str(e) + '\n')
+    stats.to_csv(args.output, index=False)
+    print(stats)
+
+if __name__ == "__main__":
+    main()
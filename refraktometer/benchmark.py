@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Refractometer Correlation Model Benchmark
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import io
+import time
+import tracemalloc
+import numpy as np
+import pandas as pa
+import analysis
+import refrac
+import stream
+
+# Synthetic measurements in the range of data.csv
+def create_data(count, seed=0):
+    rng = np.random.default_rng(seed)
+    bxi = rng.uniform(8.0, 25.0, count)
+    bxf = bxi * rng.uniform(0.35, 0.6, count)
+    wcf = rng.uniform(0.98, 1.06, count)
+    return pa.DataFrame({ analysis.col_name_bxi: bxi, analysis.col_name_bxf: bxf, analysis.col_name_wcf: wcf })
+
+def run_separate(data):
+    for model in analysis.refrac_models:
+        model.calc_ae(data[analysis.col_name_bxi], data[analysis.col_name_bxf], data[analysis.col_name_wcf])
+        model.calc_abv(data[analysis.col_name_bxi], data[analysis.col_name_bxf], data[analysis.col_name_wcf])
+
+def run_fused(data):
+    bxi = data[analysis.col_name_bxi].to_numpy()
+    bxf = data[analysis.col_name_bxf].to_numpy()
+    wcf = data[analysis.col_name_wcf].to_numpy()
+    for model in analysis.refrac_models:
+        model.evaluate(bxi, bxf, wcf)
+
+# Returns the run time in s and the peak of the allocated memory in MB
+def measure(func, data):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(data)
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak / 1e6
+
+def benchmark(count=1000000):
+    data = create_data(count)
+    jit_threshold = refrac.jit_threshold
+    refrac.jit_threshold = count + 1
+    separate = measure(run_separate, data)
+    fused = measure(run_fused, data)
+    print('Measurements: %d, models: %d' % (count, len(analysis.refrac_models)))
+    print('calc_ae + calc_abv: %.3f s, peak %.0f MB' % separate)
+    print('evaluate: %.3f s, peak %.0f MB' % fused)
+    print('Speedup: %.1fx, memory reduction: %.1fx' % (separate[0] / fused[0], separate[1] / fused[1]))
+    refrac.jit_threshold = jit_threshold
+    if refrac.get_numba() is not None:
+        # Compilation is excluded from the measurement
+        for model in analysis.refrac_models:
+            model.get_jit_kernel()
+        fused_jit = measure(run_fused, data)
+        print('evaluate (Numba): %.3f s, peak %.0f MB' % fused_jit)
+
+# Latency per reading of the streaming mode including parsing and formatting
+def benchmark_stream(count=100000, tanks=10):
+    data = create_data(count)
+    header = ','.join([stream.col_name_key, stream.col_name_bxi, stream.col_name_bxf, stream.col_name_wcf]) + '\n'
+    lines = [header] + ['%d,%r,%r,%r\n' % (i % tanks, bxi, bxf, wcf) for i, (bxi, bxf, wcf) in
+        enumerate(zip(data[analysis.col_name_bxi], data[analysis.col_name_bxf], data[analysis.col_name_wcf]))]
+    evaluator = stream.StreamEvaluator(refrac.get_model('TN'))
+    output = io.StringIO()
+    start = time.perf_counter()
+    stream.run(lines, evaluator, output, flush=False)
+    duration = time.perf_counter() - start
+    # The readings have to arrive unchanged, otherwise the latency is measured on wrong input
+    results = pa.read_csv(io.StringIO(output.getvalue()), dtype={ stream.col_name_key: str })
+    if len(results) != count or len(evaluator.stats) != tanks:
+        raise RuntimeError('stream evaluated %d readings of %d tanks' % (len(results), len(evaluator.stats)))
+    if not np.allclose(results[stream.col_name_bxi], data[analysis.col_name_bxi], atol=5e-4) or \
+            not np.allclose(results[stream.col_name_bxf], data[analysis.col_name_bxf], atol=5e-4):
+        raise RuntimeError('stream readings differ from the generated data')
+    print('Stream: %.1f us per reading' % (duration / count * 1e6))
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_stream()
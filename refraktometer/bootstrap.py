@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Confidence Intervals of the Refractometer Correlation Model Statistics
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pa
+import analysis
+import measurements
+from stats import calc_r2_score
+
+col_name_mean = 'Mean'
+col_name_mean_low = 'Mean Low'
+col_name_mean_high = 'Mean High'
+col_name_r2 = 'R2'
+col_name_r2_low = 'R2 Low'
+col_name_r2_high = 'R2 High'
+col_name_p_value = 'p-value'
+
+# Upper limit of the values in one index matrix (resamples x measurements)
+max_chunk_elements = 250000
+
+# Resamples of one chunk for all models at once. Each row of the index matrix is one bootstrap
+# resample and each row of the sign matrix one permutation of the sign-flip test, the statistics
+# are reductions along the rows without a loop per resample.
+def resample_chunk(job):
+    devs, refs, seed, count = job
+    rng = np.random.default_rng(seed)
+    n = devs.shape[0]
+    indices = rng.integers(0, n, size=(count, n))
+    sample_devs = devs[indices]
+    sample_refs = refs[indices]
+    means = sample_devs.mean(axis=1)
+    ss_res = np.sum(sample_devs**2, axis=1)
+    ss_tot = np.sum((sample_refs - sample_refs.mean(axis=1, keepdims=True))**2, axis=1)
+    # Resamples of a single reference value follow the convention of analysis.r2_score
+    r2 = calc_r2_score(ss_res, ss_tot[:, np.newaxis])
+    # Under the null hypothesis of no bias the deviations are symmetric around zero
+    signs = rng.choice(np.array([-1.0, 1.0]), size=(count, n))
+    flipped_means = signs @ devs / n
+    return means, r2, flipped_means
+
+# Percentile bootstrap intervals of the mean deviation and the R² score and the p-value of the
+# sign-flip permutation test for a mean deviation of zero. devs has one column per model. The
+# resamples are split into chunks with independent random streams, the result only depends on
+# the seed and not on the number of workers.
+def calc_confidence_intervals(devs, refs, resamples=10000, confidence=0.95, seed=0, max_workers=None):
+    names = list(devs.columns)
+    dev_values = devs.to_numpy(dtype=float)
+    ref_values = np.asarray(refs, dtype=float)
+    chunk_size = max(1, min(resamples, max_chunk_elements // max(1, len(ref_values))))
+    counts = [min(chunk_size, resamples - i) for i in range(0, resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    jobs = [(dev_values, ref_values, s, c) for s, c in zip(seeds, counts)]
+    if len(jobs) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunks = list(executor.map(resample_chunk, jobs))
+    else:
+        chunks = [resample_chunk(i) for i in jobs]
+    means, r2, flipped_means = [np.concatenate(i) for i in zip(*chunks)]
+
+    alpha = (1.0 - confidence) / 2.0
+    mean = dev_values.mean(axis=0)
+    r2_full = [analysis.r2_score(ref_values, ref_values + dev_values[:, i]) for i in range(len(names))]
+    mean_low, mean_high = np.quantile(means, [alpha, 1.0 - alpha], axis=0)
+    r2_low, r2_high = np.quantile(r2, [alpha, 1.0 - alpha], axis=0)
+    p_value = (np.sum(np.abs(flipped_means) >= np.abs(mean), axis=0) + 1.0) / (resamples + 1.0)
+    return pa.DataFrame({
+        col_name_mean: mean, col_name_mean_low: mean_low, col_name_mean_high: mean_high,
+        col_name_r2: r2_full, col_name_r2_low: r2_low, col_name_r2_high: r2_high,
+        col_name_p_value: p_value }, index=names)
+
+def calc_results_confidence_intervals(results, resamples=10000, confidence=0.95, seed=0, max_workers=None):
+    ci_ae_dev = calc_confidence_intervals(results.data_ae_dev, results.data[analysis.col_name_ae][results.mask], resamples, confidence, seed, max_workers)
+    ci_abv_dev = calc_confidence_intervals(results.data_abv_dev, results.data[analysis.col_name_abv][results.mask], resamples, confidence, seed, max_workers)
+    return ci_ae_dev, ci_abv_dev
+
+def main(argv=None):
+    parser = analysis.create_arg_parser()
+    parser.description = 'Bootstrap confidence intervals of the refractometer correlation model statistics.'
+    parser.add_argument('input', nargs='?', default='data.csv', help='measurement data set')
+    parser.add_argument('-o', '--output-dir', default='.', help='directory of the generated files')
+    parser.add_argument('-n', '--resamples', type=int, default=10000, help='number of bootstrap resamples and permutations')
+    parser.add_argument('--confidence', type=float, default=0.95, help='confidence level of the intervals')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random number generator')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of cores)')
+    args = parser.parse_args(argv)
+
+    results = analysis.evaluate(measurements.load(args.input, analysis.data_float_dtype), analysis.create_config(args))
+    ci_ae_dev, ci_abv_dev = calc_results_confidence_intervals(results, args.resamples, args.confidence, args.seed, args.jobs)
+    ci_ae_dev.to_csv(os.path.join(args.output_dir, 'ci_ae_dev.csv'), index=True)
+    ci_abv_dev.to_csv(os.path.join(args.output_dir, 'ci_abv_dev.csv'), index=True)
+    analysis.print_stats(analysis.col_name_ae, ci_ae_dev, True)
+    analysis.print_stats(analysis.col_name_abv, ci_abv_dev, True)
+
+if __name__ == "__main__":
+    main()
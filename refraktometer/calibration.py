@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Wort Correction Factor Calibration of Refractometers
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import json
+import os
+import numpy as np
+import pandas as pa
+import analysis
+import measurements
+
+default_file_name = 'wcf_calibration.json'
+
+# Search interval of the WCF, the literature values are between 1.0 and 1.06
+min_wcf = 0.9
+max_wcf = 1.2
+
+# Number of WCF candidates per refinement step and upper limit of the evaluated values per block
+candidate_count = 33
+max_block_elements = 1000000
+
+# Sum of squared deviations of the AE or ABV for each candidate WCF. All candidates of a block of
+# measurements are evaluated in one call of the model.
+def calc_cost(model, bxi, bxf, ref, wcfs, target=analysis.col_name_ae):
+    cost = np.zeros(len(wcfs))
+    block_size = max(1, max_block_elements // len(wcfs))
+    for start in range(0, len(bxi), block_size):
+        block = slice(start, start + block_size)
+        n = len(bxi[block])
+        wcf_grid = np.repeat(wcfs, n)
+        oe, ae, fg, abv = model.evaluate(np.tile(bxi[block], len(wcfs)), np.tile(bxf[block], len(wcfs)), wcf_grid)
+        value = ae if target == analysis.col_name_ae else abv
+        cost += np.sum(((value - np.tile(ref[block], len(wcfs)))**2).reshape(len(wcfs), n), axis=1)
+    return cost
+
+# The deviation is a smooth function of the WCF with a single minimum in the plausible range, so
+# a grid search which is refined around the best candidate converges without derivatives. With
+# several models the summed cost of all models is minimized, which gives a joint WCF.
+def fit_wcf(models, bxi, bxf, ref, target=analysis.col_name_ae, iterations=8):
+    low = min_wcf
+    high = max_wcf
+    for i in range(iterations):
+        wcfs = np.linspace(low, high, candidate_count)
+        cost = sum(calc_cost(model, bxi, bxf, ref, wcfs, target) for model in models)
+        best = np.argmin(cost)
+        step = wcfs[1] - wcfs[0]
+        low = max(min_wcf, wcfs[best] - step)
+        high = min(max_wcf, wcfs[best] + step)
+    return wcfs[best], np.sqrt(cost[best] / len(bxi) / len(models))
+
+# Fitted WCFs per instrument: one joint WCF for all models and one per model. The store is a
+# small JSON file, lookups are dictionary accesses.
+class WCFCalibration:
+    def __init__(self, target=analysis.col_name_ae):
+        self.target = target
+        self.instruments = {}
+
+    @staticmethod
+    def load(file_name=default_file_name):
+        calibration = WCFCalibration()
+        with open(file_name) as f:
+            content = json.load(f)
+        calibration.target = content['target']
+        calibration.instruments = content['instruments']
+        return calibration
+
+    def save(self, file_name=default_file_name):
+        tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_file_name, 'w') as f:
+            json.dump({ 'target': self.target, 'instruments': self.instruments }, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file_name, file_name)
+
+    # Returns the WCF of the model or the joint WCF of the instrument, None for unknown instruments
+    def get_wcf(self, instrument, model_name=None):
+        entry = self.instruments.get(instrument)
+        if entry is None:
+            return None
+        return entry['models'].get(model_name, entry['wcf'])
+
+    # WCF per measurement, measurements of unknown instruments keep their WCF
+    def get_wcf_array(self, instruments, wcf, model_name=None):
+        wcfs = { i: self.get_wcf(i, model_name) for i in pa.unique(instruments) }
+        calibrated = pa.Series(instruments).map(wcfs).to_numpy(dtype=float)
+        return np.where(np.isnan(calibrated), wcf, calibrated)
+
+    def fit(self, bxi, bxf, ref, instrument, models):
+        bxi = np.asarray(bxi, dtype=float)
+        bxf = np.asarray(bxf, dtype=float)
+        ref = np.asarray(ref, dtype=float)
+        models = [i for i in models if 'wcf' in i.inputs]
+        wcf, rmse = fit_wcf(models, bxi, bxf, ref, self.target)
+        entry = { 'wcf': float(wcf), 'rmse': float(rmse), 'count': len(bxi), 'models': {} }
+        for model in models:
+            entry['models'][model.short_name] = float(fit_wcf([model], bxi, bxf, ref, self.target)[0])
+        self.instruments[instrument] = entry
+        return entry
+
+    # Fits all refractometers of a measurement data set
+    def fit_data(self, data, models=None, config=None):
+        if models is None:
+            models = analysis.refrac_models
+        if config is None:
+            config = analysis.EvalConfig()
+        data = analysis.prepare_data(data, config)
+        for instrument, group in data.groupby(analysis.col_name_refractometer, observed=True):
+            self.fit(group[analysis.col_name_bxi], group[analysis.col_name_bxf], group[self.target], instrument, models)
+
+def main(argv=None):
+    parser = analysis.create_arg_parser()
+    parser.description = 'Fit the wort correction factor per refractometer.'
+    parser.add_argument('input', nargs='?', default='data.csv', help='measurement data set')
+    parser.add_argument('--target', choices=[analysis.col_name_ae, analysis.col_name_abv], default=analysis.col_name_ae, help='minimized deviation')
+    parser.add_argument('-o', '--output', default=default_file_name, help='calibration store, existing entries are updated')
+    args = parser.parse_args(argv)
+
+    calibration = WCFCalibration(args.target)
+    if os.path.exists(args.output):
+        calibration = WCFCalibration.load(args.output)
+        calibration.target = args.target
+    calibration.fit_data(measurements.load(args.input, analysis.data_float_dtype), config=analysis.create_config(args))
+    calibration.save(args.output)
+    for instrument, entry in calibration.instruments.items():
+        print('%s: WCF %.4f (RMSE %.3f, %d measurements)' % (instrument, entry['wcf'], entry['rmse'], entry['count']))
+        for model_name, wcf in entry['models'].items():
+            print('  %s: %.4f' % (model_name, wcf))
+
+if __name__ == "__main__":
+    main()
@@ -2,142 +2,29 @@
 # Copyright 2021 Thomas Ascher
 # SPDX-License-Identifier: GPL-3.0+
 
+import argparse
 import pandas as pa
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.metrics import r2_score
-from scipy.stats import iqr
-
-def correct_bx(bx, wcf):
-    return bx / wcf
-
-# Alcohol content estimation and Plato/SG conversion implemented according to
-# G. Spedding. "Alcohol and Its Measurement". In: Brewing Materials and Processes. Elsevier,
-# 2016, S. 123-149. DOI: 10.1016/b978-0-12-799954-8.00007-1.
-
-def sg_to_p(sg):
-    return sg**2 * -205.347 + 668.72 * sg - 463.37
-
-def p_to_sg(p):
-    return p / (258.6 - (p / 258.2 * 227.1)) + 1.0
-
-def calc_re(oe, ae):
-    return 0.1948 * oe + 0.8052 * ae
-
-def calc_abw(oe, re):
-    return (oe - re) / (2.0665 - (1.0665 * oe / 100.0))
-
-def calc_abv(abw, fg):
-    return abw * fg / 0.7907
-
-def calc_abv_simple(oe, ae):
-    return calc_abv(calc_abw(oe, calc_re(oe, ae)), p_to_sg(ae))
-
-# Bonham (Standard) correlation function implemented according to:
-# Louis K. Bonham. "The Use of Handheld Refractometers by Homebrewers".
-# In: Zymurgy 24.1 (2001), S. 43-46.
-
-def cor_bonham(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    fg = 1.001843 - 0.002318474 * oe - 0.000007775 * oe**2 - \
-        0.000000034 * oe**3 + 0.00574 * bxf + \
-        0.00003344 * bxf**2 + 0.000000086 * bxf**3
-    return oe, sg_to_p(fg), fg
-
-# Gardner correlation function implemented according to:
-# Louis K. Bonham. "The Use of Handheld Refractometers by Homebrewers".
-# In: Zymurgy 24.1 (2001), S. 43-46.
-
-def cor_gardner(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    ae = 1.53 * bxf - 0.59 * oe
-    return oe, ae, p_to_sg(ae)
-
-# Gossett correlation function implemented according to:
-# James M. Gossett. Derivation and Explanation of the Brix-Based Calculator For Estimating
-# ABV in Fermenting and Finished Beers. 2012.
-# URL: http://www.ithacoin.com/brewing/Derivation.htm
-
-def abw_gosett(bxi, bxf, wcf):
-    k = 0.445
-    c = 100.0 * (bxi - bxf) / (100.0 - 48.4 * k - 0.582 * bxf)
-    return 48.4 * c / (100 - 0.582 * c)
-
-# The Gossett correlation is for abw and not fg. For abv calculation Gossett utilizes the
-# Bonham correlation. Here the fg is derived from the abw equation instead.
-def cor_gossett(bxi, bxf, wcf):
-    abw = abw_gosett(bxi, bxf, wcf)
-    ae = bxi - (abw * (2.0665 - 1.0665 * bxi / 100.0)) / 0.8052
-    return bxi, ae, p_to_sg(ae)
-
-# Novotný correlation functions implemented according to:
-# Petr Novotný. Počítáme: Nová korekce refraktometru. 2017.
-# URL: http://www.diversity.beer/2017/01/pocitame-nova-korekce-refraktometru.html
-
-def cor_novotny_linear(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = -0.002349 * oe + 0.006276 * bxfc + 1.0
-    return oe, sg_to_p(fg), fg
-
-def cor_novotny_quadratic(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = 1.335 * 10.0**-5 * oe**2 - \
-        3.239 * 10.0**-5 * oe * bxfc + \
-        2.916 * 10.0**-5 * bxfc**2 - \
-        2.421 * 10.0**-3 * oe + \
-        6.219 * 10.0**-3 * bxfc + 1.0
-    return oe, sg_to_p(fg), fg
-
-# Terrill correlation functions implemented according to:
-# Sean Terrill. Refractometer FG Results. 2011.
-# URL: http://seanterrill.com/2011/04/07/refractometer-fg-results/
-
-def cor_terrill_linear(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = 1.0 - 0.000856829 * oe + 0.00349412 * bxfc
-    return oe, sg_to_p(fg), fg
-
-def cor_terrill_cubic(bxi, bxf, wcf):
-    oe = correct_bx(bxi, wcf)
-    bxfc = correct_bx(bxf, wcf)
-    fg = 1.0 - 0.0044993 * oe + 0.000275806 * oe**2 - \
-        0.00000727999 * oe**3 + 0.0117741 * bxfc - \
-        0.00127169 * bxfc**2 + 0.0000632929 * bxfc**3
-    return oe, sg_to_p(fg), fg
-
-# Sean Terrill's website issues. 2020.
-# URL: https://www.reddit.com/r/Homebrewing/comments/bs3af9/sean_terrills_website_issues
-
-def cor_novotrill(bxi, bxf, wcf):
-    oe1, ae1, fg1 = cor_terrill_linear(bxi, bxf, wcf)
-    oe2, ae2, fg2 = cor_novotny_linear(bxi, bxf, wcf)
-    fg_mean = (fg1 + fg2) / 2.0
-    fg = np.where(fg_mean < 1.014, fg1, fg2)
-    return oe1, sg_to_p(fg), fg
-
-class RefracModel:
-    def __init__(self, name, short_name, cor_model):
-        self.name = name
-        self.short_name = short_name
-        self.cor_model = cor_model
-
-    def calc_ae(self, bxi, bxf, wcf):
-        oe, ae, fg = self.cor_model(bxi, bxf, wcf)
-        return ae
-
-refrac_models = [
-    RefracModel('Bonham', 'BO', cor_bonham),
-    RefracModel('Gardner', 'GA', cor_gardner),
-    RefracModel('Gossett', 'GO', cor_gossett),
-    RefracModel('Novotný Linear', 'NL', cor_novotny_linear),
-    RefracModel('Novotný Quadratisch', 'NQ', cor_novotny_quadratic),        
-    RefracModel('Terrill Kubisch', 'TK', cor_terrill_cubic),
-    RefracModel('Terrill Linear', 'TL', cor_terrill_linear),
-    RefracModel('Terrill & Novotný', 'TN', cor_novotrill)
-]
+import refrac
+from refrac import sg_to_p, get_models
+from stats import DeviationStats
+from outliers import OutlierFilter, IQRRule
+from result_cache import ResultCache, calc_key, calc_data_hash, calc_models_hash, calc_source_hash
+
+refrac_models = get_models(['BO', 'GA', 'GO', 'NL', 'NQ', 'TK', 'TL', 'TN'])
+
+model_names = {
+    'BO': 'Bonham',
+    'GA': 'Gardner',
+    'GO': 'Gossett',
+    'NL': 'Novotný Linear',
+    'NQ': 'Novotný Quadratisch',
+    'TK': 'Terrill Kubisch',
+    'TL': 'Terrill Linear',
+    'TN': 'Terrill & Novotný'
+}
 
 col_name_wcf = 'WCF'
 col_name_fg = 'FG'
@@ -151,33 +38,49 @@ col_name_statistic = 'Statistik'
 stats_caps = ['Max. Abw. [g/100g]', 'Mittlere Abw. [g/100g]', 'Standardabw. [g/100g] ',
 'Abw. < 0,25 g/100g [%]', 'Abw. < 0,50 g/100g [%]', 'Abw. < 1,00 g/100g [%]']
 
+# The model results are cached by the hashes of the data, the models and this script, --force
+# recomputes them
+use_cache = True
+force = False
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate the figures of the refractometer article.')
+    parser.add_argument('--force', action='store_true', help='recompute the cached model results')
+    force = parser.parse_args().force
+
+def calc_cached(name, data, compute):
+    if not use_cache:
+        return compute()
+    key = calc_key(name, calc_data_hash(data), calc_models_hash(refrac_models), calc_source_hash([refrac.__file__, __file__]))
+    return ResultCache().get_or_compute(key, compute, force)
+
 def calc_stats(devs):
-    devs_abs = devs.abs()
-    max = dev[devs_abs.idxmax()]
-    mean = devs.mean()
-    std = devs.std()
-    below_point_one = devs_abs.le(0.25).sum() / len(devs_abs) * 100.0
-    below_point_two = devs_abs.le(0.5).sum() / len(devs_abs) * 100.0
-    below_point_five = devs_abs.le(1.0).sum() / len(devs_abs) * 100.0
-    return [ max, mean, std, below_point_one, below_point_two, below_point_five ]   
+    stats = DeviationStats.from_arrays(devs)
+    return [ stats.max_abs, stats.mean, stats.std(), stats.below_percent(0.25), stats.below_percent(0.5), stats.below_percent(1.0) ]   
 
 data_ferm = pa.read_csv('data_fermentation.csv', delimiter=',')
-data_ferm_dev = pa.DataFrame()
-data_ferm_graph = pa.DataFrame()
 
-data_ferm_graph[col_name_measurement] = list(range(1, data_ferm.shape[0] + 1))
-data_ferm_graph[col_name_hydrometer] = data_ferm[col_name_ae]
+def calc_ferm():
+    data_ferm_dev = pa.DataFrame()
+    data_ferm_graph = pa.DataFrame()
 
-for model in refrac_models:
-    data_ferm_graph[model.name] = model.calc_ae(data_ferm[col_name_bxi], data_ferm[col_name_bxf], data_ferm[col_name_wcf])
-    data_ferm_dev[model.name] = data_ferm_graph[model.name] - data_ferm[col_name_ae]
+    data_ferm_graph[col_name_measurement] = list(range(1, data_ferm.shape[0] + 1))
+    data_ferm_graph[col_name_hydrometer] = data_ferm[col_name_ae]
+
+    for model in refrac_models:
+        name = model_names[model.short_name]
+        data_ferm_graph[name] = model.calc_ae(data_ferm[col_name_bxi], data_ferm[col_name_bxf], data_ferm[col_name_wcf])
+        data_ferm_dev[name] = data_ferm_graph[name] - data_ferm[col_name_ae]
+    return data_ferm_graph, data_ferm_dev
+
+data_ferm_graph, data_ferm_dev = calc_cached('fermentation', data_ferm, calc_ferm)
 
 data_ferm_table = pa.DataFrame()
 data_ferm_table[col_name_statistic] = ['Endabw. [g/100g]'] + stats_caps
 
 for model in refrac_models:
-    last = data_ferm_dev.iloc[-1][model.name]
-    dev = data_ferm_dev[model.name]
+    name = model_names[model.short_name]
+    last = data_ferm_dev.iloc[-1][name]
+    dev = data_ferm_dev[name]
     data_ferm_table[model.short_name] = [ last ] + calc_stats(dev)
 
 data_ferm_table.to_latex('table_fermentation.tex', index=False, float_format='%.1f', decimal=',')
@@ -188,6 +91,7 @@ plot_rows = len(refrac_models) // plot_cols + len(refrac_models) % plot_cols
 fig_ferm = plt.figure(constrained_layout=True, figsize=(8, 12))
 axes = fig_ferm.subplots(plot_rows, plot_cols, sharex=True, sharey=True)
 for i, model in enumerate(refrac_models):
+    name = model_names[model.short_name]
     plot_row = i // plot_cols
     plot_col = i % plot_cols
     if plot_rows > 1:
@@ -196,9 +100,9 @@ for i, model in enumerate(refrac_models):
         ax = axes[plot_col]
     ax.set_ylim([2,18])
     ax.plot(data_ferm_graph[col_name_measurement], data_ferm_graph[col_name_hydrometer], label=col_name_hydrometer)
-    ax.plot(data_ferm_graph[col_name_measurement], data_ferm_graph[model.name], label=model.name)
-    r2 = r2_score(data_ferm_graph[col_name_hydrometer], data_ferm_graph[model.name])
-    ax.set_title(model.name + ' (R²=' + '%.3f'%r2 + ')')
+    ax.plot(data_ferm_graph[col_name_measurement], data_ferm_graph[name], label=name)
+    r2 = r2_score(data_ferm_graph[col_name_hydrometer], data_ferm_graph[name])
+    ax.set_title(name + ' (R²=' + '%.3f'%r2 + ')')
     ax.legend(loc='best')  
     ax.set_ylabel('Scheinb. Restex. [g/100g]')
 
@@ -207,33 +111,40 @@ fig_ferm.savefig('graph_fermentation.pdf', format='pdf')
 default_wcf = 1.03
 
 data_ae = pa.read_csv('data.csv', delimiter=',')
-data_ae_abs = pa.DataFrame()
-data_ae_dev = pa.DataFrame()
 
 data_ae[col_name_ae] = np.where(np.isnan(data_ae[col_name_ae]), sg_to_p(data_ae[col_name_fg]), data_ae[col_name_ae])
 data_ae[col_name_wcf] = np.where(np.isnan(data_ae[col_name_wcf]), default_wcf, data_ae[col_name_wcf])
 
-data_ae_abs[col_name_hydrometer] = data_ae[col_name_ae]
-for model in refrac_models:
-    data_ae_abs[model.name] = model.calc_ae(data_ae[col_name_bxi], data_ae[col_name_bxf], data_ae[col_name_wcf])
-    data_ae_dev[model.name] = data_ae_abs[model.name] - data_ae[col_name_ae]
+def calc_ae():
+    data_ae_abs = pa.DataFrame()
+    data_ae_dev = pa.DataFrame()
+
+    data_ae_abs[col_name_hydrometer] = data_ae[col_name_ae]
+    for model in refrac_models:
+        name = model_names[model.short_name]
+        data_ae_abs[name] = model.calc_ae(data_ae[col_name_bxi], data_ae[col_name_bxf], data_ae[col_name_wcf])
+        data_ae_dev[name] = data_ae_abs[name] - data_ae[col_name_ae]
+    return data_ae_abs, data_ae_dev
+
+data_ae_abs, data_ae_dev = calc_cached('ae', data_ae, calc_ae)
 
+outlier_filter = OutlierFilter(data_ae_dev.index)
 filter_outliers = True
 if filter_outliers == True:
     row_criteria = data_ae_dev.abs().max(axis=1)
-    threshold = iqr(row_criteria) * 3
+    threshold = outlier_filter.add('Max. Abw.', row_criteria, IQRRule(3.0))[1]
     print('Filter threshold is %.2f'% threshold)
-    filter = row_criteria <= threshold
-    data_ae_abs = data_ae_abs.where(filter).dropna()
-    data_ae_dev = data_ae_dev.where(filter).dropna()
+    print(outlier_filter.report())
+mask = outlier_filter.mask
 
-print(data_ae_dev.describe())
+print(data_ae_dev[mask].describe())
 
 data_ae_table = pa.DataFrame()
 data_ae_table[col_name_statistic] = stats_caps
 
 for model in refrac_models:
-    dev = data_ae_dev[model.name]
+    name = model_names[model.short_name]
+    dev = data_ae_dev[name][mask]
     data_ae_table[model.short_name] = calc_stats(dev)
 
 data_ae_table.to_latex('table_ae.tex', index=False, float_format='%.1f', decimal=',')
@@ -241,16 +152,17 @@ data_ae_table.to_latex('table_ae.tex', index=False, float_format='%.1f', decimal
 fig_ae = plt.figure(constrained_layout=True, figsize=(8, 12))
 axes = fig_ae.subplots(plot_rows, plot_cols, sharex=True, sharey=True)
 for i, model in enumerate(refrac_models):
+    name = model_names[model.short_name]
     plot_row = i // plot_cols
     plot_col = i % plot_cols
     if plot_rows > 1:
         ax = axes[plot_row][plot_col]
     else:
         ax = axes[plot_col]
-    data_ae_dev[model.name].plot.hist(density=True, xlim=[-1.5,1.5], bins=15, ax=ax)
-    data_ae_dev[model.name].plot.density(ax=ax)
-    r2 = r2_score(data_ae_abs[col_name_hydrometer], data_ae_abs[model.name])
-    ax.set_title(model.name + ' (R²=' + '%.3f'%r2 + ')')
+    data_ae_dev[name][mask].plot.hist(density=True, xlim=[-1.5,1.5], bins=15, ax=ax)
+    data_ae_dev[name][mask].plot.density(ax=ax)
+    r2 = r2_score(data_ae_abs[col_name_hydrometer][mask], data_ae_abs[name][mask])
+    ax.set_title(name + ' (R²=' + '%.3f'%r2 + ')')
     ax.set_xlabel('Abw. scheinbarer Restextrakt [g/100g]')
     ax.set_ylabel('Dichte')
 
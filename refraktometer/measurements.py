@@ -0,0 +1,136 @@
+# Refractometer Measurement Data Loading
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import hashlib
+import os
+import shutil
+import numpy as np
+import pandas as pa
+
+# Columns of the measurement data sets (see data.csv), columns which are not listed here are read
+# with the default pandas types
+float_columns = ['OE', 'AE', 'OG', 'FG', 'BXI', 'BXF', 'WCF']
+category_columns = ['Reference', 'Refractometer', 'Organization', 'Operator']
+date_columns = ['Date']
+
+# Increased when the converted format changes, which invalidates all cached files
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'refraktometer')
+
+chunk_size = 1000000
+
+def create_dtypes(float_dtype=np.float32):
+    dtypes = { i: float_dtype for i in float_columns }
+    dtypes.update({ i: 'category' for i in category_columns })
+    dtypes.update({ i: str for i in date_columns })
+    return dtypes
+
+def parse_dates(data):
+    for i in date_columns:
+        if i in data.columns:
+            data[i] = pa.to_datetime(data[i], errors='coerce')
+    return data
+
+# Typed chunks for out-of-core processing, the index continues over the chunks
+def read_chunks(file_name, float_dtype=np.float32, chunk_size=chunk_size):
+    for chunk in pa.read_csv(file_name, delimiter=',', dtype=create_dtypes(float_dtype), chunksize=chunk_size):
+        yield parse_dates(chunk)
+
+# The categories of the chunks differ, they are unified before the chunks are concatenated
+def read_csv(file_name, float_dtype=np.float32, chunk_size=chunk_size):
+    chunks = list(read_chunks(file_name, float_dtype, chunk_size))
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = {}
+    for i in chunks[0].columns:
+        if isinstance(chunks[0][i].dtype, pa.CategoricalDtype):
+            columns[i] = pa.api.types.union_categoricals([chunk[i] for chunk in chunks])
+        else:
+            columns[i] = np.concatenate([chunk[i].to_numpy() for chunk in chunks])
+    return pa.DataFrame(columns)
+
+def calc_hash(key, length):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:length]
+
+# The cache file name consists of the source path and its size and modification time, so a changed
+# CSV file is converted again and the conversion of the previous version can be found
+def get_cache_name(cache_dir, file_name, float_dtype):
+    stat = os.stat(file_name)
+    prefix = os.path.splitext(os.path.basename(file_name))[0] + '_' + calc_hash(os.path.abspath(file_name), 8) + '_'
+    state = '%d:%d:%s:%d' % (stat.st_size, stat.st_mtime_ns, np.dtype(float_dtype).name, CACHE_VERSION)
+    return os.path.join(cache_dir, prefix), calc_hash(state, 24)
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Parquet if pyarrow is installed, otherwise one .npy file per column which is memory-mapped when
+# loaded. Categories are stored as codes and a separate string array.
+def save_cache(cache_name, data):
+    tmp_name = cache_name + '.' + str(os.getpid()) + '.tmp'
+    if pyarrow is not None:
+        data.to_parquet(tmp_name, index=False)
+        os.replace(tmp_name, cache_name + '.parquet')
+        return
+    os.makedirs(tmp_name)
+    for i, column in enumerate(data.columns):
+        values = data[column]
+        prefix = os.path.join(tmp_name, '%03d' % i)
+        if isinstance(values.dtype, pa.CategoricalDtype):
+            np.save(prefix + '.codes.npy', values.cat.codes.to_numpy())
+            np.save(prefix + '.categories.npy', values.cat.categories.to_numpy(dtype=str))
+        elif values.dtype == object:
+            np.save(prefix + '.str.npy', values.to_numpy(dtype=str))
+        else:
+            np.save(prefix + '.npy', values.to_numpy())
+    with open(os.path.join(tmp_name, 'columns.txt'), 'w') as f:
+        f.write('\n'.join(data.columns))
+    if os.path.exists(cache_name + '.npy'):
+        shutil.rmtree(cache_name + '.npy')
+    os.replace(tmp_name, cache_name + '.npy')
+
+def load_cache(cache_name):
+    if pyarrow is not None and os.path.exists(cache_name + '.parquet'):
+        return pa.read_parquet(cache_name + '.parquet')
+    cache_dir = cache_name + '.npy'
+    if not os.path.isdir(cache_dir):
+        return None
+    with open(os.path.join(cache_dir, 'columns.txt')) as f:
+        names = f.read().split('\n')
+    columns = {}
+    for i, column in enumerate(names):
+        prefix = os.path.join(cache_dir, '%03d' % i)
+        if os.path.exists(prefix + '.codes.npy'):
+            columns[column] = pa.Categorical.from_codes(np.load(prefix + '.codes.npy'), np.load(prefix + '.categories.npy'))
+        elif os.path.exists(prefix + '.str.npy'):
+            columns[column] = np.load(prefix + '.str.npy').astype(object)
+        else:
+            columns[column] = np.load(prefix + '.npy', mmap_mode='r')
+    return pa.DataFrame(columns)
+
+# Conversions of earlier versions of the same file are removed
+def remove_stale_caches(prefix):
+    cache_dir, prefix = os.path.split(prefix)
+    for i in os.listdir(cache_dir):
+        if i.startswith(prefix):
+            path = os.path.join(cache_dir, i)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+# Loads a measurement data set with the typed schema, the converted data is cached and reused as
+# long as the CSV file is unchanged. cache_dir None disables the cache.
+def load(file_name, float_dtype=np.float32, cache_dir=DEFAULT_CACHE_DIR):
+    if cache_dir is None:
+        return read_csv(file_name, float_dtype)
+    prefix, state = get_cache_name(cache_dir, file_name, float_dtype)
+    data = load_cache(prefix + state)
+    if data is None:
+        data = read_csv(file_name, float_dtype)
+        os.makedirs(cache_dir, exist_ok=True)
+        remove_stale_caches(prefix)
+        save_cache(prefix + state, data)
+    return data
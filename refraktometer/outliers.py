@@ -0,0 +1,101 @@
+# Outlier Filtering of Refractometer Measurements
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import numpy as np
+import pandas as pa
+
+col_name_rule = 'Rule'
+col_name_value = 'Value'
+col_name_lower_limit = 'Lower Limit'
+col_name_upper_limit = 'Upper Limit'
+
+# Scale of the median absolute deviation to the standard deviation of a normal distribution
+mad_scale = 1.4826
+
+# A rule returns the lower and upper limit of the accepted values, either as scalars or per value.
+# Values outside of the limits and missing values are outliers.
+
+# Absolute values up to factor times the interquartile range, the rule of the original evaluation
+class IQRRule:
+    def __init__(self, factor=3.0):
+        self.factor = factor
+        self.name = 'IQR'
+
+    def calc_limits(self, values):
+        q75, q25 = np.percentile(values, [75, 25])
+        threshold = abs((q75 - q25) * self.factor)
+        return -threshold, threshold
+
+# Distance from the median up to factor times the scaled median absolute deviation
+class MADRule:
+    def __init__(self, factor=3.0):
+        self.factor = factor
+        self.name = 'MAD'
+
+    def calc_limits(self, values):
+        median = np.nanmedian(values)
+        threshold = self.factor * mad_scale * np.nanmedian(np.abs(values - median))
+        return median - threshold, median + threshold
+
+# MAD rule over a moving window of the neighboring values in the order of the measurements, for
+# drifting series like fermentations. The window is shortened at the ends.
+class HampelRule:
+    def __init__(self, window=7, factor=3.0):
+        self.window = window
+        self.factor = factor
+        self.name = 'Hampel'
+
+    def calc_limits(self, values):
+        half = self.window // 2
+        padded = np.pad(np.asarray(values, dtype=float), half, constant_values=np.nan)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * half + 1)
+        median = np.nanmedian(windows, axis=1)
+        threshold = self.factor * mad_scale * np.nanmedian(np.abs(windows - median[:, np.newaxis]), axis=1)
+        return median - threshold, median + threshold
+
+# Fixed limits, e.g. to apply the limits of an earlier evaluation to new measurements
+class LimitRule:
+    def __init__(self, lower_limit, upper_limit):
+        self.lower_limit = lower_limit
+        self.upper_limit = upper_limit
+        self.name = 'Limit'
+
+    def calc_limits(self, values):
+        return self.lower_limit, self.upper_limit
+
+# Collects the criteria of all rules in one boolean mask over the rows of a data frame. The frame
+# itself is not touched, consumers select the rows with the mask when they need them. Every
+# violated rule is reported per row.
+class OutlierFilter:
+    def __init__(self, index):
+        self.index = index
+        self.mask = np.ones(len(index), dtype=bool)
+        self.reports = []
+
+    # With groups the limits are calculated separately for the values of each group
+    def add(self, name, values, rule, groups=None):
+        values = np.asarray(values, dtype=float)
+        if groups is None:
+            lower_limit, upper_limit = rule.calc_limits(values)
+        else:
+            lower_limit = np.empty(len(values))
+            upper_limit = np.empty(len(values))
+            codes = pa.factorize(np.asarray(groups), use_na_sentinel=False)[0]
+            for code in range(codes.max() + 1):
+                group = codes == code
+                lower_limit[group], upper_limit[group] = rule.calc_limits(values[group])
+        keep = (values >= lower_limit) & (values <= upper_limit)
+        self.mask &= keep
+        drop = ~keep
+        self.reports.append(pa.DataFrame({
+            col_name_rule: name + ' (' + rule.name + ')',
+            col_name_value: values[drop],
+            col_name_lower_limit: np.broadcast_to(lower_limit, values.shape)[drop],
+            col_name_upper_limit: np.broadcast_to(upper_limit, values.shape)[drop] }, index=self.index[drop]))
+        return lower_limit, upper_limit
+
+    def report(self):
+        if len(self.reports) == 0:
+            return pa.DataFrame(columns=[col_name_rule, col_name_value, col_name_lower_limit, col_name_upper_limit])
+        return pa.concat(self.reports).sort_index(kind='stable')
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Refitting of the Refractometer Correlation Coefficients
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import analysis
+import refrac
+import measurements
+from refrac import correct_bx, sg_to_p, p_to_sg
+
+default_file_name = 'fitted_models.json'
+
+chunk_size = 100000
+
+# The fitted correlations have the polynomial structure of the published ones, only the
+# coefficients differ. The terms are in the order of the coefficients.
+
+def calc_terms_terrill_cubic(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    bxfc = correct_bx(bxf, wcf)
+    return [np.ones_like(oe), oe, oe**2, oe**3, bxfc, bxfc**2, bxfc**3]
+
+def create_cor_terrill_cubic(c):
+    def cor_terrill_cubic_fitted(bxi, bxf, wcf):
+        oe = correct_bx(bxi, wcf)
+        bxfc = correct_bx(bxf, wcf)
+        fg = c[0] + c[1] * oe + c[2] * oe**2 + c[3] * oe**3 + c[4] * bxfc + c[5] * bxfc**2 + c[6] * bxfc**3
+        return oe, sg_to_p(fg), fg
+    return cor_terrill_cubic_fitted
+
+def calc_terms_novotny_quadratic(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    bxfc = correct_bx(bxf, wcf)
+    return [np.ones_like(oe), oe**2, oe * bxfc, bxfc**2, oe, bxfc]
+
+def create_cor_novotny_quadratic(c):
+    def cor_novotny_quadratic_fitted(bxi, bxf, wcf):
+        oe = correct_bx(bxi, wcf)
+        bxfc = correct_bx(bxf, wcf)
+        fg = c[0] + c[1] * oe**2 + c[2] * oe * bxfc + c[3] * bxfc**2 + c[4] * oe + c[5] * bxfc
+        return oe, sg_to_p(fg), fg
+    return cor_novotny_quadratic_fitted
+
+# Bonham uses the uncorrected final reading
+def calc_terms_bonham(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    return [np.ones_like(oe), oe, oe**2, oe**3, bxf, bxf**2, bxf**3]
+
+def create_cor_bonham(c):
+    def cor_bonham_fitted(bxi, bxf, wcf):
+        oe = correct_bx(bxi, wcf)
+        fg = c[0] + c[1] * oe + c[2] * oe**2 + c[3] * oe**3 + c[4] * bxf + c[5] * bxf**2 + c[6] * bxf**3
+        return oe, sg_to_p(fg), fg
+    return cor_bonham_fitted
+
+class ModelFamily:
+    def __init__(self, short_name, calc_terms, create_cor):
+        self.short_name = short_name
+        self.calc_terms = calc_terms
+        self.create_cor = create_cor
+        self.model = refrac.get_model(short_name)
+
+    def calc_design_matrix(self, bxi, bxf, wcf):
+        return np.stack(self.calc_terms(bxi, bxf, wcf), axis=1)
+
+model_families = {
+    'TK': ModelFamily('TK', calc_terms_terrill_cubic, create_cor_terrill_cubic),
+    'NQ': ModelFamily('NQ', calc_terms_novotny_quadratic, create_cor_novotny_quadratic),
+    'BO': ModelFamily('BO', calc_terms_bonham, create_cor_bonham)
+}
+
+# Normal equations X'X c = X'y per cross-validation fold. They are additive, so chunks, files and
+# folds are accumulated independently and summed up afterwards. The sum of squared errors of the
+# literature model is collected in the same pass for comparison.
+class NormalEquations:
+    def __init__(self, terms, folds):
+        self.xtx = np.zeros((folds, terms, terms))
+        self.xty = np.zeros((folds, terms))
+        self.yty = np.zeros(folds)
+        self.n = np.zeros(folds, dtype=int)
+        self.sse_reference = np.zeros(folds)
+
+    def add(self, x, y, fold_ids, y_reference):
+        for fold in range(len(self.n)):
+            mask = fold_ids == fold
+            xf = x[mask]
+            yf = y[mask]
+            self.xtx[fold] += xf.T @ xf
+            self.xty[fold] += xf.T @ yf
+            self.yty[fold] += yf @ yf
+            self.n[fold] += len(yf)
+            self.sse_reference[fold] += np.sum((y_reference[mask] - yf)**2)
+
+    def merge(self, other):
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.yty += other.yty
+        self.n += other.n
+        self.sse_reference += other.sse_reference
+
+    # The terms are scaled to a unit diagonal of X'X before solving, the polynomial terms have very
+    # different magnitudes. The ridge penalty applies to the scaled terms, which makes it
+    # independent of these magnitudes. The intercept is not penalized.
+    def solve(self, folds, ridge=0.0):
+        xtx = self.xtx[folds].sum(axis=0)
+        xty = self.xty[folds].sum(axis=0)
+        scale = np.sqrt(np.diag(xtx))
+        penalty = np.full(len(scale), ridge)
+        penalty[0] = 0.0
+        z = np.linalg.lstsq(xtx / np.outer(scale, scale) + np.diag(penalty), xty / scale, rcond=None)[0]
+        return z / scale
+
+    # Sum of squared errors of the coefficients on one fold: y'y - 2 c'X'y + c'X'X c
+    def calc_sse(self, c, fold):
+        return self.yty[fold] - 2.0 * c @ self.xty[fold] + c @ self.xtx[fold] @ c
+
+# The target is the FG of the reference measurement. The WCF is the default WCF or the measurement
+# specific one, as in the evaluation.
+def prepare_chunk(data, config, default_wcf):
+    data = analysis.prepare_data(data, config)
+    data = data[np.isfinite(data[analysis.col_name_ae]) & np.isfinite(data[analysis.col_name_bxf])]
+    if config.measurement_specific_wcf == False:
+        data[analysis.col_name_wcf] = default_wcf
+    return data
+
+# The jobs of several files run in parallel workers, a single one in the calling process
+def map_jobs(func, jobs, max_workers=None):
+    if len(jobs) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(func, jobs))
+    return [func(i) for i in jobs]
+
+def read_wcf(job):
+    file_name, config = job
+    wcf = [analysis.prepare_data(chunk, config)[analysis.col_name_wcf].to_numpy(dtype=float) for chunk in measurements.read_chunks(file_name, analysis.data_float_dtype, chunk_size)]
+    return np.concatenate(wcf)
+
+# The default WCF is recalculated like in the evaluation, as 75th percentile of the WCF of all
+# measurements of all files. This needs a separate pass over the files.
+def calc_default_wcf(file_names, config, max_workers=None):
+    if config.recalc_default_wcf == False or config.measurement_specific_wcf == True:
+        return config.default_wcf
+    wcf = np.concatenate(map_jobs(read_wcf, [(i, config) for i in file_names], max_workers))
+    return float(np.percentile(wcf[~np.isnan(wcf)], 75))
+
+def accumulate_file(job):
+    file_name, family_name, folds, config, default_wcf = job
+    family = model_families[family_name]
+    equations = NormalEquations(len(family.calc_terms(np.ones(1), np.ones(1), np.ones(1))), folds)
+    for chunk in measurements.read_chunks(file_name, analysis.data_float_dtype, chunk_size):
+        data = prepare_chunk(chunk, config, default_wcf)
+        # The index continues over the chunks, so the folds only depend on the row of the file
+        fold_ids = data.index.to_numpy() % folds
+        bxi = data[analysis.col_name_bxi].to_numpy(dtype=float)
+        bxf = data[analysis.col_name_bxf].to_numpy(dtype=float)
+        wcf = data[analysis.col_name_wcf].to_numpy(dtype=float)
+        fg_reference = family.model.evaluate(bxi, bxf, wcf)[2]
+        equations.add(family.calc_design_matrix(bxi, bxf, wcf), p_to_sg(data[analysis.col_name_ae].to_numpy(dtype=float)), fold_ids, fg_reference)
+    return equations
+
+# The files are read in chunks by parallel workers, only the small normal equations are returned
+def accumulate_files(file_names, family_name, folds=5, config=None, max_workers=None, default_wcf=None):
+    if config is None:
+        config = analysis.EvalConfig()
+    if default_wcf is None:
+        default_wcf = calc_default_wcf(file_names, config, max_workers)
+    results = map_jobs(accumulate_file, [(i, family_name, folds, config, default_wcf) for i in file_names], max_workers)
+    equations = results[0]
+    for i in results[1:]:
+        equations.merge(i)
+    return equations
+
+# Root mean squared FG error of the k-fold cross-validation per ridge penalty
+def cross_validate(equations, ridges=(0.0,)):
+    folds = len(equations.n)
+    rmse = []
+    for ridge in ridges:
+        sse = 0.0
+        for fold in range(folds):
+            c = equations.solve([i for i in range(folds) if i != fold], ridge)
+            sse += equations.calc_sse(c, fold)
+        rmse.append(np.sqrt(max(sse, 0.0) / equations.n.sum()))
+    return rmse
+
+class FitResult:
+    def __init__(self, family_name, coeffs, ridge, rmse, rmse_reference, count):
+        self.family_name = family_name
+        self.coeffs = coeffs
+        self.ridge = ridge
+        self.rmse = rmse
+        self.rmse_reference = rmse_reference
+        self.count = count
+
+    def to_dict(self):
+        return { 'family': self.family_name, 'coeffs': [float(i) for i in self.coeffs], 'ridge': self.ridge,
+            'rmse': float(self.rmse), 'rmse_reference': float(self.rmse_reference), 'count': int(self.count) }
+
+def fit_family(file_names, family_name, folds=5, ridges=(0.0,), config=None, max_workers=None, default_wcf=None):
+    if config is None:
+        config = analysis.EvalConfig()
+    if default_wcf is None:
+        default_wcf = calc_default_wcf(file_names, config, max_workers)
+    equations = accumulate_files(file_names, family_name, folds, config, max_workers, default_wcf)
+    rmse = cross_validate(equations, ridges)
+    best = int(np.argmin(rmse))
+    coeffs = equations.solve(list(range(folds)), ridges[best])
+    rmse_reference = np.sqrt(equations.sse_reference.sum() / equations.n.sum())
+    return FitResult(family_name, coeffs, ridges[best], rmse[best], rmse_reference, equations.n.sum())
+
+# Fitted models are registered as ordinary refrac models and can be selected by short name
+def register_fitted_model(name, short_name, family_name, coeffs):
+    cor = model_families[family_name].create_cor(tuple(float(i) for i in coeffs))
+    return refrac.register_model(refrac.RefracModel(name, short_name, cor))
+
+def save_fitted_models(fitted, file_name=default_file_name):
+    with open(file_name, 'w') as f:
+        json.dump(fitted, f, indent=2, ensure_ascii=False)
+
+def load_fitted_models(file_name=default_file_name):
+    with open(file_name) as f:
+        fitted = json.load(f)
+    return [register_fitted_model(i['name'], short_name, i['family'], i['coeffs']) for short_name, i in fitted.items()]
+
+def main(argv=None):
+    parser = analysis.create_arg_parser()
+    parser.description = 'Refit the coefficients of refractometer correlation models.'
+    parser.add_argument('inputs', nargs='+', help='measurement data sets')
+    parser.add_argument('--family', nargs='+', choices=list(model_families.keys()), default=list(model_families.keys()), help='model families to refit')
+    parser.add_argument('-k', '--folds', type=int, default=5, help='number of cross-validation folds')
+    parser.add_argument('--ridge', type=float, nargs='+', default=[0.0], help='relative ridge penalties, the best one is selected by cross-validation')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of cores)')
+    parser.add_argument('-o', '--output', default=default_file_name, help='fitted models')
+    args = parser.parse_args(argv)
+    config = analysis.create_config(args)
+
+    default_wcf = calc_default_wcf(args.inputs, config, args.jobs)
+    if config.measurement_specific_wcf == False:
+        print('Default WCF: %.4f' % default_wcf)
+    fitted = {}
+    for family_name in args.family:
+        result = fit_family(args.inputs, family_name, args.folds, args.ridge, config, args.jobs, default_wcf)
+        model = refrac.get_model(family_name)
+        fitted[family_name + 'F'] = dict(name=model.name + ' Fitted', **result.to_dict())
+        print('%s: %d measurements, CV RMSE %.5f SG (literature %.5f SG), ridge %g' % (model.name, result.count, result.rmse, result.rmse_reference, result.ridge))
+        print('  ' + ', '.join('%.6g' % i for i in result.coeffs))
+    save_fitted_models(fitted, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# Refractometer Correlation Models
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import types
+import numpy as np
+
+# ABV = alcohol by volume in %
+# ABW = alcohol by weight in %
+# AE = apparent extract in °P
+# BXF = final refractometer reading in °Bx
+# BXI = initial refractometer reading in °Bx
+# FG = final gravity in SG
+# OE = original extract in °P
+# RE = real extract in °P
+# SG = specific gravity
+# WCF = wort correction factor
+
+def correct_bx(bx, wcf):
+    return bx / wcf
+
+# Alcohol content estimation and Plato/SG conversion implemented according to
+# G. Spedding. "Alcohol and Its Measurement". In: Brewing Materials and Processes. Elsevier,
+# 2016, S. 123-149. DOI: 10.1016/b978-0-12-799954-8.00007-1.
+
+def sg_to_p(sg):
+    return sg**2 * -205.347 + 668.72 * sg - 463.37
+
+def p_to_sg(p):
+    return p / (258.6 - (p / 258.2 * 227.1)) + 1.0
+
+def calc_re(oe, ae):
+    return 0.1948 * oe + 0.8052 * ae
+
+def calc_abw(oe, re):
+    return (oe - re) / (2.0665 - (1.0665 * oe / 100.0))
+
+def calc_abv(abw, fg):
+    return abw * fg / 0.7907
+
+def calc_abv_simple(oe, ae):
+    return calc_abv(calc_abw(oe, calc_re(oe, ae)), p_to_sg(ae))
+
+# Bonham (Standard) correlation function implemented according to:
+# Louis K. Bonham. "The Use of Handheld Refractometers by Homebrewers".
+# In: Zymurgy 24.1 (2001), S. 43-46.
+
+def cor_bonham(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    fg = 1.001843 - 0.002318474 * oe - 0.000007775 * oe**2 - \
+        0.000000034 * oe**3 + 0.00574 * bxf + \
+        0.00003344 * bxf**2 + 0.000000086 * bxf**3
+    return oe, sg_to_p(fg), fg
+
+# Gardner correlation function implemented according to:
+# Louis K. Bonham. "The Use of Handheld Refractometers by Homebrewers".
+# In: Zymurgy 24.1 (2001), S. 43-46.
+
+def cor_gardner(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    ae = 1.53 * bxf - 0.59 * oe
+    return oe, ae, p_to_sg(ae)
+
+# Gossett correlation function implemented according to:
+# James M. Gossett. Derivation and Explanation of the Brix-Based Calculator For Estimating
+# ABV in Fermenting and Finished Beers. 2012.
+# URL: http://www.ithacoin.com/brewing/Derivation.htm
+
+def abw_gosett(bxi, bxf, wcf):
+    k = 0.445
+    c = 100.0 * (bxi - bxf) / (100.0 - 48.4 * k - 0.582 * bxf)
+    return 48.4 * c / (100 - 0.582 * c)
+
+# The Gossett correlation is for abw and not fg. For abv calculation Gossett utilizes the
+# Bonham correlation. Here the fg is derived from the abw equation instead.
+def cor_gossett(bxi, bxf, wcf):
+    abw = abw_gosett(bxi, bxf, wcf)
+    ae = bxi - (abw * (2.0665 - 1.0665 * bxi / 100.0)) / 0.8052
+    return bxi, ae, p_to_sg(ae)
+
+# Novotný correlation functions implemented according to:
+# Petr Novotný. Počítáme: Nová korekce refraktometru. 2017.
+# URL: http://www.diversity.beer/2017/01/pocitame-nova-korekce-refraktometru.html
+
+def cor_novotny_linear(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    bxfc = correct_bx(bxf, wcf)
+    fg = -0.002349 * oe + 0.006276 * bxfc + 1.0
+    return oe, sg_to_p(fg), fg
+
+def cor_novotny_quadratic(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    bxfc = correct_bx(bxf, wcf)
+    fg = 1.335 * 10.0**-5 * oe**2 - \
+        3.239 * 10.0**-5 * oe * bxfc + \
+        2.916 * 10.0**-5 * bxfc**2 - \
+        2.421 * 10.0**-3 * oe + \
+        6.219 * 10.0**-3 * bxfc + 1.0
+    return oe, sg_to_p(fg), fg
+
+# Terrill correlation functions implemented according to:
+# Sean Terrill. Refractometer FG Results. 2011.
+# URL: http://seanterrill.com/2011/04/07/refractometer-fg-results/
+
+def cor_terrill_linear(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    bxfc = correct_bx(bxf, wcf)
+    fg = 1.0 - 0.000856829 * oe + 0.00349412 * bxfc
+    return oe, sg_to_p(fg), fg
+
+def cor_terrill_cubic(bxi, bxf, wcf):
+    oe = correct_bx(bxi, wcf)
+    bxfc = correct_bx(bxf, wcf)
+    fg = 1.0 - 0.0044993 * oe + 0.000275806 * oe**2 - \
+        0.00000727999 * oe**3 + 0.0117741 * bxfc - \
+        0.00127169 * bxfc**2 + 0.0000632929 * bxfc**3
+    return oe, sg_to_p(fg), fg
+
+# Sean Terrill's website issues. 2020.
+# URL: https://www.reddit.com/r/Homebrewing/comments/bs3af9/sean_terrills_website_issues
+
+def cor_novotrill(bxi, bxf, wcf):
+    oe1, ae1, fg1 = cor_terrill_linear(bxi, bxf, wcf)
+    oe2, ae2, fg2 = cor_novotny_linear(bxi, bxf, wcf)
+    fg_mean = (fg1 + fg2) / 2.0
+    fg = np.where(fg_mean < 1.014, fg1, fg2)
+    return oe1, sg_to_p(fg), fg
+
+# Functions of this module which are compiled by Numba for the model kernels
+kernel_functions = [ correct_bx, sg_to_p, p_to_sg, calc_re, calc_abw, calc_abv,
+    cor_bonham, cor_gardner, abw_gosett, cor_gossett, cor_novotny_linear, cor_novotny_quadratic,
+    cor_terrill_linear, cor_terrill_cubic, cor_novotrill ]
+
+# Inputs with at least this number of measurements are evaluated with a Numba kernel if Numba is
+# installed, below the compilation time outweighs the gain
+jit_threshold = 100000
+
+# Numba is imported on the first compilation, importing it takes longer than evaluating the
+# inputs below the threshold
+numba = None
+numba_imported = False
+
+def get_numba():
+    global numba, numba_imported
+    if not numba_imported:
+        numba_imported = True
+        try:
+            import numba as numba_module
+            numba = numba_module
+        except ImportError:
+            numba = None
+    return numba
+
+jit_namespace = None
+
+# Numba resolves the functions called by a compiled function from its globals. Copies of the
+# kernel functions are therefore compiled within a shared namespace, so they call each other's
+# compiled versions while the originals stay usable with pandas Series.
+def get_jit_namespace():
+    global jit_namespace
+    if jit_namespace is None:
+        # The kernels work on single values, where the NumPy where() of cor_novotrill is replaced
+        # by a plain conditional expression
+        scalar_np = types.ModuleType('scalar_np')
+        scalar_np.where = numba.njit(lambda condition, x, y: x if condition else y)
+        jit_namespace = { 'np': scalar_np }
+        for func in kernel_functions:
+            copy = types.FunctionType(func.__code__, jit_namespace, func.__name__, func.__defaults__, func.__closure__)
+            jit_namespace[func.__name__] = numba.njit(copy)
+    return jit_namespace
+
+# Functions of other modules, e.g. refitted correlations, are copied with references to the kernel
+# functions replaced by the versions of the namespace
+def copy_function(func, namespace):
+    func_globals = dict(func.__globals__)
+    for i in kernel_functions:
+        if func_globals.get(i.__name__) is i:
+            func_globals[i.__name__] = namespace[i.__name__]
+    return types.FunctionType(func.__code__, func_globals, func.__name__, func.__defaults__, func.__closure__)
+
+def get_jit_function(func):
+    namespace = get_jit_namespace()
+    if func.__name__ in namespace and func in kernel_functions:
+        return namespace[func.__name__]
+    return numba.njit(copy_function(func, namespace))
+
+# Fused element-wise kernel without any intermediate arrays
+def create_jit_kernel(cor_model, abw_model):
+    cor = get_jit_function(cor_model)
+    abw_func = get_jit_function(abw_model) if abw_model is not None else None
+    namespace = get_jit_namespace()
+    calc_re_jit = namespace['calc_re']
+    calc_abw_jit = namespace['calc_abw']
+    calc_abv_jit = namespace['calc_abv']
+
+    if abw_func is None:
+        def kernel(bxi, bxf, wcf, results):
+            for i in range(len(bxi)):
+                oe, ae, fg = cor(bxi[i], bxf[i], wcf[i])
+                results[0, i] = oe
+                results[1, i] = ae
+                results[2, i] = fg
+                results[3, i] = calc_abv_jit(calc_abw_jit(oe, calc_re_jit(oe, ae)), fg)
+    else:
+        def kernel(bxi, bxf, wcf, results):
+            for i in range(len(bxi)):
+                oe, ae, fg = cor(bxi[i], bxf[i], wcf[i])
+                results[0, i] = oe
+                results[1, i] = ae
+                results[2, i] = fg
+                results[3, i] = calc_abv_jit(abw_func(bxi[i], bxf[i], wcf[i]), fg)
+    return numba.njit(kernel)
+
+scalar_namespace = None
+
+# Same approach as for the Numba kernels: copies of the kernel functions which work on single
+# float values without the NumPy call overhead, used for per-reading evaluation of a stream
+def get_scalar_namespace():
+    global scalar_namespace
+    if scalar_namespace is None:
+        scalar_np = types.ModuleType('scalar_np')
+        scalar_np.where = lambda condition, x, y: x if condition else y
+        scalar_namespace = { 'np': scalar_np }
+        for func in kernel_functions:
+            scalar_namespace[func.__name__] = types.FunctionType(func.__code__, scalar_namespace, func.__name__, func.__defaults__, func.__closure__)
+    return scalar_namespace
+
+def get_scalar_function(func):
+    namespace = get_scalar_namespace()
+    if func.__name__ in namespace and func in kernel_functions:
+        return namespace[func.__name__]
+    return copy_function(func, namespace)
+
+class RefracModel:
+    # The inputs declare which of the readings bxi, bxf and wcf are used by the correlation
+    def __init__(self, name, short_name, cor_model, abw_model=None, inputs=('bxi', 'bxf', 'wcf')):
+        self.name = name
+        self.short_name = short_name
+        self.cor_model = cor_model
+        self.abw_model = abw_model
+        self.inputs = inputs
+        self.jit_kernel = None
+        self.scalar_functions = None
+
+    def calc_ae(self, bxi, bxf, wcf):
+        oe, ae, fg = self.cor_model(bxi, bxf, wcf)
+        return ae
+
+    def calc_abv(self, bxi, bxf, wcf):
+        oe, ae, fg = self.cor_model(bxi, bxf, wcf)
+        if self.abw_model is None:
+            return calc_abv(calc_abw(oe, calc_re(oe, ae)), fg)
+        else:
+            return calc_abv(self.abw_model(bxi, bxf, wcf), fg)
+
+    # Evaluates the correlation model once and returns OE, AE, FG and ABV together. Inputs are
+    # converted to plain NumPy arrays, which avoids the index alignment and the intermediate
+    # Series objects of pandas. Large inputs are processed in chunks, so the intermediate arrays
+    # of the correlation functions stay small and in cache, or by a fused Numba kernel.
+    def evaluate(self, bxi, bxf, wcf=np.nan, chunk_size=65536):
+        if 'wcf' in self.inputs and np.any(np.isnan(wcf)):
+            raise ValueError(self.name + ' requires a WCF')
+        bxi, bxf, wcf = np.broadcast_arrays(np.atleast_1d(np.asarray(bxi, dtype=float)), np.asarray(bxf, dtype=float), np.asarray(wcf, dtype=float))
+        results = np.empty((4,) + bxi.shape)
+        if len(bxi) >= jit_threshold and self.get_jit_kernel() is not None:
+            self.jit_kernel(np.ascontiguousarray(bxi), np.ascontiguousarray(bxf), np.ascontiguousarray(wcf), results)
+        else:
+            for start in range(0, len(bxi), chunk_size):
+                chunk = slice(start, start + chunk_size)
+                self.evaluate_chunk(bxi[chunk], bxf[chunk], wcf[chunk], results[:, chunk])
+        return results[0], results[1], results[2], results[3]
+
+    def evaluate_chunk(self, bxi, bxf, wcf, results):
+        oe, ae, fg = self.cor_model(bxi, bxf, wcf)
+        if self.abw_model is None:
+            abw = calc_abw(oe, calc_re(oe, ae))
+        else:
+            abw = self.abw_model(bxi, bxf, wcf)
+        results[0] = oe
+        results[1] = ae
+        results[2] = fg
+        results[3] = calc_abv(abw, fg)
+
+    # Evaluates a single reading of plain floats and returns OE, AE, FG and ABV
+    def evaluate_scalar(self, bxi, bxf, wcf=np.nan):
+        if self.scalar_functions is None:
+            namespace = get_scalar_namespace()
+            abw_model = get_scalar_function(self.abw_model) if self.abw_model is not None else None
+            self.scalar_functions = (get_scalar_function(self.cor_model), abw_model,
+                namespace['calc_re'], namespace['calc_abw'], namespace['calc_abv'])
+        cor, abw_model, calc_re_scalar, calc_abw_scalar, calc_abv_scalar = self.scalar_functions
+        if 'wcf' in self.inputs and wcf != wcf:
+            raise ValueError(self.name + ' requires a WCF')
+        oe, ae, fg = cor(bxi, bxf, wcf)
+        if abw_model is None:
+            abw = calc_abw_scalar(oe, calc_re_scalar(oe, ae))
+        else:
+            abw = abw_model(bxi, bxf, wcf)
+        return oe, ae, fg, calc_abv_scalar(abw, fg)
+
+    # The kernel is compiled on first use. Models which can not be compiled, e.g. custom
+    # correlations using functions unknown to Numba, stay on the NumPy path.
+    def get_jit_kernel(self):
+        if self.jit_kernel is False or get_numba() is None:
+            return None
+        if self.jit_kernel is None:
+            try:
+                kernel = create_jit_kernel(self.cor_model, self.abw_model)
+                # Read-only inputs (e.g. from pandas) are a separate signature for Numba
+                inputs = [np.ones(1) * 15.0, np.ones(1) * 7.0, np.ones(1)]
+                kernel(*inputs, np.empty((4, 1)))
+                for i in inputs:
+                    i.flags.writeable = False
+                kernel(*inputs, np.empty((4, 1)))
+                self.jit_kernel = kernel
+            except Exception:
+                self.jit_kernel = False
+                return None
+        return self.jit_kernel
+
+model_registry = {}
+
+def register_model(model):
+    model_registry[model.short_name] = model
+    return model
+
+def get_model(short_name):
+    return model_registry[short_name]
+
+def get_models(short_names=None):
+    if short_names is None:
+        return list(model_registry.values())
+    return [model_registry[i] for i in short_names]
+
+register_model(RefracModel('Terrill Linear', 'TL', cor_terrill_linear))
+register_model(RefracModel('Terrill Cubic', 'TK', cor_terrill_cubic))
+register_model(RefracModel('Novotny Linear', 'NL', cor_novotny_linear))
+register_model(RefracModel('Novotny Quadratic', 'NQ', cor_novotny_quadratic))
+register_model(RefracModel('Terrill+Novotný', 'TN', cor_novotrill))
+register_model(RefracModel('Bonham', 'BO', cor_bonham))
+register_model(RefracModel('Gardner', 'GA', cor_gardner))
+register_model(RefracModel('Gossett', 'GO', cor_gossett, abw_gosett, ('bxi', 'bxf')))
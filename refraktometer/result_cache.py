@@ -0,0 +1,158 @@
+# Content-Addressed Cache of Evaluation Results
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import hashlib
+import os
+import pickle
+import time
+import pandas as pa
+import measurements
+
+# Increased when the stored objects change, which invalidates all cached results
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(measurements.DEFAULT_CACHE_DIR, 'results')
+
+# Eviction limits, the least recently used results are removed first
+default_max_size = 1 << 30
+default_max_age = 30 * 24 * 3600
+
+# Source files whose code determines the results, a change of any of them invalidates the cache.
+# They are hashed by path, a script run directly is not in sys.modules under its own name.
+source_dir = os.path.dirname(os.path.abspath(__file__))
+source_files = [os.path.join(source_dir, i + '.py') for i in ['refrac', 'stats', 'outliers', 'analysis']]
+
+def update_hash(h, value):
+    h.update(repr(value).encode('utf-8'))
+
+# Hash over the values of all columns including the index, independent of the memory layout
+def calc_data_hash(data):
+    h = hashlib.sha256()
+    update_hash(h, [(str(i), str(data[i].dtype)) for i in data.columns])
+    h.update(pa.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+def hash_function(h, func):
+    code = func.__code__
+    update_hash(h, (func.__qualname__, code.co_consts, code.co_names))
+    h.update(code.co_code)
+    for cell in func.__closure__ or ():
+        value = cell.cell_contents
+        if callable(value) and hasattr(value, '__code__'):
+            hash_function(h, value)
+        else:
+            update_hash(h, value)
+
+# The correlation functions are hashed by their code and captured coefficients, so fitted models
+# with the same name but different coefficients have different hashes
+def calc_models_hash(models):
+    h = hashlib.sha256()
+    for model in models:
+        update_hash(h, (model.name, model.short_name, model.inputs))
+        hash_function(h, model.cor_model)
+        if model.abw_model is not None:
+            hash_function(h, model.abw_model)
+    return h.hexdigest()
+
+# Configuration objects are hashed by their attributes, nested objects like outlier rules and
+# calibrations by their class and attributes
+def describe(value):
+    if isinstance(value, dict):
+        return sorted((str(k), describe(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [describe(i) for i in value]
+    if hasattr(value, '__dict__'):
+        return (type(value).__name__, describe(vars(value)))
+    return value
+
+def calc_config_hash(config):
+    h = hashlib.sha256()
+    update_hash(h, describe(config))
+    return h.hexdigest()
+
+def calc_source_hash(file_names=source_files):
+    h = hashlib.sha256()
+    update_hash(h, CACHE_VERSION)
+    for file_name in file_names:
+        with open(file_name, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# The key of a result is the hash of all its inputs
+def calc_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+# One pickle file per result, named by its key. The modification time of a file is updated on
+# every hit and serves as last access time for the eviction.
+class ResultCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size=default_max_size, max_age=default_max_age):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def get_file_name(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def get(self, key):
+        file_name = self.get_file_name(key)
+        try:
+            with open(file_name, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(file_name)
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_name = self.get_file_name(key)
+        tmp_file_name = file_name + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_file_name, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_name, file_name)
+        self.evict()
+
+    # Removes the results which were not used within the maximum age, then the least recently
+    # used ones until the cache is within the size limit
+    def evict(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        entries = []
+        for i in os.scandir(self.cache_dir):
+            if not i.name.endswith('.pickle'):
+                continue
+            stat = i.stat()
+            if now - stat.st_mtime > self.max_age:
+                os.remove(i.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, i.path))
+        entries.sort()
+        size = sum(i[1] for i in entries)
+        for mtime, file_size, path in entries:
+            if size <= self.max_size:
+                break
+            os.remove(path)
+            size -= file_size
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for i in os.scandir(self.cache_dir):
+            if i.name.endswith('.pickle'):
+                os.remove(i.path)
+
+    # Returns the cached result or computes and stores it. With force the result is always
+    # computed and replaces the cached one.
+    def get_or_compute(self, key, compute, force=False):
+        if not force:
+            value = self.get(key)
+            if value is not None:
+                return value
+        value = compute()
+        self.put(key, value)
+        return value
@@ -0,0 +1,214 @@
+# Incremental Statistics of Refractometer Model Deviations
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import math
+import numpy as np
+import pandas as pa
+
+# Thresholds of the absolute deviation for the share of good estimations
+default_thresholds = (0.25, 0.5, 1.0)
+
+# R² score from the residual and the total sum of squares, both may be arrays. Like
+# sklearn.metrics.r2_score a constant reference gives 1.0 for a perfect prediction and 0.0
+# otherwise.
+def calc_r2_score(ss_res, ss_tot):
+    ss_res, ss_tot = np.broadcast_arrays(np.asarray(ss_res, dtype=float), np.asarray(ss_tot, dtype=float))
+    constant = ss_tot == 0.0
+    r2 = np.where(constant, np.where(ss_res == 0.0, 1.0, 0.0), 1.0 - ss_res / np.where(constant, 1.0, ss_tot))
+    return float(r2) if r2.ndim == 0 else r2
+
+# Quantile sketch which is exact as long as it holds at most exact_size values, which covers the
+# typical data sets. Beyond that the values are merged into weighted centroids as in a t-digest,
+# the centroids are small in the tails and large around the median.
+class QuantileSketch:
+    def __init__(self, compression=200, exact_size=4096):
+        self.compression = compression
+        self.exact_size = exact_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.exact = True
+
+    def count(self):
+        return self.weights.sum() + len(self.buffer)
+
+    def add(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= self.exact_size:
+            self.flush()
+
+    def add_batch(self, values):
+        self.buffer.extend(np.asarray(values, dtype=float).tolist())
+        if len(self.buffer) >= self.exact_size:
+            self.flush()
+
+    def merge(self, other):
+        other.flush()
+        self.flush()
+        self.means = np.concatenate([self.means, other.means])
+        self.weights = np.concatenate([self.weights, other.weights])
+        self.exact = self.exact and other.exact
+        self.sort()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        self.means = np.concatenate([self.means, self.buffer])
+        self.weights = np.concatenate([self.weights, np.ones(len(self.buffer))])
+        self.buffer = []
+        self.sort()
+
+    def sort(self):
+        order = np.argsort(self.means, kind='stable')
+        self.means = self.means[order]
+        self.weights = self.weights[order]
+        if len(self.means) > self.exact_size:
+            self.compress()
+
+    # Centroids are grouped by the t-digest scale function k(q) = compression * (asin(2q - 1) / pi + 1 / 2)
+    def compress(self):
+        total = self.weights.sum()
+        q = (np.cumsum(self.weights) - self.weights / 2.0) / total
+        groups = np.floor(self.compression * (np.arcsin(2.0 * q - 1.0) / np.pi + 0.5)).astype(int)
+        groups = np.unique(groups, return_inverse=True)[1]
+        weights = np.bincount(groups, self.weights)
+        self.means = np.bincount(groups, self.means * self.weights) / weights
+        self.weights = weights
+        self.exact = False
+
+    # Linear interpolation between the order statistics, same as numpy.percentile and pandas
+    def quantile(self, q):
+        self.flush()
+        if len(self.means) == 0:
+            return math.nan
+        if self.exact:
+            return float(np.interp(q * (len(self.means) - 1), np.arange(len(self.means)), self.means))
+        centers = np.cumsum(self.weights) - self.weights / 2.0 - 0.5
+        return float(np.interp(q * (self.weights.sum() - 1.0), centers, self.means))
+
+# Moments are combined with the update formulas of Welford and Chan et al., so single values,
+# batches and partitions can be added in any order. The R² score is derived from the deviations
+# and the moments of the reference values:
+# R² = 1 - sum(dev²) / sum((ref - mean(ref))²) with sum(dev²) = m2 + n * mean²
+class DeviationStats:
+    def __init__(self, thresholds=default_thresholds):
+        self.thresholds = thresholds
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # The R² score uses the sum of the squared deviations, like sklearn.metrics.r2_score
+        self.sum_squares = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.max_abs = math.nan
+        self.ref_mean = 0.0
+        self.ref_m2 = 0.0
+        self.below = [0] * len(thresholds)
+        self.sketch = QuantileSketch()
+
+    @staticmethod
+    def from_arrays(devs, refs=None, thresholds=default_thresholds):
+        stats = DeviationStats(thresholds)
+        stats.update_batch(devs, refs)
+        return stats
+
+    def update(self, dev, ref=math.nan):
+        self.n += 1
+        delta = dev - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (dev - self.mean)
+        self.sum_squares += dev * dev
+        delta = ref - self.ref_mean
+        self.ref_mean += delta / self.n
+        self.ref_m2 += delta * (ref - self.ref_mean)
+        self.min = min(self.min, dev)
+        self.max = max(self.max, dev)
+        if not abs(dev) <= abs(self.max_abs):
+            self.max_abs = dev
+        for i, threshold in enumerate(self.thresholds):
+            if abs(dev) <= threshold:
+                self.below[i] += 1
+        self.sketch.add(dev)
+
+    def update_batch(self, devs, refs=None):
+        devs = np.asarray(devs, dtype=float)
+        refs = np.full(len(devs), np.nan) if refs is None else np.asarray(refs, dtype=float)
+        if len(devs) == 0:
+            return
+        other = DeviationStats(self.thresholds)
+        other.n = len(devs)
+        other.mean = np.mean(devs)
+        other.m2 = np.sum((devs - other.mean)**2)
+        other.sum_squares = np.sum(devs**2)
+        other.ref_mean = np.mean(refs)
+        other.ref_m2 = np.sum((refs - other.ref_mean)**2)
+        other.min = np.min(devs)
+        other.max = np.max(devs)
+        other.max_abs = devs[np.argmax(np.abs(devs))]
+        other.below = [int(np.count_nonzero(np.abs(devs) <= i)) for i in self.thresholds]
+        other.sketch.add_batch(devs)
+        self.merge(other)
+
+    def merge(self, other):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta**2 * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.sum_squares += other.sum_squares
+        delta = other.ref_mean - self.ref_mean
+        self.ref_m2 += other.ref_m2 + delta**2 * self.n * other.n / n
+        self.ref_mean += delta * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if not abs(other.max_abs) <= abs(self.max_abs):
+            self.max_abs = other.max_abs
+        self.below = [i + j for i, j in zip(self.below, other.below)]
+        self.sketch.merge(other.sketch)
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def iqr(self):
+        return self.quantile(0.75) - self.quantile(0.25)
+
+    def r2_score(self):
+        return calc_r2_score(self.sum_squares, self.ref_m2)
+
+    # Share of deviations within the threshold in %
+    def below_percent(self, threshold):
+        return self.below[self.thresholds.index(threshold)] / self.n * 100.0
+
+    # Same rows as pandas.Series.describe()
+    def describe(self):
+        return pa.Series([ float(self.n), self.mean, self.std(), self.min, self.quantile(0.25),
+            self.quantile(0.5), self.quantile(0.75), self.max ],
+            index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'])
+
+# Statistics per model of one section (AE or ABV), in the layout of the stats_*_dev.csv files
+class StatsTable:
+    def __init__(self, names, thresholds=default_thresholds):
+        self.stats = { i: DeviationStats(thresholds) for i in names }
+
+    def update(self, devs, refs):
+        for name, stats in self.stats.items():
+            stats.update(devs[name], refs)
+
+    def update_batch(self, devs, refs):
+        for name, stats in self.stats.items():
+            stats.update_batch(devs[name], refs)
+
+    def merge(self, other):
+        for name, stats in self.stats.items():
+            stats.merge(other.stats[name])
+
+    def to_frame(self, row_name_square='r2score'):
+        table = pa.DataFrame({ name: stats.describe() for name, stats in self.stats.items() })
+        table.loc[row_name_square] = [ i.r2_score() for i in self.stats.values() ]
+        return table
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# Refractometer Correlation Model Evaluation of Sensor Streams
+# Copyright 2021 Thomas Ascher
+# SPDX-License-Identifier: GPL-3.0+
+
+import argparse
+import collections
+import math
+import os
+import socket
+import sys
+import time
+import refrac
+
+col_name_key = 'Tank'
+col_name_bxi = 'BXI'
+col_name_bxf = 'BXF'
+col_name_wcf = 'WCF'
+
+output_header = [col_name_key, col_name_bxi, col_name_bxf, 'OE', 'AE', 'FG', 'ABV', 'AE Mean', 'AE Std', 'ABV Mean', 'ABV Std']
+
+# Mean and standard deviation over the last readings with O(1) updates. The running sums would
+# accumulate rounding errors over a months-long stream, therefore they are recomputed from the
+# window every time it has been replaced completely.
+class RollingStats:
+    def __init__(self, window):
+        self.values = collections.deque(maxlen=window)
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.updates = 0
+
+    def add(self, value):
+        if len(self.values) == self.values.maxlen:
+            first = self.values[0]
+            self.sum -= first
+            self.sum_sq -= first * first
+        self.values.append(value)
+        self.sum += value
+        self.sum_sq += value * value
+        self.updates += 1
+        if self.updates % self.values.maxlen == 0:
+            self.sum = math.fsum(self.values)
+            self.sum_sq = math.fsum(i * i for i in self.values)
+
+    def mean(self):
+        return self.sum / len(self.values)
+
+    def std(self):
+        n = len(self.values)
+        if n < 2:
+            return math.nan
+        return math.sqrt(max(self.sum_sq - self.sum * self.sum / n, 0.0) / (n - 1))
+
+# Applies one correlation model to each reading and keeps rolling statistics per tank. The
+# memory only depends on the number of tanks and the window size, not on the stream length.
+class StreamEvaluator:
+    def __init__(self, model, default_wcf=1.04, window=60, calibration=None):
+        self.model = model
+        self.default_wcf = default_wcf
+        self.calibration = calibration
+        self.window = window
+        self.stats = {}
+
+    def evaluate(self, key, bxi, bxf, wcf=math.nan):
+        if wcf != wcf:
+            wcf = self.default_wcf
+            # The tank key identifies the sensor in the calibration store
+            if self.calibration is not None:
+                calibrated = self.calibration.get_wcf(key, self.model.short_name)
+                if calibrated is not None:
+                    wcf = calibrated
+        oe, ae, fg, abv = self.model.evaluate_scalar(bxi, bxf, wcf)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = (RollingStats(self.window), RollingStats(self.window))
+        stats[0].add(ae)
+        stats[1].add(abv)
+        return (key, bxi, bxf, oe, ae, fg, abv, stats[0].mean(), stats[0].std(), stats[1].mean(), stats[1].std())
+
+# Lines are either comma separated values with a header line, e.g. in the layout of
+# data_fermentation.csv, or plain BXI,BXF[,WCF] values. Without a key column all readings belong
+# to one tank.
+class ReadingParser:
+    def __init__(self, key_column=col_name_key):
+        self.key_column = key_column
+        self.indices = None
+
+    def parse(self, line):
+        fields = line.strip().split(',')
+        if self.indices is None:
+            try:
+                float(fields[0])
+                self.indices = (None, 0, 1, 2)
+            except ValueError:
+                self.indices = (fields.index(self.key_column) if self.key_column in fields else None,
+                    fields.index(col_name_bxi), fields.index(col_name_bxf),
+                    fields.index(col_name_wcf) if col_name_wcf in fields else None)
+                return None
+        key, bxi, bxf, wcf = self.indices
+        return (fields[key] if key is not None else '', float(fields[bxi]), float(fields[bxf]),
+            float(fields[wcf]) if wcf is not None and wcf < len(fields) and len(fields[wcf]) > 0 else math.nan)
+
+# Polls a growing file like tail -f, a replaced file (e.g. after a log rotation) is reopened. The
+# file is closed when the generator is closed.
+def follow_file(file_name, interval=1.0):
+    f = open(file_name)
+    try:
+        inode = os.fstat(f.fileno()).st_ino
+        pending = ''
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if pending.endswith('\n'):
+                    yield pending
+                    pending = ''
+                continue
+            time.sleep(interval)
+            try:
+                if os.stat(file_name).st_ino != inode:
+                    new_file = open(file_name)
+                    f.close()
+                    f = new_file
+                    inode = os.fstat(f.fileno()).st_ino
+                    pending = ''
+            except FileNotFoundError:
+                pass
+    finally:
+        f.close()
+
+# Accepts one sender at a time on a local socket, each connection may start with a header line
+def read_socket(socket_name):
+    if os.path.exists(socket_name):
+        os.unlink(socket_name)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_name)
+        server.listen(1)
+        while True:
+            connection = server.accept()[0]
+            with connection, connection.makefile('r') as f:
+                yield None
+                yield from f
+
+def format_result(result):
+    return result[0] + ',' + ','.join('%.3f' % i for i in result[1:]) + '\n'
+
+def run(lines, evaluator, output, key_column=col_name_key, flush=True):
+    parser = ReadingParser(key_column)
+    output.write(','.join(output_header) + '\n')
+    for line in lines:
+        # None marks the start of a new connection
+        if line is None:
+            parser = ReadingParser(key_column)
+            continue
+        if not line.strip():
+            continue
+        try:
+            reading = parser.parse(line)
+        except (ValueError, IndexError):
+            print('Invalid reading: ' + line.strip(), file=sys.stderr)
+            continue
+        if reading is None:
+            continue
+        try:
+            output.write(format_result(evaluator.evaluate(*reading)))
+        except ValueError as e:
+            print(str(e) + ': ' + line.strip(), file=sys.stderr)
+            continue
+        if flush:
+            output.flush()
+
+# The fitted models are registered before the choices of the model option are created
+def main(argv=None):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--fitted-models')
+    fitted_models = parser.parse_known_args(argv)[0].fitted_models
+    if fitted_models:
+        from refit import load_fitted_models
+        load_fitted_models(fitted_models)
+
+    parser = argparse.ArgumentParser(description='Refractometer correlation model evaluation of a stream of sensor readings.')
+    parser.add_argument('input', nargs='?', default='-', help='line-delimited readings, - for stdin (default)')
+    parser.add_argument('-f', '--follow', action='store_true', help='keep reading the input file as it grows')
+    parser.add_argument('--socket', help='read from senders connecting to this local socket instead')
+    parser.add_argument('-m', '--model', default='TN', choices=list(refrac.model_registry.keys()), help='correlation model (default: TN)')
+    parser.add_argument('--wcf', type=float, default=1.04, help='WCF for readings without one (default: 1.04)')
+    parser.add_argument('--calibration', help='fitted WCFs per sensor, keyed by the tank column')
+    parser.add_argument('--fitted-models', help='register the fitted models of this file (see refit.py)')
+    parser.add_argument('--window', type=int, default=60, help='number of readings per tank for the rolling statistics')
+    parser.add_argument('--key', default=col_name_key, help='column which identifies the tank (default: Tank)')
+    args = parser.parse_args(argv)
+
+    calibration = None
+    if args.calibration:
+        from calibration import WCFCalibration
+        calibration = WCFCalibration.load(args.calibration)
+    evaluator = StreamEvaluator(refrac.get_model(args.model), args.wcf, args.window, calibration)
+    if args.socket:
+        lines = read_socket(args.socket)
+    elif args.input == '-':
+        lines = sys.stdin
+    elif args.follow:
+        lines = follow_file(args.input)
+    else:
+        lines = open(args.input)
+    try:
+        run(lines, evaluator, sys.stdout, args.key)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+
+if __name__ == "__main__":
+    main()